@@ -12,18 +12,96 @@ def plurality(xs):
         if v == maxv:
             return k
 
-def apply_model(features, model):
+def squared_distances(features, train_feats):
+    '''
+    dists = squared_distances(features, train_feats)
+
+    All squared Euclidean distances between the rows of `features` and the
+    rows of `train_feats`, computed with one matrix product.
+    '''
+    features = np.asarray(features, dtype=float)
+    train_feats = np.asarray(train_feats, dtype=float)
+    dists = np.dot(features, train_feats.T)
+    dists *= -2
+    dists += (features ** 2).sum(1)[:, None]
+    dists += (train_feats ** 2).sum(1)[None, :]
+    return np.maximum(dists, 0, out=dists)
+
+def nearest_neighbours(dists, k):
+    '''
+    Indices of the k nearest columns of every row of `dists`, nearest first;
+    equal distances are ordered by column, like the stable sort of the loop
+    '''
+    n, m = dists.shape
+    k = min(k, m)
+    if k == 0:
+        return np.zeros((n, 0), dtype=np.intp)
+    # every column tied with the k-th distance is a candidate, argpartition
+    # alone would pick an arbitrary subset of them
+    kth = np.partition(dists, k - 1, axis=1)[:, k - 1]
+    rows, cols = np.nonzero(dists <= kth[:, None])
+    order = np.lexsort((cols, dists[rows, cols], rows))
+    rows, cols = rows[order], cols[order]
+    starts = np.searchsorted(rows, np.arange(n))
+    keep = np.arange(len(rows)) - starts[rows] < k
+    return cols[keep].reshape(n, k)
+
+def vote(neighbour_labels, n_classes):
+    '''
+    Plurality vote for every row of `neighbour_labels` (integer labels of the
+    neighbours, nearest first). Like `plurality`, a tie goes to the class
+    that appears first.
+    '''
+    n, k = neighbour_labels.shape
+    flat = (np.arange(n)[:, None] * n_classes + neighbour_labels).ravel()
+    counts = np.bincount(flat, minlength=n * n_classes).reshape(n, n_classes)
+    first = np.full(n * n_classes, k)
+    np.minimum.at(first, flat, np.tile(np.arange(k), n))
+    # more votes first, then earlier first appearance
+    score = counts * (k + 1) - first.reshape(n, n_classes)
+    return score.argmax(1)
+
+def apply_model(features, model, chunk_size=1024):
     k, train_feats, labels = model
+    classes, y = np.unique(labels, return_inverse=True)
     results = []
-    for f in features:
-        label_dist = []
-        for t,ell in zip(train_feats, labels):
-            label_dist.append( (np.linalg.norm(f-t), ell) )
-        label_dist.sort(key=lambda d_ell: d_ell[0])
-        label_dist = label_dist[:k]
-        results.append(plurality([ell for _,ell in label_dist]))
-    return np.array(results)
+    # one (chunk x train) distance block at a time to bound memory
+    for start in range(0, len(features), chunk_size):
+        dists = squared_distances(features[start:start + chunk_size], train_feats)
+        nearest = nearest_neighbours(dists, k)
+        results.append(vote(y[nearest], len(classes)))
+    if not results:
+        return np.array([], dtype=np.asarray(labels).dtype)
+    return classes[np.concatenate(results)]
 
 def accuracy(features, labels, model):
     preds = apply_model(features, model)
     return np.mean(preds == labels)
+
+def cross_validate(features, labels, ks=(1,), folds=10):
+    '''
+    accuracies = cross_validate(features, labels, ks=(1,), folds=10)
+
+    Mean accuracy of kNN over `folds` folds (sample i is in fold i % folds),
+    for every k in `ks`. The n x n distance matrix is computed once and the
+    neighbours of every fold once, for the largest k.
+
+    Returns
+    -------
+    accuracies : ndarray, one value per k
+    '''
+    ks = list(ks)
+    classes, y = np.unique(labels, return_inverse=True)
+    dists = squared_distances(features, features)
+    accuracies = np.zeros(len(ks))
+    for fold in range(folds):
+        training = np.ones(len(features), bool)
+        training[fold::folds] = 0
+        testing = ~training
+        train_idx = np.flatnonzero(training)
+        nearest = nearest_neighbours(dists[testing][:, train_idx], max(ks))
+        neighbour_labels = y[train_idx][nearest]
+        for i, k in enumerate(ks):
+            preds = vote(neighbour_labels[:, :k], len(classes))
+            accuracies[i] += np.mean(preds == y[testing])
+    return accuracies / folds
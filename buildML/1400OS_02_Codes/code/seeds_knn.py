@@ -1,26 +1,18 @@
 from load import load_dataset
-import numpy as np
-from knn import learn_model, apply_model, accuracy
+from knn import cross_validate
 
 features,labels = load_dataset('seeds')
 
-def cross_validate(features, labels):
-    error = 0.0
-    for fold in range(10):
-        training = np.ones(len(features), bool)
-        training[fold::10] = 0
-        testing = ~training
-        model = learn_model(1, features[training], labels[training])
-        test_error = accuracy(features[testing], labels[testing], model)
-        error += test_error
+# the distance matrix is computed once for all folds and all k
+ks = [1, 3, 5, 11, 21]
 
-    return error/ 10.0
-
-error = cross_validate(features, labels)
+error = cross_validate(features, labels)[0]
 print('Ten fold cross-validated error was {0:.1%}.'.format(error))
 
 features -= features.mean(0)
 features /= features.std(0)
-error = cross_validate(features, labels)
+error = cross_validate(features, labels)[0]
 print('Ten fold cross-validated error after z-scoring was {0:.1%}.'.format(error))
 
+for k, accuracy in zip(ks, cross_validate(features, labels, ks)):
+    print('k = {0:2}: ten fold cross-validated accuracy after z-scoring was {1:.1%}.'.format(k, accuracy))
@@ -0,0 +1,65 @@
+import numpy as np
+import knn
+
+def _apply_model_loop(features, model):
+    # the original implementation: one norm per (test, train) pair
+    k, train_feats, labels = model
+    results = []
+    for f in features:
+        label_dist = [(np.linalg.norm(f-t), ell) for t,ell in zip(train_feats, labels)]
+        label_dist.sort(key=lambda d_ell: d_ell[0])
+        results.append(knn.plurality([ell for _,ell in label_dist[:k]]))
+    return np.array(results)
+
+def _data():
+    np.random.seed(2)
+    features = np.random.randn(120, 5)
+    labels = np.array(['Kama', 'Rosa', 'Canadian'])[np.random.randint(0, 3, 120)]
+    return features, labels
+
+def test_apply_model():
+    features, labels = _data()
+    for k in (1, 2, 4, 7, 80):
+        model = knn.learn_model(k, features[:80], labels[:80])
+        assert np.all(knn.apply_model(features[80:], model) == _apply_model_loop(features[80:], model))
+
+def test_cross_validate():
+    features, labels = _data()
+    ks = [1, 3, 6]
+    accuracies = knn.cross_validate(features, labels, ks)
+    for k, acc in zip(ks, accuracies):
+        expected = 0.0
+        for fold in range(10):
+            training = np.ones(len(features), bool)
+            training[fold::10] = 0
+            model = knn.learn_model(k, features[training], labels[training])
+            expected += knn.accuracy(features[~training], labels[~training], model)
+        assert np.allclose(acc, expected / 10.0)
+
+def _tied_data(seed):
+    # few distinct integer values: many neighbours at exactly the same distance
+    np.random.seed(seed)
+    features = np.random.randint(0, 3, (60, 4))
+    labels = np.array(['Kama', 'Rosa', 'Canadian'])[np.random.randint(0, 3, 60)]
+    return features, labels
+
+def test_apply_model_ties():
+    for seed in range(50):
+        features, labels = _tied_data(seed)
+        for k in (1, 2, 3, 5):
+            model = knn.learn_model(k, features[:45], labels[:45])
+            assert np.all(knn.apply_model(features[45:], model) == _apply_model_loop(features[45:], model))
+
+def test_cross_validate_ties():
+    features, labels = _tied_data(0)
+    ks = [1, 2, 3, 5]
+    accuracies = knn.cross_validate(features, labels, ks)
+    for k, acc in zip(ks, accuracies):
+        expected = 0.0
+        for fold in range(10):
+            training = np.ones(len(features), bool)
+            training[fold::10] = 0
+            model = knn.learn_model(k, features[training], labels[training])
+            preds = _apply_model_loop(features[~training], model)
+            expected += np.mean(preds == labels[~training])
+        assert np.allclose(acc, expected / 10.0)
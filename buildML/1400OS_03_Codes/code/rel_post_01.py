@@ -1,5 +1,4 @@
 import os
-import sys
 
 import scipy as sp
 
@@ -59,22 +58,19 @@ def dist_norm(v1, v2):
 
     return sp.linalg.norm(delta.toarray())
 
-dist = dist_norm
+# dist_norm of new_post to every post, without looping over the posts:
+# the normalised vectors are kept in an inverted index (related_posts.py)
+from related_posts import RelatedPostsIndex
 
-best_dist = sys.maxsize
-best_i = None
+index = RelatedPostsIndex(vectorizer)
+index.add_vectors(X_train)
 
-for i in range(0, num_samples):
-    post = posts[i]
-    if post == new_post:
-        continue
-    post_vec = X_train.getrow(i)
-    d = dist(post_vec, new_post_vec)
+ids, dists = index.nearest([new_post], k=num_samples)
+# like the loop, skip every copy of new_post among the posts
+related = [(i, d) for i, d in zip(ids[0], dists[0]) if posts[i] != new_post]
 
-    print("=== Post %i with dist=%.2f: %s" % (i, d, post))
-
-    if d < best_dist:
-        best_dist = d
-        best_i = i
+for i, d in related:
+    print("=== Post %i with dist=%.2f: %s" % (i, d, posts[i]))
 
+best_i, best_dist = related[0]
 print("Best post is %i with dist=%.2f" % (best_i, best_dist))
@@ -0,0 +1,133 @@
+import numpy as np
+import scipy.sparse as sps
+
+
+def normalize_rows(X):
+    """rows of the sparse matrix X scaled to unit L2 norm (empty rows stay 0)"""
+    X = sps.csr_matrix(X, dtype=np.float64)
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(1)).ravel())
+    norms[norms == 0] = 1
+    return sps.diags(1 / norms).dot(X).tocsr()
+
+
+class RelatedPostsIndex(object):
+    """
+    Nearest posts by cosine similarity of their (TF-IDF) vectors.
+
+    The posts are L2-normalised once and stored transposed, one row of
+    post ids per term: an inverted index. A query only touches the
+    postings of its own terms (one sparse product) and the k best of the
+    candidates are found with argpartition, so a query costs
+    O(postings of its terms) instead of O(#posts * #terms).
+
+    New posts are added as a new segment, segments are merged when there
+    are more than max_segments of them.
+
+        index = RelatedPostsIndex(vectorizer)  # vectorizer already fitted
+        index.add(posts)
+        ids, dists = index.nearest(["imaging databases"], k=3)
+
+    dists are the dist_norm distances of rel_post_01.py,
+    sqrt(2 - 2 * cosine similarity).
+    """
+
+    def __init__(self, vectorizer=None, max_segments=8):
+        self.vectorizer = vectorizer
+        self.max_segments = max_segments
+        # (first post id, term x post CSR matrix)
+        self.segments = []
+        self.num_posts = 0
+
+    def __len__(self):
+        return self.num_posts
+
+    def vectors(self, posts):
+        return normalize_rows(self.vectorizer.transform(posts))
+
+    def add(self, posts):
+        """adds posts (texts) with the vocabulary of the fitted vectorizer"""
+        return self.add_vectors(self.vectorizer.transform(posts))
+
+    def add_vectors(self, X):
+        """adds the posts with vectors X (one row per post); returns their ids"""
+        X = normalize_rows(X)
+        ids = np.arange(self.num_posts, self.num_posts + X.shape[0])
+        self.segments.append((self.num_posts, X.T.tocsr()))
+        self.num_posts += X.shape[0]
+        if len(self.segments) > self.max_segments:
+            self.optimize()
+        return ids
+
+    def optimize(self):
+        """merges all segments into one"""
+        if len(self.segments) > 1:
+            merged = sps.hstack([postings for _, postings in self.segments]).tocsr()
+            self.segments = [(0, merged)]
+
+    def similarities(self, Q):
+        """
+        cosine similarities of the normalised queries Q (one row per query)
+        with all posts, as a sparse (#queries x #posts) matrix that only has
+        entries for posts sharing a term with the query
+        """
+        Q = sps.csr_matrix(Q)
+        blocks = [Q.dot(postings) for _, postings in self.segments]
+        if not blocks:
+            return sps.csr_matrix((Q.shape[0], 0))
+        return sps.hstack(blocks).tocsr()
+
+    def nearest(self, queries, k=1, exclude=None):
+        """
+        ids, dists = index.nearest(queries, k=1, exclude=None)
+
+        queries: texts (or a sparse matrix of query vectors)
+        exclude: optional, for every query a post id (or None) to skip,
+                 e.g. the query itself when it is in the index
+
+        Returns
+        -------
+        ids : (#queries, k) int array, nearest first; posts without any
+              common term (cosine 0) fill up ties in id order
+        dists : (#queries, k) array of sqrt(2 - 2 * cosine)
+        """
+        if sps.issparse(queries):
+            Q = normalize_rows(queries)
+        else:
+            Q = self.vectors(queries)
+        num_queries = Q.shape[0]
+        if exclude is None:
+            exclude = [None] * num_queries
+        k = min(k, self.num_posts - any(e is not None for e in exclude))
+        k = max(k, 0)
+
+        S = self.similarities(Q)
+        ids = np.zeros((num_queries, k), dtype=np.intp)
+        sims = np.zeros((num_queries, k))
+        for q in range(num_queries):
+            row = slice(S.indptr[q], S.indptr[q + 1])
+            cand = S.indices[row]
+            scores = S.data[row]
+            if exclude[q] is not None:
+                keep = cand != exclude[q]
+                cand, scores = cand[keep], scores[keep]
+            if len(cand) > k:
+                # argpartition picks arbitrary posts among those tied with
+                # the k-th score: keep all of them, the lexsort decides
+                kth = -np.partition(-scores, k - 1)[k - 1]
+                top = scores >= kth
+                cand, scores = cand[top], scores[top]
+            # best first, ties by id
+            order = np.lexsort((cand, -scores))[:k]
+            cand, scores = cand[order], scores[order]
+            if len(cand) < k:
+                # posts without a common term, lowest ids first
+                skip = set(cand.tolist())
+                if exclude[q] is not None:
+                    skip.add(exclude[q])
+                fill = [i for i in range(min(self.num_posts, k + len(skip))) if i not in skip]
+                cand = np.concatenate([cand, np.asarray(fill[:k - len(cand)], dtype=np.intp)])
+                scores = np.concatenate([scores, np.zeros(k - len(scores))])
+            ids[q] = cand
+            sims[q] = scores
+        dists = np.sqrt(np.maximum(2 - 2 * sims, 0))
+        return ids, dists
@@ -0,0 +1,40 @@
+import numpy as np
+import scipy.sparse as sps
+from related_posts import RelatedPostsIndex, normalize_rows
+
+def _nearest_loop(X, Q, k, exclude):
+    # brute force: all cosine similarities, best first, ties by id
+    X = normalize_rows(X).toarray()
+    Q = normalize_rows(Q).toarray()
+    ids, dists = [], []
+    for q, e in zip(Q, exclude):
+        # equal similarities can differ in the last bits between the two
+        # ways of computing them
+        sims = np.round(X.dot(q), 9)
+        order = sorted((i for i in range(len(X)) if i != e), key=lambda i: (-sims[i], i))[:k]
+        ids.append(order)
+        dists.append([np.sqrt(max(2 - 2 * sims[i], 0)) for i in order])
+    return np.array(ids), np.array(dists)
+
+def test_ties_by_id():
+    index = RelatedPostsIndex()
+    index.add_vectors(sps.csr_matrix(np.ones((50, 4))))
+    ids, dists = index.nearest(sps.csr_matrix(np.ones((1, 4))), k=3)
+    assert ids[0].tolist() == [0, 1, 2]
+    assert np.allclose(dists, 0)
+
+def test_nearest():
+    np.random.seed(3)
+    for case in range(300):
+        # 0/1 vectors over few terms give many exactly tied similarities
+        X = sps.csr_matrix(np.random.randint(0, 2, (30, 6)))
+        Q = sps.csr_matrix(np.random.randint(0, 2, (4, 6)))
+        k = np.random.randint(1, 8)
+        exclude = [None, 0, 5, None]
+        index = RelatedPostsIndex(max_segments=2)
+        for start in range(0, 30, 7):
+            index.add_vectors(X[start:start + 7])
+        ids, dists = index.nearest(Q, k=k, exclude=exclude)
+        expected_ids, expected_dists = _nearest_loop(X, Q, k, exclude)
+        assert np.all(ids == expected_ids)
+        assert np.allclose(dists, expected_dists, atol=1e-6)
@@ -11,20 +11,17 @@ import nltk
 
 from collections import Counter
 
-try:
-    import ujson as json  # UltraJSON if available
-except:
-    import json
+from pos_tagger import PosTagger
 
-poscache_filename = "poscache.json"
+poscache_filename = "poscache.sqlite"
 
 
 class PosCounter(Counter):
-    def __init__(self, iterable=(), normalize=True, poscache=None, **kwargs):
+    def __init__(self, iterable=(), normalize=True, tagger=None, **kwargs):
         self.n_sents = 0
         self.normalize = normalize
 
-        self.poscache = poscache
+        self.tagger = tagger if tagger is not None else PosTagger(poscache_filename)
 
         super(PosCounter, self).__init__(iterable, **kwargs)
 
@@ -35,19 +32,10 @@ class PosCounter(Counter):
             for x, n in other.items():
                 self[x] += n
         else:
-            for sent in other:
+            sents = list(other)
+            for tags in self.tagger.tag_many(sents):
                 self.n_sents += 1
 
-                # import pdb;pdb.set_trace()
-                if self.poscache is not None:
-                    if sent in self.poscache:
-                        tags = self.poscache[sent]
-                    else:
-                        self.poscache[sent] = tags = nltk.pos_tag(
-                            nltk.word_tokenize(sent))
-                else:
-                    tags = nltk.pos_tag(nltk.word_tokenize(sent))
-
                 for x in tags:
                     tok, tag = x
                     self[tag] += 1
@@ -80,16 +68,20 @@ class PosTagFreqVectorizer(BaseEstimator):
         else:
             self.fixed_vocabulary = False
 
-        try:
-            self.poscache = json.load(open(poscache_filename, "r"))
-        except IOError:
-            self.poscache = {}
+        # tags of all sentences, cached on disk and shared by all processes
+        self.tagger = PosTagger(poscache_filename)
 
         self.normalize = normalize
         self.dtype = dtype
 
-    def write_poscache(self):
-        json.dump(self.poscache, open(poscache_filename, "w"))
+    def _count_tags(self, raw_documents):
+        analyze = self.build_analyzer()
+        sents_per_doc = [analyze(doc) for doc in raw_documents]
+        # tag the sentences of all documents in one batch (the cache misses
+        # in parallel), PosCounter then only finds them in tagger.memo
+        self.tagger.tag_many(sent for sents in sents_per_doc for sent in sents)
+        return [PosCounter(sents, normalize=self.normalize, tagger=self.tagger)
+                for sents in sents_per_doc]
 
     def decode(self, doc):
         """Decode the input into a string of unicode symbols
@@ -201,27 +193,17 @@ class PosTagFreqVectorizer(BaseEstimator):
             # We intentionally don't call the transform method to make it
             # fit_transform overridable without unwanted side effects in
             # TfidfVectorizer
-            analyze = self.build_analyzer()
-            term_counts_per_doc = [PosCounter(analyze(doc), normalize=self.normalize, poscache=self.poscache)
-                                   for doc in raw_documents]
+            term_counts_per_doc = self._count_tags(raw_documents)
             return self._term_count_dicts_to_matrix(term_counts_per_doc)
 
         self.vocabulary_ = {}
         # result of document conversion to term count dicts
-        term_counts_per_doc = []
+        term_counts_per_doc = self._count_tags(raw_documents)
         term_counts = Counter()
 
-        analyze = self.build_analyzer()
-
-        for doc in raw_documents:
-            term_count_current = PosCounter(
-                analyze(doc), normalize=self.normalize, poscache=self.poscache)
+        for term_count_current in term_counts_per_doc:
             term_counts.update(term_count_current)
 
-            term_counts_per_doc.append(term_count_current)
-
-        self.write_poscache()
-
         terms = set(term_counts)
 
         # store map from term name to feature integer index: we sort the term
@@ -254,8 +236,7 @@ class PosTagFreqVectorizer(BaseEstimator):
 
         # XXX @larsmans tried to parallelize the following loop with joblib.
         # The result was some 20% slower than the serial version.
-        analyze = self.build_analyzer()
-        term_counts_per_doc = [Counter(analyze(doc)) for doc in raw_documents]
+        term_counts_per_doc = self._count_tags(raw_documents)
         return self._term_count_dicts_to_matrix(term_counts_per_doc)
 
     def get_feature_names(self):
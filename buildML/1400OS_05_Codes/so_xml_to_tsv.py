@@ -2,29 +2,50 @@
 # This script filters the posts and keeps those posts that are or belong
 # to a question that has been asked in 2011 or 2012.
 #
+# The posts dump has one <row .../> per line. It is split into byte ranges
+# (aligned to line starts) that are converted by worker processes in two
+# passes:
+#   1. parse the rows, extract the HTML features of the bodies and write
+#      them to a part file; the creation date and accepted answer of every
+#      question go to an SQLite file instead of a dict in memory
+#   2. join the answers of every part with their questions in SQLite and
+#      write the final TSV part
+# The parts are then concatenated into filtered.tsv, and filtered-meta.json
+# is streamed out of SQLite.
+#
+#   python so_xml_to_tsv.py [posts.xml] [num_workers]
+#
 
+import io
 import os
 import re
+import sys
+import shutil
+import sqlite3
+import multiprocessing
+from datetime import datetime
 try:
     import ujson as json  # UltraJSON if available
 except:
     import json
 from dateutil import parser as dateparser
 
-from operator import itemgetter
-from xml.etree import cElementTree as etree
+try:
+    from xml.etree import cElementTree as etree
+except ImportError:
+    from xml.etree import ElementTree as etree
 from collections import defaultdict
 
 from data import DATA_DIR
 
 filename = os.path.join(DATA_DIR, "posts-2011-12.xml")
 filename_filtered = os.path.join(DATA_DIR, "filtered.tsv")
+filename_filtered_meta = os.path.join(DATA_DIR, "filtered-meta.json")
 
-q_creation = {}  # creation datetimes of questions
-q_accepted = {}  # id of accepted answer
-
-meta = defaultdict(
-    list)  # question -> [(answer Id, IsAccepted, TimeToAnswer, Score), ...]
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
 
 # regegx to find code snippets
 code_match = re.compile('<pre>(.*?)</pre>', re.MULTILINE | re.DOTALL)
@@ -32,6 +53,7 @@ link_match = re.compile(
     '<a href="http://.*?".*?>(.*?)</a>', re.MULTILINE | re.DOTALL)
 img_match = re.compile('<img(.*?)/>', re.MULTILINE | re.DOTALL)
 tag_match = re.compile('<[^>]*>', re.MULTILINE | re.DOTALL)
+space_match = re.compile(" +")
 
 
 def filter_html(s):
@@ -54,8 +76,8 @@ def filter_html(s):
 
     link_count -= link_count_in_code
 
-    html_free_s = re.sub(
-        " +", " ", tag_match.sub('', code_free_s)).replace("\n", "")
+    html_free_s = space_match.sub(
+        " ", tag_match.sub('', code_free_s)).replace("\n", "")
 
     link_free_s = html_free_s
     for anchor in anchors:
@@ -66,90 +88,249 @@ def filter_html(s):
 
     return link_free_s, num_text_tokens, num_code_lines, link_count, num_images
 
-years = defaultdict(int)
-num_questions = 0
-num_answers = 0
-
-
-def parsexml(filename):
-    global num_questions, num_answers
-
-    counter = 0
-
-    it = map(itemgetter(1),
-             iter(etree.iterparse(filename, events=('start',))))
-    root = next(it)  # get posts element
-
-    for elem in it:
-        if counter % 100000 == 0:
-            print(counter)
 
-        counter += 1
-
-        if elem.tag == 'row':
-            creation_date = dateparser.parse(elem.get('CreationDate'))
-
-            # import pdb;pdb.set_trace()
-            # if creation_date.year < 2011:
-            #    continue
-
-            Id = int(elem.get('Id'))
+def parse_date(s):
+    """fast path for the dump's 2011-01-01T12:34:56.789 format"""
+    if len(s) >= 19 and s[4] == '-' and s[7] == '-' and s[10] == 'T' and \
+            s[13] == ':' and s[16] == ':' and (len(s) == 19 or s[19] == '.'):
+        try:
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                            int(s[11:13]), int(s[14:16]), int(s[17:19]),
+                            int(s[20:26].ljust(6, '0')) if len(s) > 20 else 0)
+        except ValueError:
+            pass
+    return dateparser.parse(s)
+
+
+def split_byte_ranges(path, num_splits):
+    """
+    [(start, end), ...] covering the whole file, every range starts at the
+    beginning of a line, empty ranges are dropped
+    """
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, num_splits):
+            pos = size * i // num_splits
+            if pos <= bounds[-1]:
+                continue
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i + 1] > bounds[i]]
+
+
+def iter_rows(path, start, end):
+    """(byte offset, row element) of every <row .../> line in [start, end)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            offset = pos
+            pos += len(line)
+            if line.lstrip().startswith(b"<row"):
+                yield offset, etree.fromstring(line)
+
+
+def connect(store_fn):
+    conn = sqlite3.connect(store_fn, timeout=600)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    return conn
+
+
+def part_name(output, i):
+    return "%s.part%05d" % (output, i)
+
+
+def write_tsv(f, values):
+    f.write(u"\t".join(text_type(v) for v in values) + u"\n")
+
+
+def parse_part(args):
+    """
+    pass 1: rows -> <output>.partNNNNN.rows, returns the questions
+    (Id, offset, CreationDate, AcceptedAnswerId) and counts
+    """
+    path, start, end, i, output = args
+    questions = []
+    years = defaultdict(int)
+    num_questions = num_answers = 0
+
+    with io.open(part_name(output, i) + ".rows", "w", encoding="utf-8", newline=u"\n") as f:
+        for offset, elem in iter_rows(path, start, end):
             PostTypeId = int(elem.get('PostTypeId'))
-            Score = int(elem.get('Score'))
-
             if PostTypeId == 1:
                 num_questions += 1
-                years[creation_date.year] += 1
-
-                ParentId = -1
-                TimeToAnswer = 0
-                q_creation[Id] = creation_date
+                creation_date = elem.get('CreationDate')
+                years[parse_date(creation_date).year] += 1
                 accepted = elem.get('AcceptedAnswerId')
-                if accepted:
-                    q_accepted[Id] = int(accepted)
-                IsAccepted = 0
-
+                questions.append((int(elem.get('Id')), offset, creation_date,
+                                  int(accepted) if accepted else None))
+                ParentId = -1
             elif PostTypeId == 2:
                 num_answers += 1
-
                 ParentId = int(elem.get('ParentId'))
-                if not ParentId in q_creation:
-                    # question was too far in the past
-                    continue
-
-                TimeToAnswer = (creation_date - q_creation[ParentId]).seconds
-
-                if ParentId in q_accepted:
-                    IsAccepted = int(q_accepted[ParentId] == Id)
-                else:
-                    IsAccepted = 0
-
-                meta[ParentId].append((Id, IsAccepted, TimeToAnswer, Score))
-
             else:
                 continue
 
             Text, NumTextTokens, NumCodeLines, LinkCount, NumImages = filter_html(
                 elem.get('Body'))
-
-            values = (Id, ParentId,
-                      IsAccepted,
-                      TimeToAnswer, Score,
-                      Text,
-                      NumTextTokens, NumCodeLines, LinkCount, NumImages)
-
-            yield values
-
-            root.clear()  # preserve memory
-
-with open(os.path.join(DATA_DIR, filename_filtered), "w") as f:
-    for item in parsexml(filename):
-        line = "\t".join(map(str, item))
-        f.write(line.encode("utf-8") + "\n")
-
-with open(os.path.join(DATA_DIR, "filtered-meta.json"), "w") as f:
-    json.dump(meta, f)
-
-print("years:", years)
-print("#qestions: %i" % num_questions)
-print("#answers: %i" % num_answers)
+            write_tsv(f, (offset, elem.get('Id'), ParentId, elem.get('CreationDate'),
+                          elem.get('Score'), Text,
+                          NumTextTokens, NumCodeLines, LinkCount, NumImages))
+
+    return questions, dict(years), num_questions, num_answers
+
+
+def lookup_questions(conn, ids, chunk_size=500):
+    found = {}
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        rows = conn.execute(
+            "SELECT id, offset, creation, accepted FROM questions WHERE id IN (%s)" %
+            ",".join("?" * len(chunk)), chunk)
+        for Id, offset, creation, accepted in rows:
+            found[Id] = (offset, creation, accepted)
+    return found
+
+
+def join_part(args):
+    """
+    pass 2: <output>.partNNNNN.rows -> <output>.partNNNNN, returns the
+    answers (ParentId, offset, Id, IsAccepted, TimeToAnswer, Score)
+    """
+    i, output, store_fn = args
+    rows_fn = part_name(output, i) + ".rows"
+    rows = []
+    with io.open(rows_fn, encoding="utf-8", newline=u"\n") as f:
+        for line in f:
+            cols = line[:-1].split(u"\t")
+            # the text may contain tabs itself
+            rows.append(cols[:5] + [u"\t".join(cols[5:-4])] + cols[-4:])
+
+    conn = connect(store_fn)
+    questions = lookup_questions(conn, [int(r[2]) for r in rows if r[2] != u"-1"])
+    conn.close()
+
+    answers = []
+    with io.open(part_name(output, i), "w", encoding="utf-8", newline=u"\n") as f:
+        for offset, Id, ParentId, creation_date, Score, Text, NumTextTokens, \
+                NumCodeLines, LinkCount, NumImages in rows:
+            offset, Id, ParentId, Score = int(offset), int(Id), int(ParentId), int(Score)
+            if ParentId == -1:
+                IsAccepted = 0
+                TimeToAnswer = 0
+            else:
+                question = questions.get(ParentId)
+                if question is None or question[0] > offset:
+                    # question was too far in the past
+                    continue
+                q_offset, q_creation, q_accepted = question
+                TimeToAnswer = (parse_date(creation_date) - parse_date(q_creation)).seconds
+                IsAccepted = int(q_accepted == Id)
+                answers.append((ParentId, offset, Id, IsAccepted, TimeToAnswer, Score))
+
+            write_tsv(f, (Id, ParentId,
+                          IsAccepted,
+                          TimeToAnswer, Score,
+                          Text,
+                          NumTextTokens, NumCodeLines, LinkCount, NumImages))
+    os.remove(rows_fn)
+    return answers
+
+
+def write_meta(conn, meta_fn):
+    """question -> [(answer Id, IsAccepted, TimeToAnswer, Score), ...] as JSON"""
+    rows = conn.execute("SELECT parent, id, accepted, time_to_answer, score "
+                        "FROM answers ORDER BY parent, offset")
+    with open(meta_fn, "w") as f:
+        f.write("{")
+        current = None
+        answers = []
+        first = True
+        for parent, Id, IsAccepted, TimeToAnswer, Score in rows:
+            if parent != current:
+                if current is not None:
+                    f.write("%s%s: %s" % ("" if first else ", ", json.dumps(str(current)), json.dumps(answers)))
+                    first = False
+                current = parent
+                answers = []
+            answers.append((Id, IsAccepted, TimeToAnswer, Score))
+        if current is not None:
+            f.write("%s%s: %s" % ("" if first else ", ", json.dumps(str(current)), json.dumps(answers)))
+        f.write("}")
+
+
+def convert(xml_fn, output, meta_fn, num_workers=None, num_parts=None):
+    num_workers = num_workers or multiprocessing.cpu_count()
+    ranges = split_byte_ranges(xml_fn, num_parts or 8 * num_workers)
+    store_fn = output + ".join.sqlite"
+    for fn in (store_fn, store_fn + "-wal", store_fn + "-shm"):
+        if os.path.exists(fn):
+            os.remove(fn)
+    conn = connect(store_fn)
+    conn.execute("CREATE TABLE questions (id INTEGER PRIMARY KEY, offset INTEGER, "
+                 "creation TEXT, accepted INTEGER)")
+    conn.execute("CREATE TABLE answers (parent INTEGER, offset INTEGER, id INTEGER, "
+                 "accepted INTEGER, time_to_answer INTEGER, score INTEGER)")
+    conn.commit()
+
+    years = defaultdict(int)
+    num_questions = num_answers = 0
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        jobs = [(xml_fn, start, end, i, output) for i, (start, end) in enumerate(ranges)]
+        for i, (questions, part_years, part_q, part_a) in enumerate(pool.imap(parse_part, jobs)):
+            conn.executemany("INSERT OR REPLACE INTO questions VALUES (?, ?, ?, ?)", questions)
+            conn.commit()
+            for year, n in part_years.items():
+                years[year] += n
+            num_questions += part_q
+            num_answers += part_a
+            print("parsed part %i/%i" % (i + 1, len(ranges)))
+
+        jobs = [(i, output, store_fn) for i in range(len(ranges))]
+        for i, answers in enumerate(pool.imap(join_part, jobs)):
+            conn.executemany("INSERT INTO answers VALUES (?, ?, ?, ?, ?, ?)", answers)
+            conn.commit()
+            print("joined part %i/%i" % (i + 1, len(ranges)))
+    finally:
+        pool.close()
+        pool.join()
+
+    with open(output, "wb") as f:
+        for i in range(len(ranges)):
+            with open(part_name(output, i), "rb") as part:
+                shutil.copyfileobj(part, f, 16 * 2 ** 20)
+            os.remove(part_name(output, i))
+
+    conn.execute("CREATE INDEX answers_parent ON answers (parent, offset)")
+    write_meta(conn, meta_fn)
+    conn.close()
+    for fn in (store_fn, store_fn + "-wal", store_fn + "-shm"):
+        if os.path.exists(fn):
+            os.remove(fn)
+
+    return years, num_questions, num_answers
+
+
+if __name__ == "__main__":
+    xml_fn = sys.argv[1] if len(sys.argv) > 1 else filename
+    num_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    years, num_questions, num_answers = convert(
+        xml_fn, filename_filtered, filename_filtered_meta, num_workers)
+
+    print("years:", dict(years))
+    print("#qestions: %i" % num_questions)
+    print("#answers: %i" % num_answers)
@@ -16,7 +16,7 @@ from utils import tweak_labels
 
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.pipeline import Pipeline
-from sklearn.grid_search import GridSearchCV
+from cached_grid import grid_search
 from sklearn.metrics import f1_score
 
 from sklearn.naive_bayes import MultinomialNB
@@ -49,13 +49,12 @@ def grid_search_model(clf_factory, X, Y):
                       clf__alpha=[0, 0.01, 0.05, 0.1, 0.5, 1],
                       )
 
-    grid_search = GridSearchCV(clf_factory(),
-                               param_grid=param_grid,
-                               cv=cv,
-                               score_func=f1_score,
-                               verbose=10)
-    grid_search.fit(X, Y)
-    clf = grid_search.best_estimator_
+    # the vectorizer is fitted once per fold and vectorizer setting, not
+    # once per clf__alpha; all results go to grid_search.csv
+    best_params, results = grid_search(clf_factory, param_grid, X, Y, cv,
+                                       score_func=f1_score)
+    clf = clf_factory(best_params)
+    clf.fit(X, Y)
     print clf
 
     return clf
@@ -19,7 +19,7 @@ from utils import log_false_positives
 
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.pipeline import Pipeline, FeatureUnion
-from sklearn.grid_search import GridSearchCV
+from cached_grid import grid_search
 from sklearn.metrics import f1_score
 from sklearn.base import BaseEstimator
 
@@ -30,13 +30,10 @@ from utils import load_sent_word_net
 sent_word_net = load_sent_word_net()
 
 
-import json
+from pos_tagger import PosTagger
 
-poscache_filename = "poscache.json"
-try:
-    poscache = json.load(open(poscache_filename, "r"))
-except IOError:
-    poscache = {}
+# persistent, shared by all processes and runs
+tagger = PosTagger("poscache.sqlite", tokenizer="split")
 
 class StructCounter(BaseEstimator):
     def get_feature_names(self):
@@ -47,17 +44,9 @@ class StructCounter(BaseEstimator):
     def fit(self, documents, y=None):
         return self
 
-    def _get_sentiments(self, d):
+    def _get_sentiments(self, d, tagged):
         # http://www.ling.upenn.edu/courses/Fall_2003/ling001/penn_treebank_pos.html
         #import pdb;pdb.set_trace()
-        sent = tuple(d.split())
-        if poscache is not None:
-            if d in poscache:
-                tagged = poscache[d]
-            else:
-                poscache[d] = tagged = nltk.pos_tag(sent)
-        else:
-            tagged = nltk.pos_tag(sent)
 
         pos_vals = []
         neg_vals = []
@@ -92,7 +81,7 @@ class StructCounter(BaseEstimator):
             pos_vals.append(p)
             neg_vals.append(n)
 
-        l = len(sent)
+        l = len(tagged)
         avg_pos_val = np.mean(pos_vals)
         avg_neg_val = np.mean(neg_vals)
         return [1-avg_pos_val-avg_neg_val, avg_pos_val, avg_neg_val,
@@ -100,7 +89,8 @@ class StructCounter(BaseEstimator):
 
 
     def transform(self, documents):
-        obj_val, pos_val, neg_val, nouns, adjectives, verbs, adverbs = np.array([self._get_sentiments(d) for d in documents]).T
+        obj_val, pos_val, neg_val, nouns, adjectives, verbs, adverbs = np.array(
+            [self._get_sentiments(d, tagged) for d, tagged in zip(documents, tagger.tag_many(documents))]).T
 
         allcaps = []
         exclamation = []
@@ -181,13 +171,12 @@ def grid_search_model(clf_factory, X, Y):
                       clf__alpha=[0, 0.01, 0.05, 0.1, 0.5, 1],
                       )
 
-    grid_search = GridSearchCV(clf_factory(),
-                               param_grid=param_grid,
-                               cv=cv,
-                               score_func=f1_score,
-                               verbose=10)
-    grid_search.fit(X, Y)
-    clf = grid_search.best_estimator_
+    # the vectorizer is fitted once per fold and vectorizer setting, not
+    # once per clf__alpha; all results go to grid_search.csv
+    best_params, results = grid_search(clf_factory, param_grid, X, Y, cv,
+                                       score_func=f1_score)
+    clf = clf_factory(best_params)
+    clf.fit(X, Y)
     print clf
 
     return clf
@@ -310,5 +299,3 @@ if __name__ == "__main__":
     grid_search_model(create_union_model, X, Y)
 
     print "time spent:", time.time() - start_time
-
-    json.dump(poscache, open(poscache_filename, "w"))
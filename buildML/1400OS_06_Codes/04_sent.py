@@ -20,7 +20,7 @@ from utils import log_false_positives
 
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.pipeline import Pipeline, FeatureUnion
-from sklearn.grid_search import GridSearchCV
+from cached_grid import grid_search
 from sklearn.metrics import f1_score
 from sklearn.base import BaseEstimator
 
@@ -32,13 +32,10 @@ sent_word_net = load_sent_word_net()
 
 phase = "04"
 
-import json
+from pos_tagger import PosTagger
 
-poscache_filename = "poscache.json"
-try:
-    poscache = json.load(open(poscache_filename, "r"))
-except IOError:
-    poscache = {}
+# persistent, shared by all processes and runs
+tagger = PosTagger("poscache.sqlite")
 
 class LinguisticVectorizer(BaseEstimator):
     def get_feature_names(self):
@@ -49,17 +46,9 @@ class LinguisticVectorizer(BaseEstimator):
     def fit(self, documents, y=None):
         return self
 
-    def _get_sentiments(self, d):
+    def _get_sentiments(self, d, tagged):
         # http://www.ling.upenn.edu/courses/Fall_2003/ling001/penn_treebank_pos.html
         #import pdb;pdb.set_trace()
-        sent = tuple(nltk.word_tokenize(d))
-        if poscache is not None:
-            if d in poscache:
-                tagged = poscache[d]
-            else:
-                poscache[d] = tagged = nltk.pos_tag(sent)
-        else:
-            tagged = nltk.pos_tag(sent)
 
         pos_vals = []
         neg_vals = []
@@ -94,7 +83,7 @@ class LinguisticVectorizer(BaseEstimator):
             pos_vals.append(p)
             neg_vals.append(n)
 
-        l = len(sent)
+        l = len(tagged)
         avg_pos_val = np.mean(pos_vals)
         avg_neg_val = np.mean(neg_vals)
         #import pdb;pdb.set_trace()
@@ -103,7 +92,8 @@ class LinguisticVectorizer(BaseEstimator):
 
 
     def transform(self, documents):
-        obj_val, pos_val, neg_val, nouns, adjectives, verbs, adverbs = np.array([self._get_sentiments(d) for d in documents]).T
+        obj_val, pos_val, neg_val, nouns, adjectives, verbs, adverbs = np.array(
+            [self._get_sentiments(d, tagged) for d, tagged in zip(documents, tagger.tag_many(documents))]).T
 
         allcaps = []
         exclamation = []
@@ -192,22 +182,21 @@ def __grid_search_model(clf_factory, X, Y):
     cv = ShuffleSplit(
         n=len(X), n_iter=10, test_size=0.3, indices=True, random_state=0)
 
-    param_grid = dict(vect__ngram_range=[(1, 1), (1, 2), (1, 3)],
-                      vect__min_df=[1, 2],
-                      vect__smooth_idf=[False, True],
-                      vect__use_idf=[False, True],
-                      vect__sublinear_tf=[False, True],
-                      vect__binary=[False, True],
+    param_grid = dict(all__tfidf__ngram_range=[(1, 1), (1, 2), (1, 3)],
+                      all__tfidf__min_df=[1, 2],
+                      all__tfidf__smooth_idf=[False, True],
+                      all__tfidf__use_idf=[False, True],
+                      all__tfidf__sublinear_tf=[False, True],
+                      all__tfidf__binary=[False, True],
                       clf__alpha=[0, 0.01, 0.05, 0.1, 0.5, 1],
                       )
 
-    grid_search = GridSearchCV(clf_factory(),
-                               param_grid=param_grid,
-                               cv=cv,
-                               score_func=f1_score,
-                               verbose=10)
-    grid_search.fit(X, Y)
-    clf = grid_search.best_estimator_
+    # the vectorizer is fitted once per fold and vectorizer setting, not
+    # once per clf__alpha; all results go to grid_search.csv
+    best_params, results = grid_search(clf_factory, param_grid, X, Y, cv,
+                                       score_func=f1_score)
+    clf = clf_factory(best_params)
+    clf.fit(X, Y)
     print clf
 
     return clf
@@ -332,5 +321,3 @@ if __name__ == "__main__":
     plot=True)
 
     print "time spent:", time.time() - start_time
-
-    json.dump(poscache, open(poscache_filename, "w"))
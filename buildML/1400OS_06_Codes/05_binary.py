@@ -31,13 +31,10 @@ from utils import load_sent_word_net
 sent_word_net = load_sent_word_net()
 
 
-import json
+from pos_tagger import PosTagger
 
-poscache_filename = "poscache.json"
-try:
-    poscache = json.load(open(poscache_filename, "r"))
-except IOError:
-    poscache = {}
+# persistent, shared by all processes and runs
+tagger = PosTagger("poscache.sqlite")
 
 class LinguisticVectorizer(BaseEstimator):
     def get_feature_names(self):
@@ -48,17 +45,9 @@ class LinguisticVectorizer(BaseEstimator):
     def fit(self, documents, y=None):
         return self
 
-    def _get_sentiments(self, d):
+    def _get_sentiments(self, d, tagged):
         # http://www.ling.upenn.edu/courses/Fall_2003/ling001/penn_treebank_pos.html
         #import pdb;pdb.set_trace()
-        sent = tuple(nltk.word_tokenize(d))
-        if poscache is not None:
-            if d in poscache:
-                tagged = poscache[d]
-            else:
-                poscache[d] = tagged = nltk.pos_tag(sent)
-        else:
-            tagged = nltk.pos_tag(sent)
 
         pos_vals = []
         neg_vals = []
@@ -93,7 +82,7 @@ class LinguisticVectorizer(BaseEstimator):
             pos_vals.append(p)
             neg_vals.append(n)
 
-        l = len(sent)
+        l = len(tagged)
         avg_pos_val = np.mean(pos_vals)
         avg_neg_val = np.mean(neg_vals)
         #import pdb;pdb.set_trace()
@@ -102,7 +91,8 @@ class LinguisticVectorizer(BaseEstimator):
 
 
     def transform(self, documents):
-        obj_val, pos_val, neg_val, nouns, adjectives, verbs, adverbs = np.array([self._get_sentiments(d) for d in documents]).T
+        obj_val, pos_val, neg_val, nouns, adjectives, verbs, adverbs = np.array(
+            [self._get_sentiments(d, tagged) for d, tagged in zip(documents, tagger.tag_many(documents))]).T
 
         allcaps = []
         exclamation = []
@@ -322,5 +312,3 @@ if __name__ == "__main__":
     plot=True)
 
     print "time spent:", time.time() - start_time
-
-    json.dump(poscache, open(poscache_filename, "w"))
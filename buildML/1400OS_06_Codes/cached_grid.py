@@ -0,0 +1,221 @@
+#
+# Grid search over a Pipeline([transformer, ..., ('clf', classifier)]) that
+# does not refit the transformers for every classifier parameter.
+#
+# The candidates are grouped by their transformer parameters. A worker
+# process takes one group, fits the transformers once per fold and scores
+# all classifier parameters of the group on the transformed fold. The
+# transformed folds are cached on disk under a fingerprint of the data, the
+# fold and the stages up to that transformer (classes, all parameters and
+# the source of functions like preprocessors), so that reruns and other
+# groups sharing a prefix of the pipeline reuse them, and other scripts or
+# edited transformers do not.
+# Every result is appended to a CSV file as soon as its group is done.
+#
+
+import csv
+import hashlib
+import inspect
+import itertools
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+# set in every worker process by _init_worker
+_data = {}
+
+
+def param_combinations(param_grid):
+    names = sorted(param_grid)
+    for values in itertools.product(*[param_grid[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+def data_fingerprint(X, Y, folds):
+    h = hashlib.sha1()
+    for x in X:
+        if not isinstance(x, bytes):
+            x = x.encode("utf-8")
+        h.update(x)
+        h.update(b"\0")
+    h.update(np.asarray(Y).tobytes())
+    for train, test in folds:
+        h.update(np.asarray(train).tobytes())
+        h.update(np.asarray(test).tobytes())
+    return h.hexdigest()
+
+
+def _source(obj):
+    try:
+        return inspect.getsource(obj)
+    except (IOError, TypeError):
+        return ""
+
+
+def describe(value):
+    """
+    text that changes whenever `value` would transform differently: the
+    class and all parameters of an estimator (nested ones included), the
+    source of functions such as a preprocessor, and the source of estimator
+    classes defined in the script itself
+    """
+    if hasattr(value, "get_params") and not isinstance(value, type):
+        cls = type(value)
+        name = "%s.%s" % (cls.__module__, cls.__name__)
+        if cls.__module__ == "__main__":
+            name += _source(cls)
+        params = value.get_params(deep=False)
+        return "%s(%s)" % (name, ", ".join("%s=%s" % (key, describe(params[key]))
+                                           for key in sorted(params)))
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ", ".join(describe(v) for v in value)
+    if isinstance(value, dict):
+        return "{%s}" % ", ".join("%r: %s" % (key, describe(value[key]))
+                                  for key in sorted(value))
+    if inspect.isfunction(value) or inspect.ismethod(value):
+        return "%s.%s:%s" % (value.__module__, value.__name__, _source(value))
+    return repr(value)
+
+
+def stage_fingerprint(data_fp, fold, steps):
+    """identifies the output of the (name, transformer) `steps` fitted on `fold`"""
+    h = hashlib.sha1(data_fp.encode("ascii"))
+    h.update(repr(fold).encode("utf-8"))
+    for name, step in steps:
+        text = "%s=%s\0" % (name, describe(step))
+        # Python 2: str already, possibly with non-ascii source code
+        h.update(text if isinstance(text, bytes) else text.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _load(fn):
+    with open(fn, "rb") as f:
+        return pickle.load(f)
+
+
+def _dump(obj, fn):
+    # write + rename: other workers never see a half written file
+    tmp = "%s.tmp%d" % (fn, os.getpid())
+    with open(tmp, "wb") as f:
+        pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp, fn)
+
+
+def transformed_fold(pipeline, fold):
+    """
+    X_train, X_test after all but the last step of `pipeline`, starting
+    from the deepest stage found in the cache
+    """
+    X, Y, folds = _data["X"], _data["Y"], _data["folds"]
+    cache_dir, data_fp = _data["cache_dir"], _data["data_fp"]
+    train, test = folds[fold]
+    steps = pipeline.steps[:-1]
+
+    fns = [os.path.join(cache_dir, stage_fingerprint(data_fp, fold, steps[:i + 1]))
+           for i in range(len(steps))]
+    start = 0
+    X_train, X_test = X[train], X[test]
+    for i in reversed(range(len(steps))):
+        if os.path.exists(fns[i]):
+            X_train, X_test = _load(fns[i])
+            start = i + 1
+            break
+
+    for i in range(start, len(steps)):
+        step = steps[i][1]
+        X_train = step.fit_transform(X_train, Y[train])
+        X_test = step.transform(X_test)
+        _dump((X_train, X_test), fns[i])
+    return X_train, X_test
+
+
+def _init_worker(data):
+    _data.update(data)
+
+
+def _score_group(group):
+    """mean and std of the scores of every candidate in `group`"""
+    clf_factory, score_func = _data["clf_factory"], _data["score_func"]
+    Y, folds = _data["Y"], _data["folds"]
+    start = time.time()
+    scores = np.zeros((len(group), len(folds)))
+    for fold, (train, test) in enumerate(folds):
+        pipeline = clf_factory(group[0])
+        X_train, X_test = transformed_fold(pipeline, fold)
+        for i, params in enumerate(group):
+            clf = clf_factory(params).steps[-1][1]
+            clf.fit(X_train, Y[train])
+            scores[i, fold] = score_func(Y[test], clf.predict(X_test))
+    duration = (time.time() - start) / len(group)
+    return [(params, scores[i].mean(), scores[i].std(), duration)
+            for i, params in enumerate(group)]
+
+
+def _open_csv(fn):
+    if sys.version_info[0] < 3:
+        return open(fn, "wb")
+    return open(fn, "w", newline="")
+
+
+def grid_search(clf_factory, param_grid, X, Y, cv, score_func,
+                cache_dir="grid_cache", csv_fn="grid_search.csv", n_jobs=None,
+                verbose=True):
+    """
+    best_params, results = grid_search(create_ngram_model, param_grid, X, Y, cv, f1_score)
+
+    clf_factory(params) must return the Pipeline with `params` set; its last
+    step is the classifier.
+
+    Returns
+    -------
+    best_params : dict, the candidate with the highest mean score
+    results : list of (params, mean score, std score, seconds per candidate)
+    """
+    folds = [(np.asarray(train), np.asarray(test)) for train, test in cv]
+    X = np.asarray(X)
+    Y = np.asarray(Y)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    clf_name = clf_factory().steps[-1][0]
+    candidates = list(param_combinations(param_grid))
+    groups = {}
+    for params in candidates:
+        key = tuple(sorted((name, repr(value)) for name, value in params.items()
+                           if name.split("__")[0] != clf_name))
+        groups.setdefault(key, []).append(params)
+    groups = [groups[key] for key in sorted(groups)]
+
+    data = dict(X=X, Y=Y, folds=folds, clf_factory=clf_factory,
+                score_func=score_func, cache_dir=cache_dir,
+                data_fp=data_fingerprint(X, Y, folds))
+    names = sorted(param_grid)
+    results = []
+    pool = multiprocessing.Pool(n_jobs, initializer=_init_worker, initargs=(data,))
+    try:
+        with _open_csv(csv_fn) as f:
+            writer = csv.writer(f)
+            writer.writerow(names + ["mean_score", "std_score", "seconds"])
+            for i, group_results in enumerate(pool.imap_unordered(_score_group, groups)):
+                for params, mean, std, duration in group_results:
+                    writer.writerow([params[name] for name in names] +
+                                    ["%.5f" % mean, "%.5f" % std, "%.3f" % duration])
+                f.flush()
+                results.extend(group_results)
+                if verbose:
+                    best = max(results, key=lambda r: r[1])
+                    print("%i/%i groups done, best so far %.4f" % (i + 1, len(groups), best[1]))
+    finally:
+        pool.close()
+        pool.join()
+
+    # results arrive in any order: sort them back so that ties are broken
+    # the same way in every run
+    order = dict((repr(sorted(p.items())), i) for i, p in enumerate(candidates))
+    results.sort(key=lambda r: order[repr(sorted(r[0].items()))])
+    best_params = max(results, key=lambda r: r[1])[0]
+    return best_params, results
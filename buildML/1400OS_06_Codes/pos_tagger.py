@@ -0,0 +1,126 @@
+#
+# POS tagging with a persistent cache that is shared by all processes
+# (grid search folds, parallel jobs, later runs of the scripts).
+#
+# The tags of a text are stored in an SQLite file under the SHA1 of the
+# tokenizer name and the text. tag_many() looks up all texts with a few
+# SELECTs and tags only the misses, in a process pool if there are many of
+# them, so that after the first run transform() is dominated by lookups.
+#
+
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+
+TOKENIZERS = ("word_tokenize", "split")
+
+# below that many cache misses a pool costs more than it saves
+MIN_POOL_SIZE = 200
+
+
+def _tag_text(args):
+    tokenizer, text = args
+    import nltk
+    if tokenizer == "split":
+        tokens = text.split()
+    else:
+        tokens = nltk.word_tokenize(text)
+    return nltk.pos_tag(tokens)
+
+
+def text_key(text, tokenizer="word_tokenize"):
+    if not isinstance(text, bytes):
+        text = text.encode("utf-8")
+    return hashlib.sha1(tokenizer.encode("ascii") + b"\0" + text).hexdigest()
+
+
+class PosTagger(object):
+    """
+    tagger = PosTagger("poscache.sqlite")
+    tagged_docs = tagger.tag_many(docs)  # [[(word, tag), ...], ...]
+    """
+
+    def __init__(self, filename="poscache.sqlite", processes=None,
+                 tokenizer="word_tokenize"):
+        assert tokenizer in TOKENIZERS, tokenizer
+        self.filename = filename
+        self.processes = processes
+        self.tokenizer = tokenizer
+        # the tags already looked up by this process
+        self.memo = {}
+        self._conn = None
+        self._pid = None
+
+    def __getstate__(self):
+        # sqlite connections cannot be pickled (or shared with a forked child)
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    @property
+    def conn(self):
+        if self._conn is None or self._pid != os.getpid():
+            # a forked child (e.g. a grid search worker) opens its own
+            self._pid = os.getpid()
+            # timeout: wait for the write lock of other processes
+            self._conn = sqlite3.connect(self.filename, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS tags "
+                               "(key TEXT PRIMARY KEY, tags TEXT)")
+            self._conn.commit()
+        return self._conn
+
+    def _lookup(self, keys, chunk_size=500):
+        found = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            rows = self.conn.execute(
+                "SELECT key, tags FROM tags WHERE key IN (%s)" %
+                ",".join("?" * len(chunk)), chunk)
+            for key, tags in rows:
+                found[key] = [tuple(x) for x in json.loads(tags)]
+        return found
+
+    def _store(self, tagged):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tags (key, tags) VALUES (?, ?)",
+                [(key, json.dumps(tags)) for key, tags in tagged.items()])
+
+    def tag_many(self, texts):
+        texts = list(texts)
+        keys = [text_key(t, self.tokenizer) for t in texts]
+
+        missing = sorted(set(k for k in keys if k not in self.memo))
+        if missing:
+            self.memo.update(self._lookup(missing))
+
+        misses = {}
+        for key, text in zip(keys, texts):
+            if key not in self.memo and key not in misses:
+                misses[key] = text
+        if misses:
+            miss_keys = list(misses)
+            jobs = [(self.tokenizer, misses[k]) for k in miss_keys]
+            # pool workers (daemons) cannot start a pool of their own
+            if self.processes == 1 or len(jobs) < MIN_POOL_SIZE or \
+                    multiprocessing.current_process().daemon:
+                results = list(map(_tag_text, jobs))
+            else:
+                pool = multiprocessing.Pool(self.processes)
+                try:
+                    results = pool.map(_tag_text, jobs, chunksize=50)
+                finally:
+                    pool.close()
+                    pool.join()
+            tagged = dict((k, [tuple(x) for x in tags])
+                          for k, tags in zip(miss_keys, results))
+            self._store(tagged)
+            self.memo.update(tagged)
+
+        return [self.memo[k] for k in keys]
+
+    def tag(self, text):
+        return self.tag_many([text])[0]
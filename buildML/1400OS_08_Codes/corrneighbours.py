@@ -3,7 +3,6 @@ from all_correlations import all_correlations
 import numpy as np
 from scipy import sparse
 from load_ml100k import load
-reviews = load()
 
 def estimate_user(user, rest):
     bu = user > 0
@@ -24,21 +23,86 @@ def train_test(user, rest):
     nerr = null[bu]-user[bu]
     return np.dot(err,err), np.dot(nerr, nerr)
 
-def cross_validate_all():
+# The functions below compute the same leave-one-out estimates as
+# estimate_user(reviews[i], np.delete(reviews, i, 0)) for all users, without
+# copying the ratings matrix: the correlations of a block of users against
+# everyone come from one sparse product, the user itself is masked out, and
+# the neighbour ratings are summed with a second sparse product. Only
+# (block_size x n_users) and (block_size x n_movies) dense arrays are
+# allocated, so this also works for ml-20m sized rating matrices.
+
+def _binary_stats(rated):
+    '''mean and std (+1e-5, as in all_correlations) of every 0/1 row'''
+    n = float(rated.shape[1])
+    mean = np.asarray(rated.sum(1)).ravel() / n
+    std = np.sqrt(np.maximum(mean - mean ** 2, 0)) + 1e-5
+    return mean, std
+
+def block_correlations(rated, rows, mean, std):
+    '''
+    corrs = block_correlations(rated, rows, mean, std)
+
+    corrs[i, j] is all_correlations(rated[rows[i]], rated)[j], except that
+    corrs[i, rows[i]] is -inf (leave-one-out)
+    '''
+    n = float(rated.shape[1])
+    corrs = (rated[rows].dot(rated.T)).toarray().astype(np.float32)
+    corrs -= n * mean[rows][:, None] * mean[None, :]
+    corrs /= n * std[rows][:, None] * std[None, :]
+    corrs[np.arange(len(rows)), rows] = -np.inf
+    return corrs
+
+def iter_estimates(reviews, k=100, block_size=256):
+    '''
+    for rows, estimates in iter_estimates(reviews, k=100, block_size=256): ...
+
+    Leave-one-out neighbour estimates of users `rows` (dense block)
+    '''
+    reviews = sparse.csr_matrix(reviews, dtype=float)
+    rated = (reviews > 0).astype(float).tocsr()
+    mean, std = _binary_stats(rated)
+    nusers = reviews.shape[0]
+    k = min(k, nusers - 1)
+    for start in range(0, nusers, block_size):
+        rows = np.arange(start, min(start + block_size, nusers))
+        corrs = block_correlations(rated, rows, mean, std)
+        selected = np.argpartition(-corrs, k - 1, axis=1)[:, :k]
+        # selection matrix: one row per user with ones at its k neighbours
+        select = sparse.csr_matrix((np.ones(selected.size), selected.ravel(),
+                                    np.arange(0, selected.size + 1, k)),
+                                   shape=(len(rows), nusers))
+        # rest[selected].mean(0) / (.1 + br[selected].mean(0))
+        estimates = select.dot(reviews).toarray()
+        estimates /= (.1 * k + select.dot(rated).toarray())
+        yield rows, estimates
+
+def cross_validate_all(reviews, k=100, block_size=256):
+    reviews = sparse.csr_matrix(reviews, dtype=float)
+    rated = (reviews > 0).astype(float).tocsr()
+    nusers = reviews.shape[0]
+    col_sum = np.asarray(reviews.sum(0)).ravel()
+    col_count = np.asarray(rated.sum(0)).ravel()
     err = []
-    for i in xrange(reviews.shape[0]):
-        err.append(
-            train_test(reviews[i], np.delete(reviews, i, 0))
-            )
-    revs = (reviews > 0).sum(1)
-    err = np.array(err)
+    for rows, estimates in iter_estimates(reviews, k, block_size):
+        user = reviews[rows].toarray()
+        bu = user > 0
+        # null model on everyone but the user
+        null = (col_sum - user) / (nusers - 1)
+        null /= (.1 + (col_count - bu) / float(nusers - 1))
+        e = np.where(bu, estimates - user, 0)
+        ne = np.where(bu, null - user, 0)
+        err.append(np.c_[(e ** 2).sum(1), (ne ** 2).sum(1)])
+    revs = np.asarray(rated.sum(1)).ravel()
+    err = np.concatenate(err)
     rmse = np.sqrt(err / revs[:,None])
     print(np.mean(rmse, 0))
     print(np.mean(rmse[revs > 60], 0))
 
-def all_estimates(reviews):
-    reviews = reviews.toarray()
-    estimates = np.zeros_like(reviews)
-    for i in xrange(reviews.shape[0]):
-        estimates[i] = estimate_user(reviews[i], np.delete(reviews, i, 0))
+def all_estimates(reviews, k=100, block_size=256):
+    estimates = np.zeros(reviews.shape)
+    for rows, block in iter_estimates(reviews, k, block_size):
+        estimates[rows] = block
     return estimates
+
+if __name__ == '__main__':
+    cross_validate_all(load())
@@ -8,6 +8,7 @@ import scipy.io.wavfile
 from scikits.talkbox.features import mfcc
 
 from utils import GENRE_DIR
+from feature_store import FeatureStore, list_wavs
 
 
 def write_ceps(ceps, fn):
@@ -20,14 +21,40 @@ def write_ceps(ceps, fn):
     print "Written", data_fn
 
 
-def create_ceps(fn):
+def extract_ceps(fn):
     sample_rate, X = scipy.io.wavfile.read(fn)
 
     ceps, mspec, spec = mfcc(X)
-    write_ceps(ceps, fn)
+    return ceps
+
+
+def create_ceps(fn):
+    write_ceps(extract_ceps(fn), fn)
+
+
+def ceps_store(genre_list, base_dir=GENRE_DIR, processes=None):
+    """
+    MFCC of all wav files of genre_list in one memory-mapped FeatureStore,
+    only new or modified wav files are processed again.
+    """
+    store = FeatureStore(os.path.join(base_dir, "ceps_store"), extract_ceps)
+    files, labels = list_wavs(genre_list, base_dir)
+    num_extracted = store.update(files, labels, processes)
+    if num_extracted:
+        print "Extracted MFCC of", num_extracted, "files"
+    return store
 
 
 def read_ceps(genre_list, base_dir=GENRE_DIR):
+    store = ceps_store(genre_list, base_dir)
+    # mean over the middle 80% of the frames of every song
+    X = store.segment_means(0.1, 0.9)
+    y = np.array([genre_list.index(genre) for genre in store.labels])
+    return X, y
+
+
+def read_ceps_files(genre_list, base_dir=GENRE_DIR):
+    """reads the separate .ceps.npy files written by create_ceps"""
     X = []
     y = []
     for label, genre in enumerate(genre_list):
@@ -42,8 +69,6 @@ def read_ceps(genre_list, base_dir=GENRE_DIR):
 
 
 if __name__ == "__main__":
-    os.chdir(GENRE_DIR)
-    glob_wav = os.path.join(sys.argv[1], "*.wav")
-    print glob_wav
-    for fn in glob.glob(glob_wav):
-        create_ceps(fn)
+    # python ceps.py [genre ...]: extract the MFCC of these genres into the feature store
+    from utils import GENRE_LIST
+    ceps_store(sys.argv[1:] or GENRE_LIST)
@@ -0,0 +1,164 @@
+import os
+import glob
+import json
+import multiprocessing
+
+import numpy as np
+
+
+def list_wavs(genre_list, base_dir):
+    """wav files of every genre in genre_list (sorted per genre) and their genres"""
+    files = []
+    labels = []
+    for genre in genre_list:
+        genre_files = sorted(glob.glob(os.path.join(base_dir, genre, "*.wav")))
+        assert(genre_files), genre
+        files.extend(genre_files)
+        labels.extend([genre] * len(genre_files))
+    return files, labels
+
+
+class FeatureStore(object):
+    """
+    Features of many files consolidated into one memory-mapped array.
+
+    The features of file i (an array whose first axis may have a different
+    length for every file, e.g. MFCC frames) are rows
+    data[offsets[i]:offsets[i + 1]] of `<path>.npy`. `<path>.index.json`
+    keeps, for every file, its path, mtime, size, label and offset.
+
+    update() only runs `extract` (in a process pool) on files that are new
+    or whose mtime/size changed; the features of unchanged files are copied
+    over from the previous store.
+    """
+
+    def __init__(self, path, extract):
+        self.path = path
+        self.data_fn = path + ".npy"
+        self.index_fn = path + ".index.json"
+        self.extract = extract
+        self.entries = []
+        self.data = None
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(self.index_fn) and os.path.exists(self.data_fn)):
+            return
+        with open(self.index_fn) as f:
+            entries = json.load(f)
+        data = np.load(self.data_fn, mmap_mode="r")
+        total = entries[-1]["offset"] + entries[-1]["length"] if entries else 0
+        if len(data) == total:
+            self.entries = entries
+            self.data = data
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def offsets(self):
+        return np.array([e["offset"] for e in self.entries] + [len(self.data) if self.data is not None else 0])
+
+    @property
+    def labels(self):
+        return [e["label"] for e in self.entries]
+
+    @property
+    def paths(self):
+        return [e["path"] for e in self.entries]
+
+    def __getitem__(self, i):
+        e = self.entries[i]
+        return self.data[e["offset"]:e["offset"] + e["length"]]
+
+    def is_stale(self, fn, entry):
+        st = os.stat(fn)
+        return entry is None or entry["mtime"] != st.st_mtime or entry["size"] != st.st_size
+
+    def update(self, files, labels=None, processes=None):
+        """
+        Make the store contain exactly `files` (in this order). Returns the
+        number of files that had to be (re)extracted.
+        """
+        if labels is None:
+            labels = [None] * len(files)
+        old = dict((e["path"], (i, e)) for i, e in enumerate(self.entries))
+        stale = [fn for fn in files if self.is_stale(fn, old.get(fn, (None, None))[1])]
+
+        if not stale and [e["path"] for e in self.entries] == list(files) \
+                and [e["label"] for e in self.entries] == list(labels):
+            return 0
+
+        new_features = {}
+        if stale:
+            if processes == 1 or len(stale) == 1:
+                results = map(self.extract, stale)
+                pool = None
+            else:
+                pool = multiprocessing.Pool(processes)
+                results = pool.imap(self.extract, stale, chunksize=4)
+            try:
+                for fn, features in zip(stale, results):
+                    new_features[fn] = np.asarray(features)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+        self._write(files, labels, old, new_features)
+        return len(stale)
+
+    def _write(self, files, labels, old, new_features):
+        def features_of(fn):
+            if fn in new_features:
+                return new_features[fn]
+            return self[old[fn][0]]
+
+        lengths = [len(features_of(fn)) for fn in files]
+        first = features_of(files[0]) if files else np.zeros((0,))
+        shape = (sum(lengths),) + first.shape[1:]
+
+        tmp_fn = self.path + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp_fn, mode="w+", dtype=first.dtype, shape=shape)
+        entries = []
+        offset = 0
+        for fn, label, length in zip(files, labels, lengths):
+            out[offset:offset + length] = features_of(fn)
+            st = os.stat(fn)
+            entries.append({"path": fn, "mtime": st.st_mtime, "size": st.st_size,
+                            "label": label, "offset": offset, "length": length})
+            offset += length
+        out.flush()
+        del out
+        self.data = None  # release the old memmap before replacing its file
+        os.rename(tmp_fn, self.data_fn)
+        with open(self.index_fn + ".tmp", "w") as f:
+            json.dump(entries, f)
+        os.rename(self.index_fn + ".tmp", self.index_fn)
+        self.entries = entries
+        self.data = np.load(self.data_fn, mmap_mode="r")
+
+    def segment_means(self, start_frac=0.0, end_frac=1.0):
+        """
+        Mean of rows [int(n * start_frac), int(n * end_frac)) of every file,
+        n being the number of rows of the file, in one np.add.reduceat pass.
+        Like np.mean of an empty slice, an empty segment (e.g. a file without
+        rows) gives NaN.
+        """
+        offsets = self.offsets
+        lengths = np.diff(offsets)
+        # + 1e-9: int(n * 0.9) must not become n * 9 / 10 - 1 through rounding
+        starts = offsets[:-1] + np.floor(lengths * start_frac + 1e-9).astype(int)
+        ends = offsets[:-1] + np.floor(lengths * end_frac + 1e-9).astype(int)
+        means = np.full((len(starts),) + self.data.shape[1:], np.nan)
+        # reduceat would read a row of the next file for an empty segment
+        nonempty = ends > starts
+        if not nonempty.any():
+            return means
+        starts, ends = starts[nonempty], ends[nonempty]
+        indices = np.column_stack([starts, ends]).ravel()
+        if indices[-1] >= len(self.data):
+            # the last segment runs to the end of the array
+            indices = indices[:-1]
+        sums = np.add.reduceat(self.data, indices, axis=0)[::2]
+        means[nonempty] = sums / (ends - starts).reshape((-1,) + (1,) * (sums.ndim - 1))
+        return means
@@ -7,6 +7,7 @@ import scipy
 import scipy.io.wavfile
 
 from utils import GENRE_DIR, CHART_DIR
+from feature_store import FeatureStore, list_wavs
 
 import matplotlib.pyplot as plt
 from matplotlib.ticker import EngFormatter
@@ -23,14 +24,39 @@ def write_fft(fft_features, fn):
     print "Written", data_fn
 
 
-def create_fft(fn):
+def extract_fft(fn):
     sample_rate, X = scipy.io.wavfile.read(fn)
 
-    fft_features = abs(scipy.fft(X)[:1000])
-    write_fft(fft_features, fn)
+    return abs(scipy.fft(X)[:1000])
+
+
+def create_fft(fn):
+    write_fft(extract_fft(fn), fn)
+
+
+def fft_store(genre_list, base_dir=GENRE_DIR, processes=None):
+    """
+    FFT features of all wav files of genre_list in one memory-mapped FeatureStore,
+    only new or modified wav files are processed again.
+    """
+    store = FeatureStore(os.path.join(base_dir, "fft_store"), extract_fft)
+    files, labels = list_wavs(genre_list, base_dir)
+    num_extracted = store.update(files, labels, processes)
+    if num_extracted:
+        print "Extracted FFT of", num_extracted, "files"
+    return store
 
 
 def read_fft(genre_list, base_dir=GENRE_DIR):
+    store = fft_store(genre_list, base_dir)
+    # every file has 1000 rows: one slice of the memmap per song
+    X = np.asarray(store.data).reshape(len(store), -1)
+    y = np.array([genre_list.index(genre) for genre in store.labels])
+    return X, y
+
+
+def read_fft_files(genre_list, base_dir=GENRE_DIR):
+    """reads the separate .fft.npy files written by create_fft"""
     X = []
     y = []
     for label, genre in enumerate(genre_list):
@@ -0,0 +1,209 @@
+import os
+import json
+import multiprocessing
+
+import numpy as np
+import mahotas as mh
+
+from edginess import edginess_sobel
+
+# name -> (function(image) -> 1-d array, number of values)
+registry = {}
+
+
+def feature(name, size):
+    '''
+    @feature('name', size)
+    def f(image): ...
+
+    Registers f, which gets an Image and returns `size` values
+    '''
+    def register(f):
+        registry[name] = (f, size)
+        return f
+    return register
+
+
+class Image(object):
+    '''
+    An image decoded once; every feature function works on the same buffer
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.pixels = mh.imread(filename)
+        self._grey = None
+
+    @property
+    def grey(self):
+        '''float grey image, like mh.imread(filename, as_grey=True)'''
+        if self._grey is None:
+            if self.pixels.ndim == 3:
+                self._grey = mh.colors.rgb2grey(self.pixels)
+            else:
+                self._grey = self.pixels.astype(float)
+        return self._grey
+
+
+@feature('haralick', 13)
+def haralick(image):
+    return mh.features.haralick(image.grey.astype(np.uint8)).mean(0)
+
+
+@feature('sobel', 1)
+def sobel(image):
+    return [edginess_sobel(image.grey)]
+
+
+@feature('chist', 64)
+def colour_histogram(image):
+    '''fraction of the pixels in each of 4 x 4 x 4 RGB bins'''
+    pixels = image.pixels
+    if pixels.ndim == 2:
+        pixels = np.dstack([pixels] * 3)
+    binned = (pixels[:, :, :3].astype(np.uint8) // 64).reshape(-1, 3)
+    codes = binned[:, 0] * 16 + binned[:, 1] * 4 + binned[:, 2]
+    hist = np.bincount(codes, minlength=64)
+    return hist / float(len(codes))
+
+
+def compute(job):
+    '''decodes one file and computes the features `names` on it'''
+    filename, names = job
+    image = Image(filename)
+    return [np.asarray(registry[name][0](image), dtype=np.float32).ravel() for name in names]
+
+
+class FeatureCache(object):
+    '''
+    Features of a set of images in `<cache_dir>/features.npy` (float32,
+    one row per image, opened as a memmap) and the labels in
+    `<cache_dir>/labels.npy`. `<cache_dir>/index.json` keeps the files with
+    their mtime and size, and the columns of every feature.
+
+    update() decodes an image only if it is new or modified, or if a
+    requested feature is not in the cache yet, and then computes only the
+    missing features.
+    '''
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index_fn = os.path.join(cache_dir, 'index.json')
+        self.features_fn = os.path.join(cache_dir, 'features.npy')
+        self.labels_fn = os.path.join(cache_dir, 'labels.npy')
+        self.files = []
+        self.stats = []
+        self.columns = {}
+        self.features = np.zeros((0, 0), np.float32)
+        self.labels = np.array([])
+        if os.path.exists(self.index_fn):
+            with open(self.index_fn) as f:
+                index = json.load(f)
+            self.files = index['files']
+            self.stats = [tuple(s) for s in index['stats']]
+            self.columns = dict((name, tuple(c)) for name, c in index['columns'].items())
+            self.features = np.load(self.features_fn, mmap_mode='r')
+            self.labels = np.load(self.labels_fn)
+
+    def _layout(self, names):
+        '''old columns first, then the new features'''
+        names = list(names)
+        order = sorted(self.columns, key=lambda name: self.columns[name][0])
+        order += [name for name in names if name not in self.columns]
+        columns = {}
+        start = 0
+        for name in order:
+            if name in self.columns:
+                size = self.columns[name][1] - self.columns[name][0]
+            else:
+                size = registry[name][1]
+            columns[name] = (start, start + size)
+            start += size
+        return order, columns, start
+
+    def update(self, files, labels, names, processes=None):
+        '''
+        Makes the cache contain `files` (in this order) with all features
+        `names`. Returns the number of images that had to be decoded.
+        '''
+        order, columns, width = self._layout(names)
+        old_rows = dict((fn, i) for i, fn in enumerate(self.files))
+        stats = [_stat(fn) for fn in files]
+
+        jobs = []
+        for fn, st in zip(files, stats):
+            i = old_rows.get(fn)
+            if i is None or self.stats[i] != st:
+                needed = order
+            else:
+                needed = [name for name in order if name not in self.columns]
+            if needed:
+                jobs.append((fn, needed))
+
+        if not jobs and list(files) == self.files and list(labels) == list(self.labels):
+            return 0
+
+        if processes == 1 or len(jobs) < 2:
+            results = map(compute, jobs)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(processes)
+            results = pool.imap(compute, jobs, chunksize=8)
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        tmp_fn = self.features_fn + '.tmp.npy'
+        out = np.lib.format.open_memmap(tmp_fn, mode='w+', dtype=np.float32,
+                                        shape=(len(files), width))
+        # first the columns already in the cache, then the computed values
+        for row, fn in enumerate(files):
+            i = old_rows.get(fn)
+            if i is not None:
+                for name, (start, stop) in self.columns.items():
+                    out[row, columns[name][0]:columns[name][1]] = self.features[i, start:stop]
+        rows = dict((fn, row) for row, fn in enumerate(files))
+        try:
+            for (fn, needed), values in zip(jobs, results):
+                for name, v in zip(needed, values):
+                    out[rows[fn], columns[name][0]:columns[name][1]] = v
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        out.flush()
+        del out
+
+        self.features = None  # release the old memmap before replacing its file
+        os.rename(tmp_fn, self.features_fn)
+        np.save(self.labels_fn, np.asarray(labels))
+        with open(self.index_fn + '.tmp', 'w') as f:
+            json.dump({'files': list(files), 'stats': stats, 'columns': columns}, f)
+        os.rename(self.index_fn + '.tmp', self.index_fn)
+
+        self.files = list(files)
+        self.stats = stats
+        self.columns = columns
+        self.features = np.load(self.features_fn, mmap_mode='r')
+        self.labels = np.load(self.labels_fn)
+        return len(jobs)
+
+    def matrix(self, names):
+        '''float32 matrix with the columns of the features `names`'''
+        return np.hstack([self.features[:, slice(*self.columns[name])] for name in names])
+
+
+def _stat(fn):
+    st = os.stat(fn)
+    return (st.st_mtime, st.st_size)
+
+
+def extract(files, labels, names, cache_dir='feature-cache', processes=None):
+    '''
+    features, labels = extract(files, labels, ['haralick', 'sobel'])
+
+    Features of all files, computed in a process pool and cached in
+    cache_dir; only new images and new features are computed.
+    '''
+    cache = FeatureCache(cache_dir)
+    cache.update(files, labels, names, processes)
+    return cache.matrix(names), np.array(cache.labels)
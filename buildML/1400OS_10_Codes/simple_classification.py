@@ -1,27 +1,21 @@
-import mahotas as mh
 from sklearn import cross_validation
 from sklearn.linear_model.logistic import LogisticRegression
 import numpy as np
 from glob import glob
-from edginess import edginess_sobel
+from image_features import FeatureCache
 
 basedir = 'simple-dataset'
 
-def features_for(im):
-    im = mh.imread(im,as_grey=True).astype(np.uint8)
-    return mh.features.haralick(im).mean(0)
-
-features = []
-sobels = []
-labels = []
 images = glob('{}/*.jpg'.format(basedir))
-for im in images:
-    features.append(features_for(im))
-    sobels.append(edginess_sobel(mh.imread(im, as_grey=True)))
-    labels.append(im[:-len('00.jpg')])
+labels = [im[:-len('00.jpg')] for im in images]
 
-features = np.array(features)
-labels = np.array(labels)
+# every image is decoded once for all features, in a process pool; the
+# values are cached in feature-cache/ for the next run
+cache = FeatureCache('feature-cache')
+cache.update(images, labels, ['haralick', 'sobel'])
+features = cache.matrix(['haralick'])
+sobels = cache.matrix(['sobel'])[:, 0]
+labels = np.array(cache.labels)
 
 scores = cross_validation.cross_val_score(LogisticRegression(), features, labels, cv=5)
 print('Accuracy (5 fold x-val) with Logistic Regrssion [std features]: {}%'.format(0.1* round(1000*scores.mean())))
@@ -10,8 +10,8 @@ CHART_DIR = os.path.join("..", "charts")
 
 def mutual_info(x, y, bins=10):
     counts_xy, bins_x, bins_y = np.histogram2d(x, y, bins=(bins, bins))
-    counts_x, bins = np.histogram(x, bins=bins)
-    counts_y, bins = np.histogram(y, bins=bins)
+    counts_x, bins_x = np.histogram(x, bins=bins)
+    counts_y, bins_y = np.histogram(y, bins=bins)
 
     counts_xy += 1
     counts_x += 1
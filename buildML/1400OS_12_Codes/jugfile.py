@@ -1,4 +1,5 @@
-from jug import TaskGenerator
+# python taskgraph.py jugfile.py  (not `jug execute`: TaskGenerator comes from taskgraph, not jug)
+from taskgraph import TaskGenerator
 from time import sleep
 
 @TaskGenerator
@@ -0,0 +1,331 @@
+'''
+A small local replacement for jug's TaskGenerator/execute.
+
+Decorating a function with @TaskGenerator makes calls to it return Task
+objects instead of running it. Every task is identified by a hash of the
+function's source and of its arguments (argument tasks contribute their own
+hash), and its result is pickled under that hash in a directory on local
+disk. `execute` runs all tasks whose result is not stored yet in a process
+pool, as soon as the tasks they depend on are done, so independent chains
+run concurrently and a re-run only loads results.
+
+    python taskgraph.py jugfile.py            # execute
+    python taskgraph.py jugfile.py --status   # what is done / still to run
+'''
+from __future__ import print_function
+
+import hashlib
+import inspect
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+import traceback
+from collections import defaultdict
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+alltasks = []
+
+
+class FileStore(object):
+    '''
+    Content-addressed result store: the result of the task with hash h is
+    pickled in <dirname>/h[:2]/h[2:]
+    '''
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+
+    def _fname(self, h):
+        return os.path.join(self.dirname, h[:2], h[2:])
+
+    def can_load(self, h):
+        return os.path.exists(self._fname(h))
+
+    def load(self, h):
+        with open(self._fname(h), 'rb') as f:
+            return pickle.load(f)
+
+    def dump(self, h, value):
+        fname = self._fname(h)
+        dirname = os.path.dirname(fname)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created by another worker in the meantime
+                if not os.path.isdir(dirname):
+                    raise
+        # write + rename: a crash never leaves a half written result behind
+        tmp = '%s.tmp%d' % (fname, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, fname)
+
+
+def _hash_value(value, h):
+    if isinstance(value, Task):
+        h.update(b'T')
+        h.update(value.hash().encode('ascii'))
+    elif isinstance(value, (list, tuple)):
+        h.update(b'L' if isinstance(value, list) else b'U')
+        h.update(str(len(value)).encode('ascii'))
+        for v in value:
+            _hash_value(v, h)
+    elif isinstance(value, dict):
+        h.update(b'D')
+        h.update(str(len(value)).encode('ascii'))
+        for k in sorted(value):
+            _hash_value(k, h)
+            _hash_value(value[k], h)
+    else:
+        h.update(b'P')
+        h.update(pickle.dumps(value, 2))
+
+
+def _dependencies(value):
+    if isinstance(value, Task):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            for t in _dependencies(v):
+                yield t
+    elif isinstance(value, dict):
+        for v in value.values():
+            for t in _dependencies(v):
+                yield t
+
+
+def _resolve(value, store):
+    '''replaces the tasks in `value` by their stored results'''
+    if isinstance(value, Task):
+        return store.load(value.hash())
+    elif isinstance(value, (list, tuple)):
+        return type(value)(_resolve(v, store) for v in value)
+    elif isinstance(value, dict):
+        return dict((k, _resolve(v, store)) for k, v in value.items())
+    return value
+
+
+class Task(object):
+    def __init__(self, generator, args, kwargs):
+        self.generator = generator
+        self.args = args
+        self.kwargs = kwargs
+        self._hash = None
+        self._result = None
+        self._has_result = False
+        alltasks.append(self)
+
+    @property
+    def name(self):
+        return self.generator.name
+
+    def hash(self):
+        if self._hash is None:
+            h = hashlib.sha1()
+            h.update(self.name.encode('utf-8'))
+            h.update(self.generator.source.encode('utf-8'))
+            _hash_value(tuple(self.args), h)
+            _hash_value(self.kwargs, h)
+            self._hash = h.hexdigest()
+        return self._hash
+
+    def dependencies(self):
+        return list(_dependencies([self.args, self.kwargs]))
+
+    def can_load(self, store):
+        return store.can_load(self.hash())
+
+    def value(self, store):
+        '''result of the task, which must have been executed'''
+        if not self._has_result:
+            self._result = store.load(self.hash())
+            self._has_result = True
+        return self._result
+
+    def __repr__(self):
+        return 'Task(%s, %s)' % (self.name, self.hash()[:8])
+
+
+class TaskGenerator(object):
+    '''
+    @TaskGenerator
+    def f(x): ...
+
+    f(x) now returns a Task; the function itself is f.f
+    '''
+
+    def __init__(self, f):
+        self.f = f
+        self.name = '%s.%s' % (f.__module__, f.__name__)
+        try:
+            self.source = inspect.getsource(f)
+        except (IOError, TypeError):
+            # e.g. defined in an interactive session
+            self.source = f.__name__
+
+    def __call__(self, *args, **kwargs):
+        return Task(self, args, kwargs)
+
+
+def _run_task(module_name, func_name, args, kwargs, store_dir, h):
+    '''runs in a worker process; returns (hash, None) or (hash, traceback)'''
+    try:
+        module = sys.modules.get(module_name)
+        if module is None:
+            module = __import__(module_name)
+        f = getattr(module, func_name)
+        if isinstance(f, TaskGenerator):
+            f = f.f
+        FileStore(store_dir).dump(h, f(*args, **kwargs))
+        return h, None
+    except Exception:
+        return h, traceback.format_exc()
+
+
+def _submit(pool, finished, h, args):
+    '''
+    Starts _run_task(*args) in `pool`; (h, error) is put on `finished` when
+    it is done, also if the arguments or the result cannot be sent between
+    the processes (that happens outside _run_task's try block)
+    '''
+    def failed(e):
+        finished.put((h, 'could not run the task in a worker: %r' % (e,)))
+    if sys.version_info[0] > 2:
+        pool.apply_async(_run_task, args, callback=finished.put, error_callback=failed)
+        return
+    # Python 2 has no error_callback: check the arguments before sending them
+    try:
+        pickle.dumps(args, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        failed(e)
+        return
+    pool.apply_async(_run_task, args, callback=finished.put)
+
+
+def _unique(tasks):
+    '''tasks with different hashes, dependencies before the tasks using them'''
+    seen = set()
+    ordered = []
+
+    def visit(t):
+        if t.hash() in seen:
+            return
+        seen.add(t.hash())
+        for dep in t.dependencies():
+            visit(dep)
+        ordered.append(t)
+    for t in tasks:
+        visit(t)
+    return ordered
+
+
+def status(tasks, store):
+    '''{function name: (number of tasks done, number of tasks)}'''
+    counts = defaultdict(lambda: [0, 0])
+    for t in _unique(tasks):
+        counts[t.name][0] += t.can_load(store)
+        counts[t.name][1] += 1
+    return dict((name, tuple(c)) for name, c in counts.items())
+
+
+def execute(tasks, store, processes=None, verbose=True):
+    '''
+    executed = execute(tasks, store, processes=None)
+
+    Runs every task in `tasks` (and the tasks they depend on) whose result
+    is not in `store` yet, each as soon as its dependencies are done, with
+    up to `processes` tasks at a time.
+
+    Returns
+    -------
+    executed : dict, number of tasks executed per function name
+    '''
+    tasks = _unique(tasks)
+    waiting = [t for t in tasks if not t.can_load(store)]
+    executed = defaultdict(int)
+    if not waiting:
+        return dict(executed)
+
+    by_hash = dict((t.hash(), t) for t in waiting)
+    pending = set(by_hash)
+    finished = Queue()
+    pool = multiprocessing.Pool(processes or min(len(waiting), multiprocessing.cpu_count()))
+    running = 0
+    try:
+        while waiting or running:
+            still_waiting = []
+            for t in waiting:
+                if any(dep.hash() in pending for dep in t.dependencies()):
+                    still_waiting.append(t)
+                    continue
+                module_name, func_name = t.generator.f.__module__, t.generator.f.__name__
+                args = _resolve(t.args, store)
+                kwargs = _resolve(t.kwargs, store)
+                _submit(pool, finished, t.hash(),
+                        (module_name, func_name, args, kwargs, store.dirname, t.hash()))
+                running += 1
+            waiting = still_waiting
+
+            h, error = finished.get()
+            running -= 1
+            if error is not None:
+                raise RuntimeError('task %s failed:\n%s' % (h, error))
+            pending.discard(h)
+            name = by_hash[h].name
+            executed[name] += 1
+            if verbose:
+                print('Executed %s' % name)
+    finally:
+        pool.terminate()
+        pool.join()
+    return dict(executed)
+
+
+def load_jugfile(jugfile):
+    '''imports `jugfile`, which creates its tasks, and returns them'''
+    del alltasks[:]
+    dirname, fname = os.path.split(os.path.abspath(jugfile))
+    module_name = os.path.splitext(fname)[0]
+    sys.path.insert(0, dirname)
+    # workers forked later find the module in sys.modules
+    __import__(module_name)
+    return list(alltasks)
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description='execute the tasks of a jugfile')
+    parser.add_argument('jugfile', nargs='?', default='jugfile.py')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--status', action='store_true')
+    parser.add_argument('--store', default=None,
+                        help='result directory, default: <jugfile>.taskgraph')
+    opts = parser.parse_args(argv)
+
+    store = FileStore(opts.store or os.path.splitext(opts.jugfile)[0] + '.taskgraph')
+    tasks = load_jugfile(opts.jugfile)
+    if opts.status:
+        counts = status(tasks, store)
+    else:
+        start = time.time()
+        executed = execute(tasks, store, opts.processes)
+        print('%d tasks executed in %.1fs' % (sum(executed.values()), time.time() - start))
+        counts = dict((name, (executed.get(name, 0), total))
+                      for name, (_, total) in status(tasks, store).items())
+    print('%-30s %8s %8s' % ('Task name', 'Done' if opts.status else 'Executed', 'Total'))
+    for name in sorted(counts):
+        print('%-30s %8d %8d' % (name, counts[name][0], counts[name][1]))
+
+
+if __name__ == '__main__':
+    # the jugfile imports `taskgraph`, not `__main__`: use that module so that
+    # its tasks end up in the same alltasks list
+    import taskgraph
+    taskgraph.main(sys.argv[1:])
@@ -0,0 +1,206 @@
+# coding=utf-8
+"""
+本地分布式训练测试: 在 localhost 上启动 ps 与 worker 进程, 用同一个模型比较
+  - async : 异步更新 (4_asyn_update.py)
+  - sync  : tf.train.SyncReplicasOptimizer 同步更新 (5_syn_update.py)
+  - backup: 同步更新, 但每步只等待 workers - backup_workers 个梯度, 最慢的几个 worker 的梯度被丢弃
+并记录每个 worker 的单步耗时、梯度的过时程度(staleness)以及每个 ps 分片上的通信量,
+用来在部署到真实机器之前估计需要多少个 ps.
+
+    python 6_local_cluster.py --ps=2 --workers=4 --mode=async
+    python 6_local_cluster.py --ps=2 --workers=4 --mode=backup --backup_workers=1
+
+启动方式与 test_tf/testMultiProcess/sharded_ps_benchmark.py 相同: 不带 --job_name 运行时为 launcher,
+用不同的 --job_name/--task_id 重新启动本脚本得到 ps 与 worker 进程.
+
+staleness: 某个 worker 读到 global_step=s 并用此时的参数计算梯度, 梯度应用之后 global_step=t,
+           则 staleness = t - s - 1, 即这段时间内其它 worker 完成的更新次数, 同步模式下为 0.
+通信量: 按变量所在的 ps 估计, 每步每个 worker 从 ps 读一次参数, 再写回一次同样大小的梯度.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+import mnist_inference
+
+BATCH_SIZE = 100
+LEARNING_RATE = 0.01
+DATA_PATH = "../data/mnist/"
+
+FLAGS = tf.app.flags.FLAGS
+
+tf.app.flags.DEFINE_integer('ps', 1, 'number of ps tasks')
+tf.app.flags.DEFINE_integer('workers', 2, 'number of worker tasks')
+tf.app.flags.DEFINE_string('mode', 'async', 'async, sync or backup')
+tf.app.flags.DEFINE_integer('backup_workers', 1, 'backup mode: number of gradients not waited for')
+tf.app.flags.DEFINE_integer('steps', 1000, 'number of global steps')
+tf.app.flags.DEFINE_integer('starting_port', 12222, 'first port to use')
+tf.app.flags.DEFINE_boolean('synthetic', True, 'use a fixed random batch instead of reading mnist')
+tf.app.flags.DEFINE_string('log_dir', 'logs/local_cluster', 'metrics of every worker are written here')
+
+# 由launcher设置
+tf.app.flags.DEFINE_string('job_name', '', '"ps" or "worker", empty for the launcher')
+tf.app.flags.DEFINE_integer('task_id', 0, 'Task ID of the ps/worker')
+
+
+def cluster_spec():
+    host = "127.0.0.1"
+    ps_ports = range(FLAGS.starting_port, FLAGS.starting_port + FLAGS.ps)
+    worker_ports = range(FLAGS.starting_port + FLAGS.ps, FLAGS.starting_port + FLAGS.ps + FLAGS.workers)
+    return tf.train.ClusterSpec({"ps": ["%s:%d" % (host, p) for p in ps_ports],
+                                 "worker": ["%s:%d" % (host, p) for p in worker_ports]})
+
+
+def build_model(x, y_, is_chief):
+    global_step = tf.train.get_or_create_global_step()
+    # 先读出global_step, 梯度的计算依赖于这次读取, 于是step_before一定不晚于参数的读取
+    step_before = tf.identity(global_step.read_value())
+    with tf.control_dependencies([step_before]):
+        y = mnist_inference.inference(x, None)
+        loss = tf.reduce_mean(tf.nn.sparse_softmax_cross_entropy_with_logits(logits=y, labels=y_))
+
+    opt = tf.train.GradientDescentOptimizer(LEARNING_RATE)
+    hooks = []
+    if FLAGS.mode in ('sync', 'backup'):
+        backup = FLAGS.backup_workers if FLAGS.mode == 'backup' else 0
+        assert 0 <= backup < FLAGS.workers
+        opt = tf.train.SyncReplicasOptimizer(opt,
+                                             replicas_to_aggregate=FLAGS.workers - backup,
+                                             total_num_replicas=FLAGS.workers)
+        hooks.append(opt.make_session_run_hook(is_chief))
+    train_op = opt.minimize(loss, global_step=global_step)
+    with tf.control_dependencies([train_op]):
+        step_after = tf.identity(global_step.read_value())
+    return loss, train_op, step_before, step_after, hooks
+
+
+def shard_bytes():
+    """每个ps任务上可训练变量的字节数"""
+    sizes = {}
+    for v in tf.trainable_variables():
+        nbytes = v.get_shape().num_elements() * v.dtype.base_dtype.size
+        sizes[v.device] = sizes.get(v.device, 0) + nbytes
+    return sizes
+
+
+def run_ps(cluster):
+    server = tf.train.Server(cluster, job_name='ps', task_index=FLAGS.task_id)
+    with tf.device("/cpu:0"):
+        server.join()
+
+
+def run_worker(cluster):
+    server = tf.train.Server(cluster, job_name='worker', task_index=FLAGS.task_id)
+    is_chief = (FLAGS.task_id == 0)
+
+    # 按变量大小把变量分配到各个ps上
+    ps_strategy = tf.contrib.training.GreedyLoadBalancingStrategy(
+        FLAGS.ps, tf.contrib.training.byte_size_load_fn)
+    with tf.device(tf.train.replica_device_setter(
+            worker_device="/job:worker/task:%d" % FLAGS.task_id, cluster=cluster, ps_strategy=ps_strategy)):
+        x = tf.placeholder(tf.float32, [None, mnist_inference.INPUT_NODE], name='x-input')
+        y_ = tf.placeholder(tf.int64, [None], name='y-input')
+        loss, train_op, step_before, step_after, hooks = build_model(x, y_, is_chief)
+    sizes = shard_bytes()
+
+    if FLAGS.synthetic:
+        rng = np.random.RandomState(FLAGS.task_id)
+        xs = rng.rand(BATCH_SIZE, mnist_inference.INPUT_NODE).astype(np.float32)
+        ys = rng.randint(0, mnist_inference.OUTPUT_NODE, BATCH_SIZE)
+    else:
+        from tensorflow.examples.tutorials.mnist import input_data
+        mnist = input_data.read_data_sets(DATA_PATH, one_hot=False)
+
+    hooks.append(tf.train.StopAtStepHook(last_step=FLAGS.steps))
+    sess_config = tf.ConfigProto(allow_soft_placement=True, log_device_placement=False,
+                                 device_filters=["/job:ps", "/job:worker/task:%d" % FLAGS.task_id])
+    step_times = []
+    staleness = []
+    with tf.train.MonitoredTrainingSession(master=server.target, is_chief=is_chief, hooks=hooks,
+                                           config=sess_config, save_checkpoint_secs=None,
+                                           save_summaries_steps=None) as sess:
+        while not sess.should_stop():
+            if not FLAGS.synthetic:
+                xs, ys = mnist.train.next_batch(BATCH_SIZE)
+            start = time.time()
+            _, loss_value, before, after = sess.run([train_op, loss, step_before, step_after],
+                                                    feed_dict={x: xs, y_: ys})
+            step_times.append(time.time() - start)
+            staleness.append(after - before - 1)
+
+    # 第一步包含图的初始化, 不计入
+    step_times = np.array(step_times[1:] or step_times)
+    staleness = np.maximum(np.array(staleness), 0)
+    elapsed = step_times.sum()
+    metrics = {
+        'task_id': FLAGS.task_id,
+        'mode': FLAGS.mode,
+        'local_steps': len(step_times),
+        'step_time_mean': float(step_times.mean()),
+        'step_time_p50': float(np.percentile(step_times, 50)),
+        'step_time_p90': float(np.percentile(step_times, 90)),
+        'staleness_mean': float(staleness.mean()),
+        'staleness_max': int(staleness.max()),
+        # 读参数 + 写梯度
+        'bytes_per_step': dict((device, 2 * nbytes) for device, nbytes in sizes.items()),
+        'mb_per_second': dict((device, 2 * nbytes * len(step_times) / elapsed / 2 ** 20)
+                              for device, nbytes in sizes.items()),
+    }
+    with open(os.path.join(FLAGS.log_dir, 'worker_%d.json' % FLAGS.task_id), 'w') as f:
+        json.dump(metrics, f, indent=2)
+    print("worker %d done: %.2f ms/step, staleness %.2f" % (
+        FLAGS.task_id, 1000 * metrics['step_time_mean'], metrics['staleness_mean']))
+
+
+def launch(job_name, task_id):
+    cmd = [sys.executable] + sys.argv + ["--job_name=%s" % job_name, "--task_id=%d" % task_id]
+    env = os.environ.copy()
+    # 关掉GPU
+    env["CUDA_VISIBLE_DEVICES"] = ""
+    return subprocess.Popen(cmd, stderr=subprocess.STDOUT, env=env)
+
+
+def report():
+    print("mode=%s ps=%d workers=%d" % (FLAGS.mode, FLAGS.ps, FLAGS.workers))
+    print("%8s %8s %10s %10s %10s %10s" % ("worker", "steps", "ms/step", "p90", "stale", "stale_max"))
+    shard_mb = {}
+    for i in range(FLAGS.workers):
+        with open(os.path.join(FLAGS.log_dir, 'worker_%d.json' % i)) as f:
+            m = json.load(f)
+        print("%8d %8d %10.2f %10.2f %10.2f %10d" % (
+            i, m['local_steps'], 1000 * m['step_time_mean'], 1000 * m['step_time_p90'],
+            m['staleness_mean'], m['staleness_max']))
+        for device, mb in m['mb_per_second'].items():
+            shard_mb[device] = shard_mb.get(device, 0.0) + mb
+    for device in sorted(shard_mb):
+        print("%s: %.1f MB/s" % (device, shard_mb[device]))
+
+
+def main(argv=None):
+    cluster = cluster_spec()
+    if FLAGS.job_name == 'ps':
+        run_ps(cluster)
+    elif FLAGS.job_name == 'worker':
+        run_worker(cluster)
+    else:
+        if not os.path.exists(FLAGS.log_dir):
+            os.makedirs(FLAGS.log_dir)
+        ps = [launch('ps', i) for i in range(FLAGS.ps)]
+        workers = [launch('worker', i) for i in range(FLAGS.workers)]
+        try:
+            for p in workers:
+                p.wait()
+        finally:
+            # ps 进程一直 server.join(), 由 launcher 结束
+            for p in ps + workers:
+                if p.poll() is None:
+                    p.terminate()
+        report()
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1,148 @@
+# coding=utf-8
+"""
+通用的多塔(multi-tower)数据并行训练, 由 2_gpu_parallel.py 推广而来:
+  - 任意的模型函数 model_fn(features, labels) -> loss, 不限于 mnist_inference
+  - 塔可以放在多个 CPU 设备上(ConfigProto 的 device_count 得到 /cpu:0 ... /cpu:N-1),
+    也可以都放在 /cpu:0 上, 各塔作为互不依赖的子图由 inter-op 线程池并发执行,
+    每个 op 的 intra-op 线程数按塔数均分, 避免线程过度订阅
+  - 变量只保存在 variable_device 上一份, 各塔计算出的梯度在该设备上求平均后更新
+
+64 核的 CPU 机器上单个塔跑不满所有核, 运行本文件比较不同塔数下的 examples/sec:
+    python multi_tower.py --towers=1,2,4,8 --placement=devices
+"""
+import multiprocessing
+import time
+
+import numpy as np
+import tensorflow as tf
+
+_VARIABLE_OPS = ('Variable', 'VariableV2', 'VarHandleOp', 'AutoReloadVariable')
+
+
+def tower_device_fn(tower_device, variable_device):
+    """变量放到 variable_device 上, 其余的 op 放到 tower_device 上"""
+    def device_fn(op):
+        if op.type in _VARIABLE_OPS:
+            return variable_device
+        return tower_device
+    return device_fn
+
+
+# 计算每一个变量梯度的平均值, 与 2_gpu_parallel.average_gradients 相同,
+# 但用 add_n 代替 concat + reduce_mean (不需要拼出 [N, ...] 的大 tensor),
+# 并且支持 IndexedSlices(embedding 的梯度)和 None 梯度
+def average_gradients(tower_grads):
+    average_grads = []
+    for grad_and_vars in zip(*tower_grads):
+        v = grad_and_vars[0][1]
+        grads = [g for g, _ in grad_and_vars if g is not None]
+        if not grads:
+            average_grads.append((None, v))
+            continue
+        if isinstance(grads[0], tf.IndexedSlices):
+            grad = tf.IndexedSlices(tf.concat([g.values for g in grads], 0) / len(grads),
+                                    tf.concat([g.indices for g in grads], 0),
+                                    grads[0].dense_shape)
+        else:
+            grad = tf.add_n(grads) / len(grads)
+        average_grads.append((grad, v))
+    return average_grads
+
+
+def tower_devices(num_towers, placement):
+    if placement == 'devices':
+        return ['/cpu:%d' % i for i in range(num_towers)]
+    elif placement == 'gpus':
+        return ['/gpu:%d' % i for i in range(num_towers)]
+    elif placement == 'threads':
+        return ['/cpu:0'] * num_towers
+    raise ValueError('unknown placement: %s' % placement)
+
+
+def session_config(num_towers, placement, num_cores=None):
+    """
+    devices: 每个塔一个 CPU 设备
+    threads: 一个 CPU 设备, 由 inter-op 线程池并发执行各塔
+    两种方式下每个 op 使用的 intra-op 线程数都是 num_cores / num_towers
+    """
+    num_cores = num_cores or multiprocessing.cpu_count()
+    config = tf.ConfigProto(allow_soft_placement=True,
+                            intra_op_parallelism_threads=max(1, num_cores // num_towers),
+                            inter_op_parallelism_threads=max(2, num_towers))
+    if placement == 'devices':
+        config.device_count['CPU'] = num_towers
+    return config
+
+
+def build_train_op(model_fn, input_fn, optimizer, num_towers, placement='devices',
+                   variable_device='/cpu:0', global_step=None):
+    """
+    :param model_fn: model_fn(features, labels) -> loss, 用 tf.get_variable 创建变量(各塔之间共享)
+    :param input_fn: input_fn() -> (features, labels), 每个塔调用一次, 得到该塔自己的 batch
+    :return: train_op, 各塔 loss 的平均值
+    """
+    if global_step is None:
+        global_step = tf.train.get_or_create_global_step()
+    tower_grads = []
+    tower_losses = []
+    for i, device in enumerate(tower_devices(num_towers, placement)):
+        with tf.device(variable_device):
+            features, labels = input_fn()
+        with tf.device(tower_device_fn(device, variable_device)), tf.name_scope('tower_%d' % i):
+            # name_scope并不会影响get_variable的命名空间, 第一个塔之后都复用变量
+            with tf.variable_scope(tf.get_variable_scope(), reuse=i > 0):
+                loss = model_fn(features, labels)
+            tower_losses.append(loss)
+            tower_grads.append(optimizer.compute_gradients(loss))
+
+    with tf.device(variable_device):
+        grads_and_vars = average_gradients(tower_grads)
+        train_op = optimizer.apply_gradients(grads_and_vars, global_step=global_step)
+        loss = tf.add_n(tower_losses) / num_towers
+    return train_op, loss
+
+
+def benchmark(model_fn, input_fn, num_towers, placement, batch_size, steps=100, warmup=10,
+              learning_rate=0.01):
+    """返回 examples/sec, 每个塔每步处理 batch_size 个样本"""
+    with tf.Graph().as_default():
+        optimizer = tf.train.GradientDescentOptimizer(learning_rate)
+        train_op, loss = build_train_op(model_fn, input_fn, optimizer, num_towers, placement)
+        with tf.Session(config=session_config(num_towers, placement)) as sess:
+            sess.run(tf.global_variables_initializer())
+            for _ in range(warmup):
+                sess.run(train_op)
+            start_time = time.time()
+            for _ in range(steps):
+                sess.run(train_op)
+            duration = time.time() - start_time
+    return num_towers * batch_size * steps / duration
+
+
+if __name__ == '__main__':
+    import mnist_inference
+
+    FLAGS = tf.app.flags.FLAGS
+    tf.app.flags.DEFINE_string('towers', '1,2,4,8', 'comma separated tower counts')
+    tf.app.flags.DEFINE_string('placement', 'devices', 'devices, threads or gpus')
+    tf.app.flags.DEFINE_integer('batch_size', 100, 'batch size of every tower')
+    tf.app.flags.DEFINE_integer('steps', 100, 'timed steps')
+
+    def model_fn(x, y_):
+        y = mnist_inference.inference(x, None)
+        return tf.reduce_mean(tf.nn.sparse_softmax_cross_entropy_with_logits(logits=y, labels=y_))
+
+    def input_fn():
+        # 固定的随机batch, 只测计算
+        xs = np.random.rand(FLAGS.batch_size, mnist_inference.INPUT_NODE).astype(np.float32)
+        ys = np.random.randint(0, mnist_inference.OUTPUT_NODE, FLAGS.batch_size)
+        return tf.constant(xs), tf.constant(ys)
+
+    def main(argv=None):
+        print("%8s %10s %14s" % ("towers", "placement", "examples/sec"))
+        for num_towers in [int(t) for t in FLAGS.towers.split(',')]:
+            speed = benchmark(model_fn, input_fn, num_towers, FLAGS.placement,
+                              FLAGS.batch_size, FLAGS.steps)
+            print("%8d %10s %14.1f" % (num_towers, FLAGS.placement, speed))
+
+    tf.app.run()
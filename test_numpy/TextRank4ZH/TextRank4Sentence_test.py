@@ -21,4 +21,8 @@ for st in tr4s.sentences:
 
 print(20*'*')
 for item in tr4s.get_key_sentences(num=4):
-    print(item.weight, item.sentence, type(item.sentence))
\ No newline at end of file
+    print(item.weight, item.sentence, type(item.sentence))
+print(20*'*')
+for key_sentences in tr4s.analyze_many([text, text], lower=True, source = 'all_filters'):
+    for item in key_sentences[:2]:
+        print(item.weight, item.sentence)
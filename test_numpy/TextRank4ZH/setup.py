@@ -27,7 +27,7 @@ setup(
         'Topic :: Text Processing :: Linguistic',
     ],
     keywords='NLP,Chinese,Keywords extraction, Abstract extraction',
-    install_requires=['jieba >= 0.35', 'numpy >= 1.7.1', 'networkx >= 1.9.1'],
+    install_requires=['jieba >= 0.35', 'numpy >= 1.7.1', 'scipy >= 0.13', 'networkx >= 1.9.1'],
     packages=['textrank4zh'],
     package_dir={'textrank4zh':'textrank4zh'},
     package_data={'textrank4zh':['*.txt',]},
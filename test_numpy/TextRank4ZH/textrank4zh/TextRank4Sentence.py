@@ -7,11 +7,30 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import multiprocessing
+
 import numpy as np
 
 from . import util
 from .Segmentation import Segmentation
 
+_pool_seg = None
+
+def _init_pool_seg(seg):
+    """进程池初始化：每个子进程只接收一次Segmentation对象（含停止词集合）。"""
+    global _pool_seg
+    _pool_seg = seg
+
+def _pool_segment(args):
+    text, lower = args
+    return _pool_seg.segment(text=text, lower=lower)
+
+def _select_source(result, source):
+    options = ['no_filter', 'no_stop_words', 'all_filters']
+    if source in options:
+        return result['words_'+source]
+    return result['words_no_stop_words']
+
 class TextRank4Sentence(object):
     
     def __init__(self, stop_words_file = None, 
@@ -60,18 +79,51 @@ class TextRank4Sentence(object):
         self.words_no_stop_words = result.words_no_stop_words
         self.words_all_filters   = result.words_all_filters
 
-        options = ['no_filter', 'no_stop_words', 'all_filters']
-        if source in options:
-            _source = result['words_'+source]
-        else:
-            _source = result['words_no_stop_words']
-
         self.key_sentences = util.sort_sentences(sentences = self.sentences,
-                                                 words     = _source,
+                                                 words     = _select_source(result, source),
                                                  sim_func  = sim_func,
                                                  pagerank_config = pagerank_config)
 
-            
+    def analyze_many(self, texts, lower = False,
+                     source = 'no_stop_words',
+                     sim_func = util.get_similarity,
+                     pagerank_config = {'alpha': 0.85,},
+                     processes = None,
+                     chunksize = 16):
+        """批量分析多篇文本。分词（jieba）是主要耗时且各文本相互独立，因此在进程池中进行；
+        句子排序在主进程中完成，所以sim_func可以是任意函数（包括lambda）。
+
+        Keyword arguments:
+        texts                --  可迭代对象，元素是文本内容。
+        lower, source, sim_func, pagerank_config  --  同analyze。
+        processes            --  进程数，默认为CPU核数。为1时不启动进程池。
+        chunksize            --  每次分发给子进程的文本数。
+
+        Return:
+        列表，第i个元素是第i篇文本按重要程度排序的句子列表（与analyze之后的key_sentences格式相同）。
+        不修改self.sentences、self.key_sentences等对象变量。
+        """
+        tasks = [(text, lower) for text in texts]
+
+        if processes == 1:
+            results = [self.seg.segment(text=text, lower=lower) for text, lower in tasks]
+        else:
+            pool = multiprocessing.Pool(processes=processes,
+                                        initializer=_init_pool_seg,
+                                        initargs=(self.seg,))
+            try:
+                results = pool.map(_pool_segment, tasks, chunksize=chunksize)
+            finally:
+                pool.close()
+                pool.join()
+
+        return [util.sort_sentences(sentences = result.sentences,
+                                    words     = _select_source(result, source),
+                                    sim_func  = sim_func,
+                                    pagerank_config = pagerank_config)
+                for result in results]
+
+    
     def get_key_sentences(self, num = 6, sentence_min_len = 6):
         """获取最重要的num个长度大于等于sentence_min_len的句子用来生成摘要。
 
@@ -11,6 +11,7 @@ import os
 import math
 import networkx as nx # 用来计算pagerank(power iteration)
 import numpy as np
+import scipy.sparse as sp
 import sys
 
 try:
@@ -123,6 +124,51 @@ def get_similarity(word_list1, word_list2):
     
     return co_occur_num / denominator
 
+def sentence_vectors(word_lists):
+    """将每个句子编码为稀疏的单词id向量，返回(X, lengths)。
+
+    X的第i行对应第i个句子，某个单词出现在句子中则对应位置为1；
+    lengths是每个句子的单词数（包括重复的单词），用于相似度的分母。
+
+    Keyword arguments:
+    word_lists  --  二维列表，子列表代表句子，子列表的元素是单词
+    """
+    word_index = {}
+    indices    = []
+    indptr     = [0]
+    lengths    = []
+    for word_list in word_lists:
+        ids = set()
+        for word in word_list:
+            ids.add(word_index.setdefault(word, len(word_index)))
+        indices.extend(ids)
+        indptr.append(len(indices))
+        lengths.append(len(word_list))
+
+    data = np.ones(len(indices), dtype=np.float64)
+    X = sp.csr_matrix((data, indices, indptr), shape=(len(word_lists), len(word_index)))
+    return X, np.array(lengths, dtype=np.float64)
+
+def get_similarity_matrix(word_lists):
+    """一次性计算所有句子两两之间的相似度，结果与逐对调用get_similarity相同。
+
+    共现单词数来自一次稀疏矩阵乘法 X·Xᵀ，分母 log(len1)+log(len2) 通过广播得到。
+
+    Keyword arguments:
+    word_lists  --  二维列表，子列表代表句子，子列表的元素是单词
+    """
+    X, lengths = sentence_vectors(word_lists)
+    co_occur = X.dot(X.T).toarray()
+
+    with np.errstate(divide='ignore'):
+        log_len = np.log(lengths)
+    denominator = log_len[:, None] + log_len[None, :]
+
+    valid = (np.abs(co_occur) > 1e-12) & (np.abs(denominator) >= 1e-12)
+    graph = np.zeros_like(co_occur)
+    graph[valid] = co_occur[valid] / denominator[valid]
+    return graph
+
 def sort_words(vertex_source, edge_source, window = 2, pagerank_config = {'alpha': 0.85,}):
     """将单词按关键程度从大到小排序
 
@@ -172,19 +218,23 @@ def sort_sentences(sentences, words, sim_func = get_similarity, pagerank_config
     Keyword arguments:
     sentences         --  列表，元素是句子
     words             --  二维列表，子列表和sentences中的句子对应，子列表由单词组成
-    sim_func          --  计算两个句子的相似性，参数是两个由单词组成的列表
+    sim_func          --  计算两个句子的相似性，参数是两个由单词组成的列表。
+                          若为默认的get_similarity，则用get_similarity_matrix一次算出整个相似度矩阵
     pagerank_config   --  pagerank的设置
     """
     sorted_sentences = []
     _source = words
     sentences_num = len(_source)        
-    graph = np.zeros((sentences_num, sentences_num))
-    
-    for x in xrange(sentences_num):
-        for y in xrange(x, sentences_num):
-            similarity = sim_func( _source[x], _source[y] )
-            graph[x, y] = similarity
-            graph[y, x] = similarity
+
+    if sim_func is get_similarity:
+        graph = get_similarity_matrix(_source)
+    else:
+        graph = np.zeros((sentences_num, sentences_num))
+        for x in xrange(sentences_num):
+            for y in xrange(x, sentences_num):
+                similarity = sim_func( _source[x], _source[y] )
+                graph[x, y] = similarity
+                graph[y, x] = similarity
             
     nx_graph = nx.from_numpy_matrix(graph)
     scores = nx.pagerank(nx_graph, **pagerank_config)              # this is a dict
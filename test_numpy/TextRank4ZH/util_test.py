@@ -23,8 +23,18 @@ def testDebug():
     util.debug('你好')
     util.debug(u'世界')
 
+def testSimilarityMatrix():
+    print(20*'*')
+    sentences = [['a', 'b', 'a'], ['b', 'c'], ['d'], []]
+    graph = util.get_similarity_matrix(sentences)
+    for x in range(len(sentences)):
+        for y in range(len(sentences)):
+            assert abs(graph[x, y] - util.get_similarity(sentences[x], sentences[y])) < 1e-12
+    print(graph)
+
 
 if __name__ == "__main__":
     testAttrDict()
     testCombine()
     testDebug()
+    testSimilarityMatrix()
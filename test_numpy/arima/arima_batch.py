@@ -0,0 +1,139 @@
+#coding:utf-8
+"""
+批量预测版的 arima_sale_est_all.get_pred:
+  - 所有商品的30天销量一次读成 numpy 矩阵, 一阶差分对整个矩阵做一次, 并缓存到 .npy 文件
+  - method='ls': 固定阶数 AR(p) 的最小二乘快速版, 一个块内所有序列的正规方程一起解, 没有逐条 python 循环
+  - method='arma': 与原来一样用 sm.tsa.ARMA(dta,(p,0)) 逐条拟合, 但分块分发到多个进程,
+    拟合失败时退回最小二乘的结果而不是 0
+输出文件格式与 get_pred 相同
+"""
+from __future__ import print_function
+import os
+import time
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+PAY_COLUMNS = ['pay_%d' % i for i in range(30, 0, -1)] # pay_30 ... pay_1, 时间从前到后
+
+
+def load_data(fileName):
+    dta_full = pd.read_csv(fileName, encoding='utf8', sep='\t')
+    print("data shape:" + str(dta_full.shape))
+    series = dta_full[PAY_COLUMNS].values.astype(np.float64) # (N, 30), 每行是一个商品
+    label = dta_full['pay'].values.astype(np.float64)
+    item_id_arr = dta_full[['item_id', 'stat_ds']].values
+    return series, label, item_id_arr
+
+
+def get_diff(fileName, series):
+    """一阶差分(第一天为0), 按输入文件的修改时间缓存"""
+    cacheFile = fileName + ".diff1.npy"
+    if os.path.exists(cacheFile) and os.path.getmtime(cacheFile) >= os.path.getmtime(fileName):
+        diff1 = np.load(cacheFile)
+        if diff1.shape == series.shape:
+            return diff1
+    diff1 = np.zeros_like(series)
+    diff1[:, 1:] = series[:, 1:] - series[:, :-1]
+    np.save(cacheFile, diff1)
+    return diff1
+
+
+def ar_ls_forecast(dta, p=7, ridge=1e-8):
+    """
+    对 dta 的每一行拟合带常数项的 AR(p): y[t] = c + a1*y[t-1] + ... + ap*y[t-p] (条件最小二乘),
+    返回每一行的下一步预测值, shape (N,).
+    所有行的正规方程 (X'X + ridge*I) w = X'y 用一次批量 np.linalg.solve 解出
+    """
+    N, T = dta.shape
+    # X[:, t, 0] = 1, X[:, t, k] = y[t+p-k], t = 0 .. T-p-1
+    X = np.ones((N, T - p, p + 1))
+    for k in range(1, p + 1):
+        X[:, :, k] = dta[:, p - k:T - k]
+    y = dta[:, p:]
+    XtX = np.einsum('ntk,ntj->nkj', X, X)
+    Xty = np.einsum('ntk,nt->nk', X, y)
+    # ridge 保证常数序列(全0等)时矩阵可逆
+    scale = np.maximum(np.trace(XtX, axis1=1, axis2=2), 1.0)
+    XtX += (ridge * scale)[:, None, None] * np.eye(p + 1)
+    w = np.linalg.solve(XtX, Xty[:, :, None])[:, :, 0]
+    # 下一步: [1, y[T-1], ..., y[T-p]]
+    x_next = np.concatenate([np.ones((N, 1)), dta[:, :T - p - 1:-1]], axis=1)
+    return np.sum(w * x_next, axis=1)
+
+
+def _arma_forecast(row, p):
+    import statsmodels.api as sm
+    arma_mod = sm.tsa.ARMA(row, (p, 0)).fit(disp=0)
+    return arma_mod.predict(len(row), len(row))[0]
+
+
+def _forecast_chunk(args):
+    method, p, start, dta = args
+    pred = ar_ls_forecast(dta, p)
+    failed = np.zeros(dta.shape[0], dtype=bool)
+    if method == 'arma':
+        for i in range(dta.shape[0]):
+            try:
+                pred[i] = _arma_forecast(dta[i], p)
+            except Exception:
+                failed[i] = True # 保留最小二乘的预测
+    # 与 get_each_pred 相同: 序列最后一个值 + 预测值
+    return start, dta[:, -1] + pred, failed
+
+
+def predict(diff1, method='ls', p=7, processes=None, chunksize=10000):
+    """返回每个序列的预测值和拟合失败的标记"""
+    N = diff1.shape[0]
+    predArr = np.zeros(N)
+    failArr = np.zeros(N, dtype=bool)
+    tasks = [(method, p, start, diff1[start:start + chunksize]) for start in range(0, N, chunksize)]
+    if processes == 1 or len(tasks) == 1:
+        results = map(_forecast_chunk, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(_forecast_chunk, tasks)
+    try:
+        for start, pred, failed in results:
+            predArr[start:start + len(pred)] = pred
+            failArr[start:start + len(pred)] = failed
+            print("chunk done: %d-%d" % (start, start + len(pred)))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return predArr, failArr
+
+
+def save_pred(outFile, item_id_arr, labelArr, predArr, failCnt):
+    N = len(predArr)
+    error = np.abs(labelArr - predArr)
+    rmse = np.sqrt(np.sum(error**2) / N)
+    mae = np.sum(error) / (np.sum(labelArr) + 1e-5)
+    print("N:%d failCnt:%d failRate:%.4f abs_error:%f rmse:%f mae:%f" % (N, failCnt, failCnt / (N + 1.0), np.mean(error), rmse, mae))
+    print("save pred to file:", outFile)
+    np.savetxt(outFile, predArr, fmt='%.4f', delimiter='\t')
+    labelPredError = np.concatenate((item_id_arr.reshape((N, 2)),
+                                     np.reshape(labelArr, (N, 1)),
+                                     np.reshape(predArr, (N, 1)),
+                                     np.reshape(error, (N, 1))),
+                                    axis=1)
+    outFileFull = outFile + "_full"
+    print("save all out data to file:", outFileFull)
+    np.savetxt(outFileFull, labelPredError, fmt='%.2f', delimiter='\t')
+
+
+def get_pred(fileName, outFile, method='ls', p=7, processes=None, chunksize=10000):
+    series, labelArr, item_id_arr = load_data(fileName)
+    diff1 = get_diff(fileName, series)
+    predArr, failArr = predict(diff1, method, p, processes, chunksize)
+    save_pred(outFile, item_id_arr, labelArr, predArr, int(failArr.sum()))
+
+
+if __name__ == "__main__":
+    print("start time:", time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())))
+    fileName = "data/item_pay_seq_stat_sample_1m_info.txt"
+    outPred = "data/item_pay_seq_stat_sample_1m_info_pred.txt"
+    get_pred(fileName, outPred, method='ls')
+    print("end time:", time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())))
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+O(n log n) 的 ROC/AUC，分块流式 AUC，以及分组 AUC (GAUC, 按 bag/user/query 分组)
+
+test_auc.py 中的 plotROC1 对每个样本都重新计算一遍 predScore >= threshold, 是 O(n^2) 的;
+这里只排序一次: roc_curve 用累加和得到每个阈值下的 tp/fp, auc 由正样本的秩计算
+(Mann-Whitney U, 分数相同的样本取平均秩).
+"""
+import numpy as np
+
+
+def _check_input(labels, scores):
+    labels = np.asarray(labels).ravel()
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    assert labels.shape == scores.shape
+    return labels != 0, scores
+
+
+def roc_curve(labels, scores):
+    """
+    返回 fpr, tpr, thresholds, 每个不同的 score 只对应一个点(分数相同的样本同时被判为正例),
+    与 sklearn.metrics.roc_curve(drop_intermediate=False) 一致, 第一个点为 (0, 0)
+    """
+    labels, scores = _check_input(labels, scores)
+    order = np.argsort(-scores, kind='mergesort')  # 降序
+    scores = scores[order]
+    labels = labels[order]
+
+    # 分数变化的位置, 即每个阈值下最后一个被判为正例的样本
+    last = np.r_[np.flatnonzero(np.diff(scores)), scores.size - 1]
+    tps = np.cumsum(labels)[last]
+    fps = (last + 1) - tps
+
+    tpr = np.r_[0, tps] / float(max(tps[-1], 1))
+    fpr = np.r_[0, fps] / float(max(fps[-1], 1))
+    thresholds = np.r_[np.inf, scores[last]]
+    return fpr, tpr, thresholds
+
+
+def auc(labels, scores):
+    """
+    基于秩的 AUC (Mann-Whitney U), 分数相同的样本取平均秩, 等价于 roc 曲线下的梯形面积
+    """
+    labels, scores = _check_input(labels, scores)
+    num_pos = np.count_nonzero(labels)
+    num_neg = labels.size - num_pos
+    if num_pos == 0 or num_neg == 0:
+        return np.nan
+    ranks = _average_ranks(scores)
+    return (ranks[labels].sum() - num_pos * (num_pos + 1) / 2.0) / (num_pos * float(num_neg))
+
+
+def _average_ranks(scores):
+    # 升序的秩(从1开始), 分数相同的取平均
+    order = np.argsort(scores, kind='mergesort')
+    sorted_scores = scores[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_scores)) + 1]
+    ends = np.r_[starts[1:], scores.size]
+    run_ranks = (starts + 1 + ends) / 2.0  # 第 starts+1 到第 ends 名的平均
+    ranks = np.empty(scores.size)
+    ranks[order] = np.repeat(run_ranks, ends - starts)
+    return ranks
+
+
+class StreamingAUC(object):
+    """
+    分块流式计算 AUC: 把 [min_score, max_score] 均分成 num_buckets 个桶,
+    每来一块数据只用 bincount 更新正/负样本直方图, 内存与样本数无关.
+    同一个桶内的正负样本视为分数相同(记 0.5), 误差不超过落在同一桶内的正负样本对的比例.
+    """
+
+    def __init__(self, num_buckets=100000, min_score=0.0, max_score=1.0):
+        self.num_buckets = num_buckets
+        self.min_score = min_score
+        self.max_score = max_score
+        self.pos_hist = np.zeros(num_buckets, dtype=np.int64)
+        self.neg_hist = np.zeros(num_buckets, dtype=np.int64)
+
+    def update(self, labels, scores):
+        labels, scores = _check_input(labels, scores)
+        scale = self.num_buckets / float(self.max_score - self.min_score)
+        buckets = ((scores - self.min_score) * scale).astype(np.int64)
+        np.clip(buckets, 0, self.num_buckets - 1, out=buckets)
+        self.pos_hist += np.bincount(buckets[labels], minlength=self.num_buckets)
+        self.neg_hist += np.bincount(buckets[~labels], minlength=self.num_buckets)
+        return self
+
+    def result(self):
+        num_pos = self.pos_hist.sum()
+        num_neg = self.neg_hist.sum()
+        if num_pos == 0 or num_neg == 0:
+            return np.nan
+        # 每个正样本: 分数更低的负样本数 + 0.5 * 同桶负样本数
+        neg_below = np.cumsum(self.neg_hist) - self.neg_hist
+        pairs = np.dot(self.pos_hist, neg_below + 0.5 * self.neg_hist)
+        return pairs / (float(num_pos) * num_neg)
+
+
+def grouped_auc(groups, labels, scores):
+    """
+    分组 AUC: 每个分组(bag/user/query)内部单独计算 AUC.
+    一次 lexsort 按 (group, score) 排序, 组内平均秩和正样本的秩和都用 reduceat 得到,
+    没有按组的 python 循环.
+
+    返回 (group_ids, aucs, num_samples), 只有正样本或只有负样本的组 auc 为 nan
+    """
+    labels, scores = _check_input(labels, scores)
+    groups = np.asarray(groups).ravel()
+    assert groups.shape == labels.shape
+    n = labels.size
+
+    order = np.lexsort((scores, groups))
+    groups = groups[order]
+    scores = scores[order]
+    labels = labels[order]
+
+    group_ids, group_starts, group_sizes = np.unique(groups, return_index=True, return_counts=True)
+
+    # 组内的位置秩(从1开始)
+    position = np.arange(n) - np.repeat(group_starts, group_sizes) + 1
+
+    # (group, score) 都相同的连续样本为一段, 取平均秩
+    new_run = np.r_[True, (groups[1:] != groups[:-1]) | (scores[1:] != scores[:-1])]
+    run_starts = np.flatnonzero(new_run)
+    run_ends = np.r_[run_starts[1:], n] - 1
+    run_ranks = (position[run_starts] + position[run_ends]) / 2.0
+    ranks = np.repeat(run_ranks, run_ends - run_starts + 1)
+
+    num_pos = np.add.reduceat(labels.astype(np.int64), group_starts)
+    num_neg = group_sizes - num_pos
+    pos_rank_sum = np.add.reduceat(np.where(labels, ranks, 0.0), group_starts)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aucs = (pos_rank_sum - num_pos * (num_pos + 1) / 2.0) / (num_pos * num_neg.astype(np.float64))
+    aucs[(num_pos == 0) | (num_neg == 0)] = np.nan
+    return group_ids, aucs, group_sizes
+
+
+def gauc(groups, labels, scores):
+    """
+    按样本数加权的分组 AUC, 忽略只有一类样本的组
+    """
+    _, aucs, sizes = grouped_auc(groups, labels, scores)
+    valid = ~np.isnan(aucs)
+    if not valid.any():
+        return np.nan
+    return np.dot(aucs[valid], sizes[valid]) / float(sizes[valid].sum())
+
+
+if __name__ == "__main__":
+    import time
+    np.random.seed(0)
+    num = 10
+    score = np.random.rand(num)
+    label = np.random.randint(low=0, high=2, size=num)
+    fpr, tpr, thresholds = roc_curve(label, score)
+    print("auc:", auc(label, score), " fpr:", fpr, " tpr:", tpr)
+
+    num = 10 ** 7
+    label = np.random.randint(low=0, high=2, size=num)
+    score = np.clip(np.random.rand(num) * 0.7 + label * 0.3, 0, 1)
+    start = time.time()
+    print("auc of %d samples: %.6f, %.2fs" % (num, auc(label, score), time.time() - start))
+
+    start = time.time()
+    streaming = StreamingAUC()
+    for i in range(0, num, 10 ** 6):
+        streaming.update(label[i:i + 10 ** 6], score[i:i + 10 ** 6])
+    print("streaming auc: %.6f, %.2fs" % (streaming.result(), time.time() - start))
+
+    groups = np.random.randint(0, 10 ** 6, size=num)
+    start = time.time()
+    print("gauc over %d groups: %.6f, %.2fs" % (10 ** 6, gauc(groups, label, score), time.time() - start))
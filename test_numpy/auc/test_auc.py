@@ -8,6 +8,7 @@ Created on Sat Mar 12 17:43:48 2016
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn import metrics
+import fast_auc
 
 def plotROC1(predScore, labels):
     assert set(labels) == {0,1}
@@ -123,6 +124,7 @@ if __name__ == "__main__":
     fpr, tpr, thresholds = metrics.roc_curve(label, score) # sklearn中的tpr,fpr只将x轴变动时的记录下来了
     auc = metrics.auc(fpr, tpr)
     print("sklearn auc:", auc," fpr:", fpr, " tpr:", tpr)
+    print("fast auc:", fast_auc.auc(label, score)) # 由排序后的秩计算 (Mann-Whitney U), O(nlogn)
     plotROC1(score, label)
     plotROC2(score, label)
     plotROC3(score, label)
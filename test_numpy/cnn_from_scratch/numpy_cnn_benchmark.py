@@ -0,0 +1,59 @@
+import time
+import numpy
+import numpy_cnn
+import numpy_cnn_fast
+# 对比 numpy_cnn.py（逐像素循环）和 numpy_cnn_fast.py（im2col）的输出和耗时
+# 网络结构与 numpy_cnn.py 中的 demo 相同：3 层 conv -> relu -> pooling
+
+
+def make_filters(rng):
+    l1_filter = numpy.zeros((2, 3, 3))
+    l1_filter[0, :, :] = numpy.array([[[-1, 0, 1],
+                                       [-1, 0, 1],
+                                       [-1, 0, 1]]])
+    l1_filter[1, :, :] = numpy.array([[[1, 1, 1],
+                                       [0, 0, 0],
+                                       [-1, -1, -1]]])
+    l2_filter = rng.rand(3, 5, 5, 2)
+    l3_filter = rng.rand(1, 7, 7, 3)
+    return [l1_filter, l2_filter, l3_filter]
+
+
+def loop_forward(img, filters):
+    outputs = []
+    x = img
+    for conv_filter in filters:
+        feature_map = numpy_cnn.conv(x, conv_filter)
+        feature_map_relu = numpy_cnn.relu(feature_map)
+        x = numpy_cnn.pooling(feature_map_relu, 2, 2)
+        outputs.append((feature_map, feature_map_relu, x))
+    return outputs
+
+
+def timeit(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+
+if __name__ == "__main__":
+    rng = numpy.random.RandomState(0)
+    filters = make_filters(rng)
+    # 与 skimage.data.chelsea() 转灰度后的大小相同
+    img = rng.rand(300, 451) - 0.5
+
+    loop_out, loop_time = timeit(loop_forward, img, filters)
+    fast_out, fast_time = timeit(numpy_cnn_fast.forward_batch, img[numpy.newaxis], filters)
+
+    for layer, (loop_layer, fast_layer) in enumerate(zip(loop_out, fast_out)):
+        for name, a, b in zip(["conv", "relu", "pool"], loop_layer, fast_layer):
+            assert a.shape == b[0].shape, (layer, name, a.shape, b[0].shape)
+            assert numpy.allclose(a, b[0]), (layer, name)
+    print("outputs match")
+    print("loop  : %.3f s/image" % loop_time)
+    print("im2col: %.4f s/image (%.0fx)" % (fast_time, loop_time / fast_time))
+
+    for batch_size in [8, 32]:
+        imgs = rng.rand(batch_size, 300, 451) - 0.5
+        _, batch_time = timeit(numpy_cnn_fast.forward_batch, imgs, filters)
+        print("im2col batch %d: %.4f s/image" % (batch_size, batch_time / batch_size))
@@ -0,0 +1,89 @@
+import numpy
+from numpy.lib.stride_tricks import as_strided
+# im2col 版本的 numpy_cnn：卷积变成一次矩阵乘法，pooling/relu 没有python循环。
+# 所有函数都带 batch 维度：imgs 的形状是 (N, H, W) 或 (N, H, W, C)，
+# 输出和 numpy_cnn.py 里逐像素循环的版本一致（见 numpy_cnn_benchmark.py）。
+
+
+def _as_nhwc(imgs):
+    imgs = numpy.asarray(imgs, dtype=numpy.float64)
+    if imgs.ndim == 3:  # (N, H, W) -> (N, H, W, 1)
+        imgs = imgs[:, :, :, numpy.newaxis]
+    return imgs
+
+
+def im2col(imgs, size, stride=1):
+    # (N, H, W, C) -> (N, OH, OW, size, size, C) 的只读视图，不拷贝数据。
+    n, h, w, ch = imgs.shape
+    out_h = (h - size) // stride + 1
+    out_w = (w - size) // stride + 1
+    s_n, s_h, s_w, s_c = imgs.strides
+    return as_strided(imgs,
+                      shape=(n, out_h, out_w, size, size, ch),
+                      strides=(s_n, s_h * stride, s_w * stride, s_h, s_w, s_c),
+                      writeable=False)
+
+
+def conv_batch(imgs, conv_filter):
+    # imgs: (N, H, W) 或 (N, H, W, C); conv_filter: (F, k, k) 或 (F, k, k, C)
+    # 返回 (N, H - k + 1, W - k + 1, F)
+    imgs = _as_nhwc(imgs)
+    conv_filter = numpy.asarray(conv_filter, dtype=numpy.float64)
+    if conv_filter.ndim == 3:
+        conv_filter = conv_filter[:, :, :, numpy.newaxis]
+    if imgs.shape[-1] != conv_filter.shape[-1]:
+        raise ValueError("Number of channels in both image and filter must match.")
+    if conv_filter.shape[1] != conv_filter.shape[2]:
+        raise ValueError("Filter must be a square matrix. I.e. number of rows and columns must match.")
+    if conv_filter.shape[1] % 2 == 0:
+        raise ValueError("Filter must have an odd size. I.e. number of rows and columns must be odd.")
+
+    num_filters, size = conv_filter.shape[0], conv_filter.shape[1]
+    windows = im2col(imgs, size)
+    n, out_h, out_w = windows.shape[:3]
+    # reshape 会把滑窗展开成 (N*OH*OW, k*k*C) 的矩阵，然后和所有 filter 做一次 GEMM
+    cols = windows.reshape(n * out_h * out_w, -1)
+    kernels = conv_filter.reshape(num_filters, -1).T
+    return cols.dot(kernels).reshape(n, out_h, out_w, num_filters)
+
+
+def pooling_batch(feature_maps, size=2, stride=2):
+    # feature_maps: (N, H, W, C) -> (N, (H - size) // stride + 1, (W - size) // stride + 1, C)
+    feature_maps = _as_nhwc(feature_maps)
+    n, h, w, ch = feature_maps.shape
+    out_h = (h - size) // stride + 1
+    out_w = (w - size) // stride + 1
+    if size == stride:
+        # 不重叠的窗口：裁掉多余的行列后直接 reshape 成块再取 max
+        blocks = feature_maps[:, :out_h * size, :out_w * size, :]
+        return blocks.reshape(n, out_h, size, out_w, size, ch).max(axis=(2, 4))
+    return im2col(feature_maps, size, stride).max(axis=(3, 4))
+
+
+def relu_batch(feature_maps):
+    return numpy.maximum(feature_maps, 0)
+
+
+def forward_batch(imgs, filters, pool_size=2, pool_stride=2):
+    # 依次执行每一层的 conv -> relu -> pooling，返回每层的 (conv, relu, pool) 结果
+    outputs = []
+    x = imgs
+    for conv_filter in filters:
+        feature_maps = conv_batch(x, conv_filter)
+        feature_maps_relu = relu_batch(feature_maps)
+        x = pooling_batch(feature_maps_relu, pool_size, pool_stride)
+        outputs.append((feature_maps, feature_maps_relu, x))
+    return outputs
+
+
+# 与 numpy_cnn.py 相同签名的单张图片版本
+def conv(img, conv_filter):
+    return conv_batch(numpy.asarray(img)[numpy.newaxis], conv_filter)[0]
+
+
+def pooling(feature_map, size=2, stride=2):
+    return pooling_batch(numpy.asarray(feature_map)[numpy.newaxis], size, stride)[0]
+
+
+def relu(feature_map):
+    return relu_batch(feature_map)
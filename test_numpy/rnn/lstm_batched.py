@@ -5,6 +5,11 @@ This is a batched LSTM forward and backward pass
 import numpy as np
 import code
 
+try:
+  input = raw_input
+except NameError:
+  pass
+
 class LSTM:
   
   @staticmethod
@@ -33,7 +38,7 @@ class LSTM:
     X should be of shape (n,b,input_size), where n = length of sequence, b = batch size
     """
     n,b,input_size = X.shape #n序列长度,b:batch长度,input_size:输入的x的维度,(1, 3, 10)
-    d = WLSTM.shape[1]/4 #d:hidden size,WLSTM:15*16,d=4
+    d = WLSTM.shape[1]//4 #d:hidden size,WLSTM:15*16,d=4
     if c0 is None: c0 = np.zeros((b,d)) #c0:之前的细胞状态,3*4
     if h0 is None: h0 = np.zeros((b,d)) #h0:之前的隐藏状态,3*4
     
@@ -270,6 +275,6 @@ def checkBatchGradient():
 if __name__ == "__main__":
 
   checkSequentialMatchesBatch()
-  raw_input('check OK, press key to continue to gradient check')
+  input('check OK, press key to continue to gradient check')
   checkBatchGradient()
   print('every line should start with OK. Have a nice day!')
\ No newline at end of file
@@ -0,0 +1,343 @@
+#coding:utf-8
+"""
+Stacked (multi-layer), variable-length LSTM built on top of lstm_batched.
+
+Differences to LSTM.forward/LSTM.backward in lstm_batched.py:
+  - the input projection X*W_x + b of a layer is computed for all time steps in one GEMM,
+    inside the time loop only the recurrent part h(t-1)*W_h is left
+  - padded batches of different lengths are handled with a (n,b) mask: on padded steps the
+    state is carried over unchanged and the output is 0, so the final state is the one at
+    each sequence's last real step
+  - truncated BPTT (StackedLSTM.tbptt) only keeps the cache of k time steps at a time
+  - forward(..., keep_cache=False) keeps no cache at all, for feature extraction
+
+Each layer uses the same WLSTM layout as LSTM.init: row 0 is the bias, the next input_size
+rows multiply x(t), the last hidden_size rows multiply h(t-1); columns are [i, f, o, g].
+"""
+import numpy as np
+
+from lstm_batched import LSTM
+
+class StackedLSTM:
+
+  @staticmethod
+  def init(input_size, hidden_sizes, fancy_forget_bias_init = 3):
+    """ one WLSTM per layer, layer l+1 takes the hidden state of layer l as input """
+    WLSTMs = []
+    for hidden_size in hidden_sizes:
+      WLSTMs.append(LSTM.init(input_size, hidden_size, fancy_forget_bias_init))
+      input_size = hidden_size
+    return WLSTMs
+
+  @staticmethod
+  def _layer_forward(X, WLSTM, mask, c0, h0, keep_cache):
+    n,b,input_size = X.shape
+    d = WLSTM.shape[1] // 4
+    Wx = WLSTM[1:input_size+1]
+    Wh = WLSTM[input_size+1:]
+
+    # input projection (plus bias) for every time step at once: (n*b,input_size) x (input_size,4d)
+    IFOG = X.reshape(n * b, input_size).dot(Wx).reshape(n, b, 4 * d)
+    IFOG += WLSTM[0]
+
+    Hout = np.empty((n, b, d)) # output, 0 on padded steps
+    if keep_cache:
+      IFOGf = np.empty((n, b, 4 * d))
+      Cnew = np.empty((n, b, d)) # cell content computed at step t (before masking)
+      Ct = np.empty((n, b, d)) # tanh of Cnew
+      Hstate = np.empty((n, b, d)) # carried states after step t
+      Cstate = np.empty((n, b, d))
+    else:
+      IFOGf = np.empty((1, b, 4 * d)) # only the current step
+      Cnew = np.empty((1, b, d))
+      Ct = np.empty((1, b, d))
+
+    prevh = h0
+    prevc = c0
+    for t in range(n):
+      s = t if keep_cache else 0
+      IFOG[t] += prevh.dot(Wh)
+      IFOGf[s,:,:3*d] = 1.0/(1.0+np.exp(-IFOG[t,:,:3*d]))
+      IFOGf[s,:,3*d:] = np.tanh(IFOG[t,:,3*d:])
+      Cnew[s] = IFOGf[s,:,:d] * IFOGf[s,:,3*d:] + IFOGf[s,:,d:2*d] * prevc
+      Ct[s] = np.tanh(Cnew[s])
+      h = IFOGf[s,:,2*d:3*d] * Ct[s]
+      if mask is None:
+        c = Cnew[s].copy()
+      else:
+        m = mask[t]
+        h = h * m
+        c = m * Cnew[s] + (1 - m) * prevc
+      Hout[t] = h
+      if mask is not None:
+        h = h + (1 - m) * prevh
+      if keep_cache:
+        Hstate[t] = h
+        Cstate[t] = c
+      prevh = h
+      prevc = c
+
+    cache = None
+    if keep_cache:
+      cache = {'WLSTM': WLSTM, 'X': X, 'mask': mask, 'IFOGf': IFOGf, 'Ct': Ct,
+               'Hstate': Hstate, 'Cstate': Cstate, 'c0': c0, 'h0': h0}
+    return Hout, prevc, prevh, cache
+
+  @staticmethod
+  def forward(X, WLSTMs, mask = None, c0s = None, h0s = None, keep_cache = True):
+    """
+    X should be of shape (n,b,input_size), mask (n,b) with 1 for real and 0 for padded steps
+    (None means every sequence has length n). c0s/h0s are lists with one (b,d) array per layer.
+    Returns the output of the top layer (n,b,d), the lists of final cell/hidden states per layer
+    and the caches for backward (None if keep_cache is False).
+    """
+    n,b,_ = X.shape
+    if mask is not None:
+      mask = np.asarray(mask, dtype=X.dtype).reshape(n, b, 1)
+    cs, hs, caches = [], [], []
+    H = X
+    for l, WLSTM in enumerate(WLSTMs):
+      d = WLSTM.shape[1] // 4
+      c0 = c0s[l] if c0s is not None else np.zeros((b,d))
+      h0 = h0s[l] if h0s is not None else np.zeros((b,d))
+      H, c, h, cache = StackedLSTM._layer_forward(H, WLSTM, mask, c0, h0, keep_cache)
+      cs.append(c)
+      hs.append(h)
+      caches.append(cache)
+    return H, cs, hs, (caches if keep_cache else None)
+
+  @staticmethod
+  def _layer_backward(dHout, cache, dcn, dhn):
+    WLSTM = cache['WLSTM']
+    X = cache['X']
+    mask = cache['mask']
+    IFOGf = cache['IFOGf']
+    Ct = cache['Ct']
+    Hstate = cache['Hstate']
+    Cstate = cache['Cstate']
+    c0 = cache['c0']
+    h0 = cache['h0']
+    n,b,input_size = X.shape
+    d = Hstate.shape[2]
+    Wx = WLSTM[1:input_size+1]
+    Wh = WLSTM[input_size+1:]
+
+    dIFOG = np.empty((n, b, 4 * d))
+    dh = np.zeros((b, d)) if dhn is None else dhn.copy() # gradient wrt carried state h(t)
+    dc = np.zeros((b, d)) if dcn is None else dcn.copy() # gradient wrt carried state c(t)
+    for t in reversed(range(n)):
+      prevc = Cstate[t-1] if t > 0 else c0
+      if mask is None:
+        dhnew = dh + dHout[t]
+        dcnew = dc
+        dh = dc = 0.0
+      else:
+        m = mask[t]
+        dhnew = m * (dh + dHout[t]) # Hout[t] = m*hnew
+        dcnew = m * dc
+        dh = (1 - m) * dh # pass-through part of h(t) = m*hnew + (1-m)*h(t-1)
+        dc = (1 - m) * dc
+
+      o = IFOGf[t,:,2*d:3*d]
+      dcnew = dcnew + (1 - Ct[t]**2) * (o * dhnew)
+      y = IFOGf[t,:,:3*d]
+      dIFOGf = np.empty((b, 4 * d))
+      dIFOGf[:,:d] = IFOGf[t,:,3*d:] * dcnew
+      dIFOGf[:,d:2*d] = prevc * dcnew
+      dIFOGf[:,2*d:3*d] = Ct[t] * dhnew
+      dIFOGf[:,3*d:] = IFOGf[t,:,:d] * dcnew
+      dIFOG[t,:,:3*d] = (y*(1.0-y)) * dIFOGf[:,:3*d]
+      dIFOG[t,:,3*d:] = (1 - IFOGf[t,:,3*d:]**2) * dIFOGf[:,3*d:]
+
+      dc = dc + IFOGf[t,:,d:2*d] * dcnew
+      dh = dh + dIFOG[t].dot(Wh.T)
+
+    # everything that does not depend on the recurrence is one GEMM over all time steps
+    dIFOG2 = dIFOG.reshape(n * b, 4 * d)
+    Hprev = np.concatenate([h0[np.newaxis], Hstate[:-1]], axis=0).reshape(n * b, d)
+    dWLSTM = np.empty(WLSTM.shape)
+    dWLSTM[0] = dIFOG2.sum(axis=0)
+    dWLSTM[1:input_size+1] = X.reshape(n * b, input_size).T.dot(dIFOG2)
+    dWLSTM[input_size+1:] = Hprev.T.dot(dIFOG2)
+    dX = dIFOG2.dot(Wx.T).reshape(n, b, input_size)
+    return dX, dWLSTM, dc, dh
+
+  @staticmethod
+  def backward(dHout_in, caches, dcns = None, dhns = None):
+    """
+    dHout_in is the gradient wrt the top layer output (n,b,d). dcns/dhns are optional lists of
+    gradients wrt the final states of each layer (carried over from a later chunk).
+    Returns dX, the list of dWLSTM and the lists of gradients wrt c0s and h0s.
+    """
+    L = len(caches)
+    dWLSTMs = [None] * L
+    dc0s = [None] * L
+    dh0s = [None] * L
+    dH = dHout_in
+    for l in reversed(range(L)):
+      dcn = dcns[l] if dcns is not None else None
+      dhn = dhns[l] if dhns is not None else None
+      dH, dWLSTMs[l], dc0s[l], dh0s[l] = StackedLSTM._layer_backward(dH, caches[l], dcn, dhn)
+    return dH, dWLSTMs, dc0s, dh0s
+
+  @staticmethod
+  def tbptt(X, WLSTMs, loss_grad, k, mask = None, c0s = None, h0s = None):
+    """
+    Truncated BPTT over chunks of k time steps. Only one chunk's cache is alive at a time, so
+    memory is O(k*b*d) instead of O(n*b*d). The state is carried from chunk to chunk, but
+    gradients are not (that is the truncation).
+    loss_grad(t0, Hout) gets the start index and the top layer output of a chunk and must
+    return (loss, dHout) for it.
+    Returns the summed loss, the summed dWLSTMs and the final cell/hidden states.
+    """
+    n = X.shape[0]
+    total_loss = 0.0
+    dWLSTMs = [np.zeros_like(W) for W in WLSTMs]
+    cs, hs = c0s, h0s
+    for t0 in range(0, n, k):
+      chunk_mask = mask[t0:t0+k] if mask is not None else None
+      H, cs, hs, caches = StackedLSTM.forward(X[t0:t0+k], WLSTMs, chunk_mask, cs, hs)
+      loss, dH = loss_grad(t0, H)
+      total_loss += loss
+      _, dWs, _, _ = StackedLSTM.backward(dH, caches)
+      for dW, dWt in zip(dWLSTMs, dWs):
+        dW += dWt
+      caches = None
+    return total_loss, dWLSTMs, cs, hs
+
+  @staticmethod
+  def lengths_to_mask(lengths, n = None):
+    """ (b,) sequence lengths -> (n,b) mask """
+    lengths = np.asarray(lengths)
+    if n is None: n = lengths.max()
+    return (np.arange(n)[:, np.newaxis] < lengths[np.newaxis, :]).astype(np.float64)
+
+
+# -------------------
+# TEST CASES
+# -------------------
+
+
+def checkSingleLayerMatchesLSTM():
+  """ one layer without mask must give exactly what lstm_batched.LSTM gives """
+
+  n,b,d = (5, 3, 4)
+  input_size = 10
+  WLSTM = LSTM.init(input_size, d)
+  X = np.random.randn(n,b,input_size)
+  h0 = np.random.randn(b,d)
+  c0 = np.random.randn(b,d)
+
+  H, C, Ht, cache = LSTM.forward(X, WLSTM, c0, h0)
+  SH, Scs, Shs, caches = StackedLSTM.forward(X, [WLSTM], None, [c0], [h0])
+  dH = np.random.randn(*H.shape)
+  dX, dWLSTM, dc0, dh0 = LSTM.backward(dH, cache)
+  SdX, SdWLSTMs, Sdc0s, Sdh0s = StackedLSTM.backward(dH, caches)
+
+  print('Making sure stacked version agrees with lstm_batched: (should all be True)')
+  print(np.allclose(H, SH) and np.allclose(C, Scs[0]) and np.allclose(Ht, Shs[0]))
+  print(np.allclose(dX, SdX))
+  print(np.allclose(dWLSTM, SdWLSTMs[0]))
+  print(np.allclose(dc0, Sdc0s[0]))
+  print(np.allclose(dh0, Sdh0s[0]))
+
+
+def checkPaddedMatchesUnpadded():
+  """ a padded batch must give the same outputs, final states and gradients as running each sequence alone """
+
+  n,b = (6, 3)
+  input_size = 5
+  WLSTMs = StackedLSTM.init(input_size, [4, 3])
+  lengths = np.array([6, 2, 4])
+  mask = StackedLSTM.lengths_to_mask(lengths, n)
+  X = np.random.randn(n,b,input_size) * mask[:, :, np.newaxis]
+  dH = np.random.randn(n,b,3)
+
+  H, cs, hs, caches = StackedLSTM.forward(X, WLSTMs, mask)
+  dX, dWLSTMs, _, _ = StackedLSTM.backward(dH * mask[:, :, np.newaxis], caches)
+
+  ok = True
+  dWsum = [np.zeros_like(W) for W in WLSTMs]
+  for j in range(b):
+    L = lengths[j]
+    Hj, csj, hsj, cachesj = StackedLSTM.forward(X[:L, j:j+1], WLSTMs)
+    dXj, dWj, _, _ = StackedLSTM.backward(dH[:L, j:j+1], cachesj)
+    ok = ok and np.allclose(H[:L, j:j+1], Hj) and np.allclose(H[L:, j], 0)
+    ok = ok and all(np.allclose(c[j], cj[0]) for c, cj in zip(cs, csj))
+    ok = ok and all(np.allclose(h[j], hj[0]) for h, hj in zip(hs, hsj))
+    ok = ok and np.allclose(dX[:L, j:j+1], dXj)
+    for dW, dWjl in zip(dWsum, dWj):
+      dW += dWjl
+  ok = ok and all(np.allclose(dW, dWs) for dW, dWs in zip(dWLSTMs, dWsum))
+  print('Making sure padded batch agrees with unpadded sequences: (should be True)')
+  print(ok)
+
+
+def checkTruncatedBPTT():
+  """ tbptt with k >= n is the full backward, with k < n the forward state still flows through """
+
+  n,b = (8, 2)
+  input_size = 5
+  WLSTMs = StackedLSTM.init(input_size, [4, 3])
+  X = np.random.randn(n,b,input_size)
+  wrand = np.random.randn(n,b,3)
+  loss_grad = lambda t0, H: (np.sum(H * wrand[t0:t0+H.shape[0]]), wrand[t0:t0+H.shape[0]])
+
+  H, cs, hs, caches = StackedLSTM.forward(X, WLSTMs)
+  _, dWLSTMs, _, _ = StackedLSTM.backward(wrand, caches)
+  loss, tdWLSTMs, tcs, ths = StackedLSTM.tbptt(X, WLSTMs, loss_grad, n)
+  loss3, _, tcs3, ths3 = StackedLSTM.tbptt(X, WLSTMs, loss_grad, 3)
+
+  print('Making sure truncated BPTT agrees with full BPTT: (should all be True)')
+  print(all(np.allclose(a, c) for a, c in zip(dWLSTMs, tdWLSTMs)))
+  print(np.allclose(loss, np.sum(H * wrand)) and np.allclose(loss3, loss))
+  print(all(np.allclose(a, c) for a, c in zip(cs, tcs3)) and all(np.allclose(a, c) for a, c in zip(hs, ths3)))
+
+
+def checkStackedGradient():
+  """ numerical gradient check of a 2-layer, padded batch """
+
+  n,b = (5, 3)
+  input_size = 4
+  WLSTMs = StackedLSTM.init(input_size, [3, 2])
+  mask = StackedLSTM.lengths_to_mask([5, 3, 1], n)
+  X = np.random.randn(n,b,input_size)
+  c0s = [np.random.randn(b,3), np.random.randn(b,2)]
+  h0s = [np.random.randn(b,3), np.random.randn(b,2)]
+  wrand = np.random.randn(n,b,2)
+  wc = [np.random.randn(b,3), np.random.randn(b,2)] # also put a loss on the final states
+
+  def fwd():
+    H, cs, hs, _ = StackedLSTM.forward(X, WLSTMs, mask, c0s, h0s, keep_cache=False)
+    return np.sum(H * wrand) + sum(np.sum((c + h) * w) for c, h, w in zip(cs, hs, wc))
+
+  H, cs, hs, caches = StackedLSTM.forward(X, WLSTMs, mask, c0s, h0s)
+  dX, dWLSTMs, dc0s, dh0s = StackedLSTM.backward(wrand, caches, wc, wc)
+
+  delta = 1e-5
+  tocheck = [X] + WLSTMs + c0s + h0s
+  grads_analytic = [dX] + dWLSTMs + dc0s + dh0s
+  max_rel_error = 0
+  for mat, dmat in zip(tocheck, grads_analytic):
+    for i in range(mat.size):
+      old_val = mat.flat[i]
+      mat.flat[i] = old_val + delta
+      loss0 = fwd()
+      mat.flat[i] = old_val - delta
+      loss1 = fwd()
+      mat.flat[i] = old_val
+      grad_numerical = (loss0 - loss1) / (2 * delta)
+      grad_analytic = dmat.flat[i]
+      if abs(grad_numerical) < 1e-7 and abs(grad_analytic) < 1e-7:
+        continue
+      rel_error = abs(grad_analytic - grad_numerical) / abs(grad_numerical + grad_analytic)
+      max_rel_error = max(max_rel_error, rel_error)
+  print('max relative error of stacked/padded gradient: %e (should be < 1e-5)' % max_rel_error)
+
+
+if __name__ == "__main__":
+
+  checkSingleLayerMatchesLSTM()
+  checkPaddedMatchesUnpadded()
+  checkTruncatedBPTT()
+  checkStackedGradient()
@@ -0,0 +1,167 @@
+"""Vectorized skip-gram input pipeline for the word2vec examples.
+
+`word2vec_basic.generate_batch` (and its copy in word2vec_udacity) fills every
+batch with a Python loop over a deque and calls `random.sample` per centre word,
+on top of `data` being a Python list. Here:
+
+  * the corpus is an int32 NumPy array, encoded in one pass,
+  * (centre, context) pairs of a whole block of centres are built at once from
+    an index matrix `positions[:, None] + offsets[None, :]`,
+  * frequent words are subsampled with keep probabilities precomputed per word
+    id (the formula of the original word2vec C code),
+  * a background thread prepares batches ahead of the training loop.
+
+Batches have the same shapes and dtypes as `generate_batch`:
+`batch` is int32 [batch_size], `labels` is int32 [batch_size, 1].
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import threading
+
+import numpy as np
+from six.moves import queue
+
+
+def build_dataset(words, n_words):
+  """Process raw inputs into a dataset.
+
+  Returns `data` (int32 word ids, 0 is 'UNK'), `count` ([word, frequency],
+  most common first), `dictionary` (word -> id) and the reversed dictionary.
+  """
+  count = [['UNK', -1]]
+  count.extend(collections.Counter(words).most_common(n_words - 1))
+  dictionary = dict()
+  for word, _ in count:
+    dictionary[word] = len(dictionary)
+  get = dictionary.get
+  data = np.fromiter((get(word, 0) for word in words), dtype=np.int32,
+                     count=len(words))
+  count[0][1] = int(np.count_nonzero(data == 0))
+  reversed_dictionary = dict(zip(dictionary.values(), dictionary.keys()))
+  return data, count, dictionary, reversed_dictionary
+
+
+def keep_probabilities(count, sample=1e-3):
+  """Per word id probability of keeping a token, as in word2vec.c.
+
+  Args:
+    count: list of [word, frequency] ordered by word id (from build_dataset).
+    sample: subsampling threshold, 0 disables subsampling.
+
+  Returns:
+    float32 array [vocabulary_size], 1 for words rarer than the threshold.
+  """
+  freqs = np.array([c for _, c in count], dtype=np.float64)
+  if sample <= 0:
+    return np.ones(len(freqs), dtype=np.float32)
+  threshold = sample * freqs.sum()
+  with np.errstate(divide='ignore'):
+    keep = (np.sqrt(freqs / threshold) + 1) * threshold / freqs
+  return np.minimum(keep, 1.0).astype(np.float32)
+
+
+def subsample(data, keep_prob, rng=np.random):
+  """Drops each token independently with probability 1 - keep_prob[token]."""
+  return data[rng.random_sample(len(data)) < keep_prob[data]]
+
+
+def skipgram_pairs(data, start, num_centres, num_skips, skip_window,
+                   rng=np.random):
+  """(centre, context) pairs for the centres data[start:start+num_centres].
+
+  The corpus is treated as circular, like generate_batch does. For every
+  centre `num_skips` distinct context offsets are drawn from the window
+  [-skip_window, skip_window] \\ {0}.
+
+  Returns:
+    batch int32 [num_centres * num_skips], labels int32 [num_centres * num_skips, 1]
+  """
+  assert num_skips <= 2 * skip_window
+  offsets = np.r_[np.arange(-skip_window, 0), np.arange(1, skip_window + 1)]
+  positions = np.arange(start, start + num_centres)
+  if num_skips < len(offsets):
+    # random.sample for every row at once: argsort of random keys
+    choice = np.argsort(rng.random_sample((num_centres, len(offsets))),
+                        axis=1)[:, :num_skips]
+    offsets = offsets[choice]
+  else:
+    offsets = np.broadcast_to(offsets, (num_centres, len(offsets)))
+  n = len(data)
+  batch = np.repeat(data[positions % n], num_skips)
+  labels = data[(positions[:, None] + offsets) % n].reshape(-1, 1)
+  return batch, labels
+
+
+class SkipGramBatcher(object):
+  """Endless stream of skip-gram batches, prepared by a background thread.
+
+  Every epoch the corpus is subsampled again (if keep_prob is given), then
+  walked in order; `batches_per_chunk` batches are built with one call to
+  skipgram_pairs and queued.
+  """
+
+  def __init__(self, data, batch_size, num_skips, skip_window, keep_prob=None,
+               prefetch=8, batches_per_chunk=64, seed=None):
+    assert batch_size % num_skips == 0
+    assert num_skips <= 2 * skip_window
+    self._data = np.asarray(data, dtype=np.int32)
+    self._batch_size = batch_size
+    self._num_skips = num_skips
+    self._skip_window = skip_window
+    self._keep_prob = keep_prob
+    self._batches_per_chunk = batches_per_chunk
+    self._rng = np.random.RandomState(seed)
+    self._queue = queue.Queue(maxsize=prefetch)
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _epoch_data(self):
+    if self._keep_prob is None:
+      return self._data
+    return subsample(self._data, self._keep_prob, self._rng)
+
+  def _put(self, item):
+    while not self._stop.is_set():
+      try:
+        self._queue.put(item, timeout=0.1)
+        return True
+      except queue.Full:
+        pass
+    return False
+
+  def _run(self):
+    centres_per_batch = self._batch_size // self._num_skips
+    centres_per_chunk = centres_per_batch * self._batches_per_chunk
+    try:
+      while not self._stop.is_set():
+        data = self._epoch_data()
+        for start in range(0, len(data), centres_per_chunk):
+          batch, labels = skipgram_pairs(data, start, centres_per_chunk,
+                                         self._num_skips, self._skip_window,
+                                         self._rng)
+          for i in range(0, len(batch), self._batch_size):
+            if not self._put((batch[i:i + self._batch_size],
+                              labels[i:i + self._batch_size])):
+              return
+    except Exception as e:  # pylint: disable=broad-except
+      self._put(e)
+
+  def next_batch(self):
+    item = self._queue.get()
+    if isinstance(item, Exception):
+      raise item
+    return item
+
+  def __iter__(self):
+    while True:
+      yield self.next_batch()
+
+  def close(self):
+    self._stop.set()
+    self._thread.join()
@@ -0,0 +1,404 @@
+# coding:utf-8
+"""Multi-process Hogwild word2vec skip-gram trainer in plain NumPy.
+
+Same model and training schedule as word2vec_optimized.py (skip-gram with
+negative sampling, unigram^0.75 noise distribution, frequent-word subsampling,
+learning rate decaying linearly to 0 over all epochs), but without the custom
+word2vec_kernels.cc ops and without TensorFlow:
+
+* the input and output embedding matrices live in
+  `multiprocessing.shared_memory` and every worker process updates them
+  in place without locks (Hogwild),
+* every worker trains on its own, disjoint shard of the corpus,
+* negatives are drawn from a precomputed alias table in O(1) per sample,
+* the processed word count of every worker is kept in shared memory too, so
+  all workers decay the learning rate from the same global progress.
+
+There is no GIL between the workers, so on CPU-only machines throughput grows
+almost linearly with --concurrent_steps (the number of worker processes).
+
+python word2vec_hogwild.py \
+  --train_data=text8 \
+  --eval_data=questions-words.txt \
+  --save_path=/tmp/
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy.sparse as sp
+
+import skipgram_corpus
+
+
+def build_vocab(words, min_count):
+  """Word ids ordered by frequency, id 0 is UNK (as in the skipgram op).
+
+  Returns:
+    vocab_words: list of words, vocab_counts: int64 array, data: int32 corpus.
+  """
+  counter = collections.Counter(words)
+  vocab_words = [b"UNK"]
+  vocab_words.extend(w for w, c in counter.most_common() if c >= min_count)
+  word2id = {w: i for i, w in enumerate(vocab_words)}
+  get = word2id.get
+  data = np.fromiter((get(w, 0) for w in words), dtype=np.int32,
+                     count=len(words))
+  vocab_counts = np.bincount(data, minlength=len(vocab_words)).astype(np.int64)
+  return vocab_words, vocab_counts, data
+
+
+def build_alias_table(probs):
+  """Vose's alias method: O(V) setup, O(1) per sample."""
+  n = len(probs)
+  scaled = np.asarray(probs, dtype=np.float64) * n / np.sum(probs)
+  prob = np.zeros(n)
+  alias = np.zeros(n, dtype=np.int64)
+  small = [i for i in range(n) if scaled[i] < 1.0]
+  large = [i for i in range(n) if scaled[i] >= 1.0]
+  while small and large:
+    s = small.pop()
+    l = large.pop()
+    prob[s] = scaled[s]
+    alias[s] = l
+    scaled[l] -= 1.0 - scaled[s]
+    if scaled[l] < 1.0:
+      small.append(l)
+    else:
+      large.append(l)
+  for i in large + small:  # leftovers are 1 up to rounding
+    prob[i] = 1.0
+  return prob, alias
+
+
+def alias_sample(prob, alias, size, rng):
+  k = rng.randint(0, len(prob), size=size)
+  return np.where(rng.random_sample(size) < prob[k], k, alias[k])
+
+
+def _sigmoid(x):
+  return 1.0 / (1.0 + np.exp(-np.clip(x, -30, 30)))
+
+
+def _scatter_add(w, rows, cols, vals, dense):
+  """w[rows[i]] += vals[i] * dense[cols[i]], duplicate rows accumulate.
+
+  Done as one sparse x dense product over the distinct rows, which is several
+  times faster than np.add.at on the expanded [B * (1 + K), D] gradients.
+  """
+  uniq, inv = np.unique(rows, return_inverse=True)
+  m = sp.csr_matrix((vals, (inv.ravel(), cols)), shape=(len(uniq), len(dense)))
+  w[uniq] += m.dot(dense)
+
+
+class SharedArrays(object):
+  """Named NumPy arrays backed by one multiprocessing.shared_memory block each."""
+
+  def __init__(self, specs=None, names=None):
+    """specs: {key: (shape, dtype)} to create, names: {key: (shm name, shape, dtype)} to attach."""
+    self._shms = {}
+    self.arrays = {}
+    self.owner = specs is not None
+    if specs is not None:
+      for key, (shape, dtype) in specs.items():
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        self._add(key, shm, shape, dtype)
+    else:
+      for key, (name, shape, dtype) in names.items():
+        self._add(key, shared_memory.SharedMemory(name=name), shape, dtype)
+
+  def _add(self, key, shm, shape, dtype):
+    self._shms[key] = shm
+    self.arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+  def names(self):
+    return {key: (self._shms[key].name, arr.shape, arr.dtype.str)
+            for key, arr in self.arrays.items()}
+
+  def close(self):
+    self.arrays = {}
+    for shm in self._shms.values():
+      shm.close()
+      if self.owner:
+        shm.unlink()
+    self._shms = {}
+
+
+def _train_shard(worker_id, epoch, shared_names, opts):
+  """Worker process: one epoch over shard `worker_id` of the corpus."""
+  shared = SharedArrays(names=shared_names)
+  arrays = shared.arrays
+  w_in, w_out = arrays["w_in"], arrays["w_out"]
+  data, progress = arrays["data"], arrays["progress"]
+  keep_prob = arrays["keep_prob"]
+  alias_prob, alias = arrays["alias_prob"], arrays["alias"]
+  rng = np.random.RandomState((opts.seed + 1000003 * epoch + worker_id) % 2**32)
+
+  n = len(data)
+  begin = n * worker_id // opts.concurrent_steps
+  end = n * (worker_id + 1) // opts.concurrent_steps
+  shard = data[begin:end]
+  words_to_train = float(n * opts.epochs_to_train)
+  num_skips = 2 * opts.window_size
+  centres_per_step = max(opts.batch_size // num_skips, 1)
+
+  kept = skipgram_corpus.subsample(shard, keep_prob, rng)
+  # raw shard words covered by one kept word, to count progress like the op
+  raw_per_kept = len(shard) / float(max(len(kept), 1))
+  done = 0.0
+  for start in range(0, len(kept), centres_per_step):
+    num_centres = min(centres_per_step, len(kept) - start)
+    examples, labels = skipgram_corpus.skipgram_pairs(
+        kept, start, num_centres, num_skips, opts.window_size, rng)
+    done += num_centres * raw_per_kept
+    progress[worker_id] = epoch * len(shard) + int(done)
+    lr = opts.learning_rate * max(0.0001,
+                                  1.0 - progress.sum() / words_to_train)
+
+    # [B, 1 + num_samples]: the true label followed by the negatives
+    batch = len(examples)
+    targets = np.empty((batch, 1 + opts.num_samples), dtype=np.int64)
+    targets[:, 0] = labels[:, 0]
+    targets[:, 1:] = alias_sample(alias_prob, alias, (batch, opts.num_samples),
+                                  rng)
+    emb = w_in[examples]  # [B, D]
+    out = w_out[targets]  # [B, 1 + K, D]
+    logits = np.einsum("bd,bkd->bk", emb, out)
+    g = -_sigmoid(logits)
+    g[:, 0] += 1.0
+    g *= lr
+    grad_in = np.einsum("bk,bkd->bd", g, out)
+    _scatter_add(w_out, targets.ravel(), np.repeat(np.arange(batch), g.shape[1]),
+                 g.ravel(), emb)
+    _scatter_add(w_in, examples, np.arange(batch), np.ones(batch, np.float32),
+                 grad_in)
+  progress[worker_id] = (epoch + 1) * len(shard)
+  shared.close()
+
+
+class Word2Vec(object):
+  """Hogwild Word2Vec model (Skipgram)."""
+
+  def __init__(self, options):
+    self._options = options
+    opts = options
+    with open(opts.train_data, "rb") as f:
+      words = f.read().split()
+    (opts.vocab_words, opts.vocab_counts,
+     data) = build_vocab(words, opts.min_count)
+    del words
+    opts.vocab_size = len(opts.vocab_words)
+    opts.words_per_epoch = len(data)
+    print("Data file: ", opts.train_data)
+    print("Vocab size: ", opts.vocab_size - 1, " + UNK")
+    print("Words per epoch: ", opts.words_per_epoch)
+
+    self._id2word = opts.vocab_words
+    self._word2id = {w: i for i, w in enumerate(self._id2word)}
+
+    count = list(zip(opts.vocab_words, opts.vocab_counts))
+    keep_prob = skipgram_corpus.keep_probabilities(count, opts.subsample)
+    alias_prob, alias = build_alias_table(opts.vocab_counts ** 0.75)
+
+    rng = np.random.RandomState(opts.seed)
+    self._shared = SharedArrays(specs={
+        "w_in": ((opts.vocab_size, opts.emb_dim), np.float32),
+        "w_out": ((opts.vocab_size, opts.emb_dim), np.float32),
+        "data": (data.shape, np.int32),
+        "progress": ((opts.concurrent_steps,), np.int64),
+        "keep_prob": (keep_prob.shape, np.float32),
+        "alias_prob": (alias_prob.shape, np.float64),
+        "alias": (alias.shape, np.int64),
+    })
+    arrays = self._shared.arrays
+    arrays["w_in"][:] = rng.uniform(-0.5 / opts.emb_dim, 0.5 / opts.emb_dim,
+                                    (opts.vocab_size, opts.emb_dim))
+    arrays["w_out"][:] = 0
+    arrays["data"][:] = data
+    arrays["progress"][:] = 0
+    arrays["keep_prob"][:] = keep_prob
+    arrays["alias_prob"][:] = alias_prob
+    arrays["alias"][:] = alias
+    self._epoch = 0
+
+  @property
+  def w_in(self):
+    return self._shared.arrays["w_in"]
+
+  def read_analogies(self):
+    """Reads through the analogy question file (same format as word2vec_optimized)."""
+    questions = []
+    questions_skipped = 0
+    with open(self._options.eval_data, "rb") as analogy_f:
+      for line in analogy_f:
+        if line.startswith(b":"):  # Skip comments.
+          continue
+        words = line.strip().lower().split(b" ")
+        ids = [self._word2id.get(w.strip()) for w in words]
+        if None in ids or len(ids) != 4:
+          questions_skipped += 1
+        else:
+          questions.append(np.array(ids))
+    print("Eval analogy file: ", self._options.eval_data)
+    print("Questions: ", len(questions))
+    print("Skipped: ", questions_skipped)
+    self._analogy_questions = np.array(questions, dtype=np.int32).reshape(-1, 4)
+
+  def train(self):
+    """Train one epoch with opts.concurrent_steps worker processes."""
+    opts = self._options
+    progress = self._shared.arrays["progress"]
+    names = self._shared.names()
+    workers = [multiprocessing.Process(target=_train_shard,
+                                       args=(i, self._epoch, names, opts))
+               for i in range(opts.concurrent_steps)]
+    for p in workers:
+      p.start()
+
+    words_to_train = float(opts.words_per_epoch * opts.epochs_to_train)
+    last_words, last_time = progress.sum(), time.time()
+    while any(p.is_alive() for p in workers):
+      time.sleep(1)
+      words, now = progress.sum(), time.time()
+      rate = (words - last_words) / (now - last_time)
+      last_words, last_time = words, now
+      lr = opts.learning_rate * max(0.0001, 1.0 - words / words_to_train)
+      print("Epoch %4d: lr = %5.3f words/sec = %8.0f\r" % (self._epoch, lr, rate),
+            end="")
+      sys.stdout.flush()
+    for p in workers:
+      p.join()
+      if p.exitcode != 0:
+        raise RuntimeError("worker exited with code %d" % p.exitcode)
+    self._epoch += 1
+
+  def _normalized(self):
+    w = self.w_in.astype(np.float64)
+    return w / np.maximum(np.linalg.norm(w, axis=1, keepdims=True), 1e-12)
+
+  def _predict(self, analogy, nemb=None):
+    """Predict the top 4 answers for analogy questions."""
+    if nemb is None:
+      nemb = self._normalized()
+    target = nemb[analogy[:, 2]] + (nemb[analogy[:, 1]] - nemb[analogy[:, 0]])
+    dist = target.dot(nemb.T)
+    k = min(4, dist.shape[1])
+    idx = np.argpartition(-dist, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(dist, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+  def eval(self):
+    """Evaluate analogy questions and reports accuracy."""
+    try:
+      total = self._analogy_questions.shape[0]
+    except AttributeError:
+      raise AttributeError("Need to read analogy questions.")
+
+    correct = 0
+    nemb = self._normalized()
+    for start in range(0, total, 2500):
+      sub = self._analogy_questions[start:start + 2500, :]
+      idx = self._predict(sub, nemb)
+      for question in range(sub.shape[0]):
+        for j in range(idx.shape[1]):
+          if idx[question, j] == sub[question, 3]:
+            # Bingo! We predicted correctly. E.g., [italy, rome, france, paris].
+            correct += 1
+            break
+          elif idx[question, j] in sub[question, :3]:
+            # We need to skip words already in the question.
+            continue
+          else:
+            # The correct label is not the precision@1
+            break
+    print()
+    print("Eval %4d/%d accuracy = %4.1f%%" % (correct, total,
+                                              correct * 100.0 / max(total, 1)))
+    return correct, total
+
+  def nearby(self, words, num=20):
+    """Prints out nearby words given a list of words."""
+    nemb = self._normalized()
+    ids = np.array([self._word2id.get(x, 0) for x in words])
+    dist = nemb[ids].dot(nemb.T)
+    for i in range(len(words)):
+      idx = np.argsort(-dist[i])[:num]
+      print("\n%s\n=====================================" % (words[i]))
+      for neighbor in idx:
+        print("%-20s %6.4f" % (self._id2word[neighbor], dist[i, neighbor]))
+
+  def save(self):
+    opts = self._options
+    np.save(os.path.join(opts.save_path, "w_in.npy"), self.w_in)
+    with open(os.path.join(opts.save_path, "vocab.txt"), "wb") as f:
+      for word, count in zip(opts.vocab_words, opts.vocab_counts):
+        f.write(word + b" " + str(count).encode("utf-8") + b"\n")
+
+  def close(self):
+    self._shared.close()
+
+
+def parse_args(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("--save_path", required=True,
+                      help="Directory to write the model.")
+  parser.add_argument("--train_data", required=True,
+                      help="Training data. E.g., unzipped file "
+                      "http://mattmahoney.net/dc/text8.zip.")
+  parser.add_argument("--eval_data", required=True,
+                      help="Analogy questions (questions-words.txt).")
+  parser.add_argument("--embedding_size", dest="emb_dim", type=int,
+                      default=200, help="The embedding dimension size.")
+  parser.add_argument("--epochs_to_train", type=int, default=15,
+                      help="Number of epochs to train.")
+  parser.add_argument("--learning_rate", type=float, default=0.025,
+                      help="Initial learning rate.")
+  parser.add_argument("--num_neg_samples", dest="num_samples", type=int,
+                      default=25, help="Negative samples per training example.")
+  parser.add_argument("--batch_size", type=int, default=500,
+                      help="Training examples per Hogwild update.")
+  parser.add_argument("--concurrent_steps", type=int,
+                      default=multiprocessing.cpu_count(),
+                      help="The number of worker processes.")
+  parser.add_argument("--window_size", type=int, default=5,
+                      help="The number of words to predict to the left and "
+                      "right of the target word.")
+  parser.add_argument("--min_count", type=int, default=5,
+                      help="The minimum number of word occurrences for it to "
+                      "be included in the vocabulary.")
+  parser.add_argument("--subsample", type=float, default=1e-3,
+                      help="Subsample threshold for word occurrence. Set to 0 "
+                      "to disable.")
+  parser.add_argument("--seed", type=int, default=1234)
+  opts = parser.parse_args(argv)
+  if not os.path.exists(opts.save_path):
+    os.makedirs(opts.save_path)
+  return opts
+
+
+def main(argv=None):
+  """Train a word2vec model."""
+  opts = parse_args(argv)
+  model = Word2Vec(opts)
+  try:
+    model.read_analogies()
+    for _ in range(opts.epochs_to_train):
+      model.train()  # Process one epoch
+      model.eval()  # Eval analogies.
+    model.save()
+  finally:
+    model.close()
+
+
+if __name__ == "__main__":
+  main()
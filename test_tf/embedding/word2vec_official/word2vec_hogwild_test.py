@@ -0,0 +1,63 @@
+# coding:utf-8
+"""Tests for word2vec_hogwild module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import word2vec_hogwild
+
+
+class Word2VecHogwildTest(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.train_data = os.path.join(self.temp_dir, "test-text.txt")
+    self.eval_data = os.path.join(self.temp_dir, "eval-text.txt")
+    with open(self.train_data, "w") as f:
+      f.write(
+          """alice was beginning to get very tired of sitting by her sister on
+          the bank, and of having nothing to do: once or twice she had peeped
+          into the book her sister was reading, but it had no pictures or
+          conversations in it, 'and what is the use of a book,' thought alice
+          'without pictures or conversations?' So she was considering in her own
+          mind (as well as she could, for the hot day made her feel very sleepy
+          and stupid), whether the pleasure of making a daisy-chain would be
+          worth the trouble of getting up and picking the daisies, when suddenly
+          a White rabbit with pink eyes ran close by her.\n""")
+    with open(self.eval_data, "w") as f:
+      f.write("alice she rabbit once\n")
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def testAliasTable(self):
+    probs = np.array([1., 2., 3., 4., 0.])
+    prob, alias = word2vec_hogwild.build_alias_table(probs)
+    rng = np.random.RandomState(0)
+    samples = word2vec_hogwild.alias_sample(prob, alias, 200000, rng)
+    freqs = np.bincount(samples, minlength=5) / 200000.0
+    self.assertTrue(np.allclose(freqs, probs / probs.sum(), atol=0.01))
+
+  def testWord2VecHogwild(self):
+    word2vec_hogwild.main([
+        "--train_data", self.train_data, "--eval_data", self.eval_data,
+        "--save_path", self.temp_dir, "--batch_size", "5",
+        "--num_neg_samples", "10", "--epochs_to_train", "2",
+        "--min_count", "0", "--concurrent_steps", "2",
+        "--embedding_size", "16"])
+    w_in = np.load(os.path.join(self.temp_dir, "w_in.npy"))
+    self.assertTrue(np.all(np.isfinite(w_in)))
+    with open(os.path.join(self.temp_dir, "vocab.txt"), "rb") as f:
+      self.assertEqual(len(f.readlines()), w_in.shape[0])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -17,6 +17,9 @@ from six.moves import range
 from six.moves.urllib.request import urlretrieve
 from sklearn.manifold import TSNE
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'word2vec_official'))
+import skipgram_corpus # 向量化的 skip-gram batch 生成 + 后台线程预取
+
 url = 'http://mattmahoney.net/dc/'
 
 
@@ -51,35 +54,8 @@ print('Data size %d' % len(words)) # 1700,5207
 vocabulary_size = 50000
 
 # word:list(str)
-def build_dataset(words):
-    # words:list,所有的句子组成了一个大的list，其长度为17005207
-    print("len:",len(words)," words:",words[0:10]) # len: 17005207  words: ['anarchism', 'originated', 'as', 'a', 'term', 'of', 'abuse', 'first', 'used', 'against']
-    #sys.exit(-1)
-    count = [['UNK', -1]] # (word,词频)
-    count.extend(collections.Counter(words).most_common(vocabulary_size - 1)) # 最常见的4999个词
-    dictionary = dict()
-    # print(count) # count里除了第一个元素，每个元素都是二维元组，第一个是word,第二个是词频
-    # 建立word -> 索引 的映射
-    for word, _ in count:
-        dictionary[word] = len(dictionary) # word -> 索引 , 开始时len=0
-    index_data = list()
-    unk_count = 0
-    # 将语料中所有的词替换成索引值
-    for word in words:
-        if word in dictionary:
-            index = dictionary[word] # 获取索引值
-        else:
-            index = 0  # dictionary['UNK']，未登录词使用0代替
-            unk_count = unk_count + 1
-        index_data.append(index)
-
-    count[0][1] = unk_count # 更新未登录词的统计数量
-    # 将词的索引与word交换，形成索引->word的映射
-    reverse_dictionary = dict(zip(dictionary.values(), dictionary.keys()))
-    return index_data, count, dictionary, reverse_dictionary
-
-
-index_data, count, dictionary, reverse_dictionary = build_dataset(words)
+# index_data 为 int32 的 numpy 数组, 由 skipgram_corpus.build_dataset 一次编码得到
+index_data, count, dictionary, reverse_dictionary = skipgram_corpus.build_dataset(words, vocabulary_size)
 print('Most common words (+UNK)', count[:5])
 print('Sample data', index_data[:10]) # data的前10个词的index
 del words  # Hint to reduce memory.
@@ -212,13 +188,15 @@ with graph.as_default(), tf.device('/cpu:0'):
     print("similarity:",similarity) # N*V
 
 num_steps = 100001
+# 高频词按 word2vec 的公式下采样, batch 在后台线程里提前准备好
+batcher = skipgram_corpus.SkipGramBatcher(index_data, batch_size, num_skips, skip_window,
+                                          keep_prob=skipgram_corpus.keep_probabilities(count, sample=1e-3))
 with tf.Session(graph=graph) as session:
     tf.global_variables_initializer().run()
     print('Initialized')
     average_loss = 0
     for step in range(num_steps):
-        batch_data, batch_labels = generate_batch(
-            batch_size, num_skips, skip_window)
+        batch_data, batch_labels = batcher.next_batch()
         feed_dict = {train_dataset: batch_data, train_labels: batch_labels} # 这里的train_dataset是上面graph里的train_dataset
         _, l = session.run([optimizer, loss], feed_dict=feed_dict)
         average_loss += l
@@ -243,6 +221,7 @@ with tf.Session(graph=graph) as session:
                     log = '%s %s,' % (log, close_word)
                 print(log)
     final_embeddings = normalized_embeddings.eval()
+batcher.close()
 
 # 可视化一部分点
 num_points = 400
@@ -1,132 +1,124 @@
 import tensorflow as tf
 import numpy as np
-import random
 import argparse
+import time
+
+from sparse_embedding import SparseEmbedding
 
-# flags = tf.app.flags
-# FLAGS = flags.FLAGS
 
 def gen_sparse_indices(batch, nzdim):
-    batch_ids = []
-    for i in range(0, batch):
-        batch_ids.extend([[i, j] for j in range(0, nzdim)])
-    return batch_ids
+    # [[0, 0], [0, 1], ..., [batch-1, nzdim-1]]
+    return np.stack([np.repeat(np.arange(batch, dtype=np.int64), nzdim),
+                     np.tile(np.arange(nzdim, dtype=np.int64), batch)], axis=1)
 
 
 # generate sparse tensor ids and values.
-def gen_sparse_inputs(batch, dim, nzdim):
-    batch_ids = []
-    batch_values = []
-    k = 0
-    for i in range(0, batch):
-        batch_ids.extend([(k + j) % dim for j in range(0, nzdim)])
-        batch_values.extend(np.ones(nzdim, dtype=np.float32))
-        k = (k + 1) % dim
-    return {"ids": batch_ids,
-            "values": batch_values}
-
-
-def sparse_transform(ids, values, weight_shape):
+def gen_sparse_inputs(batch, dim, nzdim, id_dist='sliding', rng=np.random):
+    if id_dist == 'sliding':
+        # row i: ids i, i+1, ..., i+nzdim-1 (mod dim)
+        batch_ids = (np.arange(batch, dtype=np.int64)[:, None] % dim + np.arange(nzdim)) % dim
+    else:
+        # zipf: a few ids are very hot, id 0 is the hottest
+        batch_ids = (rng.zipf(1.2, size=(batch, nzdim)) - 1) % dim
+    return {"ids": batch_ids.ravel().astype(np.int64),
+            "values": np.ones(batch * nzdim, dtype=np.float32)}
+
+
+def sparse_transform(ids, values, weight_shape, num_shards=1, partition_strategy='div',
+                     baseline=False, hot_ids=None, name="weight"):
     assert (len(weight_shape) == 2)
-    with tf.device('/cpu:0'):
-        weights = []
-        # change the number of shards of weight.
-        num_shards = 1
-        assert (weight_shape[0] % num_shards == 0)
-
-        for i in range(0, num_shards):
-            weight_i = tf.get_variable("weight_%02d" % i,
-                                       [weight_shape[0] / num_shards] + weight_shape[1:],
-                                       trainable=True,
-                                       initializer=tf.truncated_normal_initializer(stddev=0.1))
-            weights.append(weight_i)
-
-    ids, _ = tf.sparse_fill_empty_rows(ids, 0)
-    values, _ = tf.sparse_fill_empty_rows(values, 0.0)
-    return tf.nn.embedding_lookup_sparse(weights, ids, values, partition_strategy='div', combiner='sum')
-
-
-def test_embedding_lookup_sparse():
-    batch = 256 #FLAGS.batch
-    nzdim = 100 #FLAGS.nonzero_dim
-    layers = "1000000,30"
-    weight_shape = [int(d) for d in layers.split(",")]
-    inputs = gen_sparse_inputs(batch, weight_shape[0], nzdim)
-
+    embedding = SparseEmbedding(name, weight_shape[0], weight_shape[1], num_shards=num_shards,
+                                partition_strategy=partition_strategy, hot_ids=hot_ids)
+    if baseline:
+        ids, _ = tf.sparse_fill_empty_rows(ids, 0)
+        values, _ = tf.sparse_fill_empty_rows(values, 0.0)
+        return embedding, tf.nn.embedding_lookup_sparse(embedding.shards, ids, values,
+                                                        partition_strategy=partition_strategy,
+                                                        combiner='sum')
+    return embedding, embedding.lookup(ids, values, combiner='sum', use_cache=hot_ids is not None)
+
+
+def benchmark_embedding_lookup_sparse(batch, nzdim, weight_shape, num_shards, partition_strategy,
+                                      max_steps, id_dist='sliding', baseline=False, num_hot_ids=0,
+                                      profile=False):
+    """returns lookups (non-zero ids) per second"""
+    tf.reset_default_graph()
+    inputs = gen_sparse_inputs(batch, weight_shape[0], nzdim, id_dist)
     batch_ids = gen_sparse_indices(batch, nzdim)
+    hot_ids = np.arange(num_hot_ids) if num_hot_ids > 0 else None
 
-    embedding_op = sparse_transform(tf.SparseTensor(indices=batch_ids, values=inputs["ids"],
-                                                    dense_shape=[batch, nzdim]),
-                                    tf.SparseTensor(indices=batch_ids, values=inputs["values"],
-                                                    dense_shape=[batch, nzdim]),
-                                    weight_shape)
-
-    init_op = tf.global_variables_initializer()
-
-    run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
-    run_metadata = tf.RunMetadata()
+    with tf.device('/cpu:0'):
+        embedding, embedding_op = sparse_transform(
+            tf.SparseTensor(indices=batch_ids, values=inputs["ids"], dense_shape=[batch, nzdim]),
+            tf.SparseTensor(indices=batch_ids, values=inputs["values"], dense_shape=[batch, nzdim]),
+            weight_shape, num_shards, partition_strategy, baseline, hot_ids)
 
     graph_options = tf.GraphOptions(enable_bfloat16_sendrecv=False)
     sess_config = tf.ConfigProto(allow_soft_placement=True,
-                                 log_device_placement=True,
                                  graph_options=graph_options)
-    sess = tf.Session(config=sess_config)
-
-    sess.run(init_op)
-
-    step = 0
-    max_steps = 1000
-    while step < max_steps: #FLAGS.max_steps:
-        sess.run([embedding_op],
-                 options=run_options,
-                 run_metadata=run_metadata)
-        step += 1
-
-    ProfileOptionBuilder = tf.profiler.ProfileOptionBuilder
-    opts = ProfileOptionBuilder(ProfileOptionBuilder.time_and_memory()
-                                ).with_node_names(show_name_regexes=['.*train.py.*']).build()
-
-    tf.profiler.profile(
-        tf.get_default_graph(),
-        run_meta=run_metadata,
-        cmd='code',
-        options=opts)
-
-    # Print to stdout an analysis of the memory usage and the timing information
-    # broken down by operation types.
-    tf.profiler.profile(
-        tf.get_default_graph(),
-        run_meta=run_metadata,
-        cmd='op',
-        options=tf.profiler.ProfileOptionBuilder.time_and_memory())
-
-    tf.contrib.tfprof.model_analyzer.print_model_analysis(
-        tf.get_default_graph(),
-        run_meta=run_metadata,
-        tfprof_options=tf.contrib.tfprof.model_analyzer.PRINT_ALL_TIMING_MEMORY)
+    with tf.Session(config=sess_config) as sess:
+        sess.run([tf.global_variables_initializer(), tf.local_variables_initializer(),
+                  tf.tables_initializer()])
+        if hot_ids is not None:
+            sess.run(embedding.refresh_cache_op)
+        # warm up
+        for _ in range(min(10, max_steps)):
+            sess.run(embedding_op)
+
+        start = time.time()
+        for _ in range(max_steps):
+            sess.run(embedding_op)
+        elapsed = time.time() - start
+
+        if profile:
+            run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+            run_metadata = tf.RunMetadata()
+            sess.run(embedding_op, options=run_options, run_metadata=run_metadata)
+            # Print to stdout an analysis of the memory usage and the timing information
+            # broken down by operation types.
+            tf.profiler.profile(
+                tf.get_default_graph(),
+                run_meta=run_metadata,
+                cmd='op',
+                options=tf.profiler.ProfileOptionBuilder.time_and_memory())
+    return batch * nzdim * max_steps / elapsed
 
 
 def main(_):
-    with tf.device('/cpu:0'):
-    #with tf.device('/gpu:0'):
-        test_embedding_lookup_sparse()
+    weight_shape = [int(d) for d in FLAGS.layers.split(",")]
+    print("%8s %8s %8s %10s %14s" % ("shards", "nonzero", "hot_ids", "impl", "lookups/s"))
+    for num_shards in [int(x) for x in FLAGS.shards.split(",")]:
+        for nzdim in [int(x) for x in FLAGS.nonzero_dims.split(",")]:
+            impls = [("baseline", True, 0), ("unique", False, 0)]
+            if FLAGS.hot_ids > 0:
+                impls.append(("cached", False, FLAGS.hot_ids))
+            for impl, baseline, num_hot_ids in impls:
+                speed = benchmark_embedding_lookup_sparse(
+                    FLAGS.batch, nzdim, weight_shape, num_shards, FLAGS.partition_strategy,
+                    FLAGS.max_steps, FLAGS.id_dist, baseline, num_hot_ids, FLAGS.profile)
+                print("%8d %8d %8d %10s %14.0f" % (num_shards, nzdim, num_hot_ids, impl, speed))
 
 
 if __name__ == '__main__':
-    print("heloow")
-    # parser = argparse.ArgumentParser()
-    #
-    # parser.add_argument('--layers', type=str, default="10000000,100",
-    #                     help='Network layers')
-    # parser.add_argument('--batch', type=int, default=256,
-    #                     help='Batch to train')
-    # parser.add_argument('--nonzero_dim', type=int, default=1000,
-    #                     help='non-zero dims of sparse tensor')
-    # parser.add_argument('--max_steps', type=int, default=1000,
-    #                     help='Max number of steps to run')
-    #
-    # FLAGS, unparsed = parser.parse_known_args()
-    #main()
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--layers', type=str, default="1000000,30",
+                        help='Embedding table shape: rows,dim')
+    parser.add_argument('--batch', type=int, default=256,
+                        help='Batch to train')
+    parser.add_argument('--shards', type=str, default="1,2,4,8",
+                        help='Comma separated numbers of shards to sweep')
+    parser.add_argument('--nonzero_dims', type=str, default="10,100,1000",
+                        help='Comma separated non-zero dims of sparse tensor to sweep')
+    parser.add_argument('--partition_strategy', type=str, default="div", choices=["div", "mod"])
+    parser.add_argument('--id_dist', type=str, default="sliding", choices=["sliding", "zipf"],
+                        help='sliding: the ids of the original profiling script, zipf: skewed ids')
+    parser.add_argument('--hot_ids', type=int, default=0,
+                        help='Cache the rows of ids [0, hot_ids), 0 disables the cache')
+    parser.add_argument('--max_steps', type=int, default=200,
+                        help='Max number of steps to run')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print a tfprof op-level timing of one traced step')
+
+    FLAGS, unparsed = parser.parse_known_args()
     tf.app.run(main=main)
-
-
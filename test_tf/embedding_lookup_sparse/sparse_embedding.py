@@ -0,0 +1,122 @@
+"""
+Sparse embedding layer on top of a partitioned embedding table.
+
+- the table is split into `num_shards` variables with the same `mod`/`div`
+  layout as tf.nn.embedding_lookup, shards can be spread over ps tasks
+- ids are deduplicated inside the batch with tf.unique, every distinct id is
+  looked up once, then gathered back and combined per row with a segment sum
+- optional hot-id cache: a small local copy of the most frequent rows, read
+  instead of the (possibly remote) shards at eval/serving time
+"""
+import numpy as np
+import tensorflow as tf
+
+
+def shard_sizes(vocab_size, num_shards):
+    """Rows of every shard, the first (vocab_size % num_shards) shards get one more row.
+    This is the layout both partition strategies of tf.nn.embedding_lookup expect."""
+    base, extra = divmod(vocab_size, num_shards)
+    return [base + 1 if i < extra else base for i in range(num_shards)]
+
+
+def create_partitioned_table(name, vocab_size, dim, num_shards=1, ps_tasks=0,
+                             initializer=None):
+    """
+    Create the shards of a [vocab_size, dim] table.
+    :param ps_tasks: if > 0, shard i is placed on /job:ps/task:(i % ps_tasks)
+    :return: list of variables
+    """
+    if initializer is None:
+        initializer = tf.truncated_normal_initializer(stddev=0.1)
+    shards = []
+    for i, rows in enumerate(shard_sizes(vocab_size, num_shards)):
+        device = '/job:ps/task:%d' % (i % ps_tasks) if ps_tasks > 0 else '/cpu:0'
+        with tf.device(device):
+            shards.append(tf.get_variable('%s_%02d' % (name, i), [rows, dim],
+                                          trainable=True, initializer=initializer))
+    return shards
+
+
+class SparseEmbedding(object):
+    """
+    Usage:
+        emb = SparseEmbedding('weight', 1000000, 30, num_shards=8, partition_strategy='mod')
+        out = emb.lookup(sp_ids, sp_weights, combiner='sum')  # [batch, dim]
+    """
+
+    def __init__(self, name, vocab_size, dim, num_shards=1, partition_strategy='mod',
+                 ps_tasks=0, hot_ids=None, initializer=None):
+        """
+        :param hot_ids: ids kept in the local cache (e.g. the most frequent ones), None disables the cache
+        """
+        assert partition_strategy in ('mod', 'div')
+        self.vocab_size = vocab_size
+        self.dim = dim
+        self.num_shards = num_shards
+        self.partition_strategy = partition_strategy
+        with tf.variable_scope(name):
+            self.shards = create_partitioned_table(name, vocab_size, dim, num_shards,
+                                                   ps_tasks, initializer)
+            self.hot_ids = None
+            if hot_ids is not None:
+                self._build_cache(np.unique(np.asarray(hot_ids, dtype=np.int64)))
+
+    def _build_cache(self, hot_ids):
+        self.hot_ids = hot_ids
+        with tf.device('/cpu:0'):
+            # id -> row of the cache, -1 for cold ids
+            self.cache_index = tf.contrib.lookup.HashTable(
+                tf.contrib.lookup.KeyValueTensorInitializer(
+                    tf.constant(hot_ids, dtype=tf.int64),
+                    tf.range(len(hot_ids), dtype=tf.int64)),
+                default_value=-1)
+            self.cache = tf.get_variable('hot_cache', [len(hot_ids), self.dim], trainable=False,
+                                         collections=[tf.GraphKeys.LOCAL_VARIABLES],
+                                         initializer=tf.zeros_initializer())
+        # run once after the table is initialized/restored and then every so often,
+        # the cache is a snapshot of the shards
+        self.refresh_cache_op = tf.assign(self.cache, self._lookup_shards(tf.constant(hot_ids)))
+
+    def _lookup_shards(self, ids):
+        return tf.nn.embedding_lookup(self.shards, ids,
+                                      partition_strategy=self.partition_strategy)
+
+    def lookup_unique(self, unique_ids, use_cache=False):
+        """rows of distinct ids, [num_ids, dim]"""
+        if not use_cache or self.hot_ids is None:
+            return self._lookup_shards(unique_ids)
+        cache_rows = self.cache_index.lookup(unique_ids)
+        is_hot = tf.greater_equal(cache_rows, 0)
+        hot_pos = tf.to_int32(tf.where(is_hot)[:, 0])
+        cold_pos = tf.to_int32(tf.where(tf.logical_not(is_hot))[:, 0])
+        hot_emb = tf.gather(self.cache, tf.gather(cache_rows, hot_pos))
+        cold_emb = self._lookup_shards(tf.gather(unique_ids, cold_pos))
+        return tf.dynamic_stitch([hot_pos, cold_pos], [hot_emb, cold_emb])
+
+    def lookup(self, sp_ids, sp_weights=None, combiner='sum', use_cache=False):
+        """
+        Same result as tf.nn.embedding_lookup_sparse(self.shards, sp_ids, sp_weights, ...),
+        rows without any id give zeros, so no sparse_fill_empty_rows is needed.
+        :param use_cache: read hot ids from the cache. The cache is not trainable and only as
+                          fresh as the last refresh_cache_op, so keep it off for training steps.
+        :return: [batch, dim]
+        """
+        assert combiner in ('sum', 'mean', 'sqrtn')
+        ids = tf.cast(sp_ids.values, tf.int64)
+        rows = tf.cast(sp_ids.indices[:, 0], tf.int32)
+        num_rows = tf.cast(sp_ids.dense_shape[0], tf.int32)
+
+        unique_ids, idx = tf.unique(ids)
+        emb = tf.gather(self.lookup_unique(unique_ids, use_cache), idx)  # [nnz, dim]
+
+        if sp_weights is None:
+            weights = tf.ones_like(ids, dtype=emb.dtype)
+        else:
+            weights = tf.cast(sp_weights.values, emb.dtype)
+        out = tf.unsorted_segment_sum(emb * tf.expand_dims(weights, 1), rows, num_rows)
+        if combiner == 'mean':
+            out /= tf.maximum(tf.unsorted_segment_sum(weights, rows, num_rows), 1e-12)[:, None]
+        elif combiner == 'sqrtn':
+            out /= tf.maximum(tf.sqrt(tf.unsorted_segment_sum(weights * weights, rows, num_rows)),
+                              1e-12)[:, None]
+        return out
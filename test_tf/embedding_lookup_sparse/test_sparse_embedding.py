@@ -0,0 +1,57 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+import numpy as np
+from tensorflow.python.platform import test
+
+from sparse_embedding import SparseEmbedding, shard_sizes
+
+
+class SparseEmbeddingTest(test.TestCase):
+
+    def _sparse_inputs(self):
+        # 第2行为空, 第0行有重复id
+        indices = [[0, 0], [0, 1], [0, 2], [1, 0], [3, 0], [3, 1]]
+        ids = [5, 5, 17, 3, 0, 22]
+        weights = [1.0, 2.0, 0.5, 1.0, 3.0, 1.0]
+        sp_ids = tf.SparseTensor(indices=indices, values=tf.constant(ids, dtype=tf.int64), dense_shape=[4, 3])
+        sp_weights = tf.SparseTensor(indices=indices, values=weights, dense_shape=[4, 3])
+        return sp_ids, sp_weights
+
+    def testShardSizes(self):
+        self.assertEqual(shard_sizes(23, 4), [6, 6, 6, 5])
+        self.assertEqual(shard_sizes(8, 4), [2, 2, 2, 2])
+
+    def testSameAsEmbeddingLookupSparse(self):
+        for strategy in ('mod', 'div'):
+            for combiner in ('sum', 'mean', 'sqrtn'):
+                with self.test_session(graph=tf.Graph()) as sess:
+                    sp_ids, sp_weights = self._sparse_inputs()
+                    emb = SparseEmbedding('w', 23, 4, num_shards=4, partition_strategy=strategy)
+                    result = emb.lookup(sp_ids, sp_weights, combiner=combiner)
+                    filled_ids, _ = tf.sparse_fill_empty_rows(sp_ids, 0)
+                    filled_weights, _ = tf.sparse_fill_empty_rows(sp_weights, 0.0)
+                    expected = tf.nn.embedding_lookup_sparse(emb.shards, filled_ids, filled_weights,
+                                                             partition_strategy=strategy, combiner=combiner)
+                    sess.run(tf.global_variables_initializer())
+                    result, expected = sess.run([result, expected])
+                    self.assertAllClose(result, expected)
+                    self.assertAllClose(result[2], np.zeros(4))
+
+    def testHotCache(self):
+        with self.test_session() as sess:
+            sp_ids, sp_weights = self._sparse_inputs()
+            emb = SparseEmbedding('w', 23, 4, num_shards=3, hot_ids=[0, 5, 7])
+            cached = emb.lookup(sp_ids, sp_weights, use_cache=True)
+            uncached = emb.lookup(sp_ids, sp_weights)
+            sess.run([tf.global_variables_initializer(), tf.local_variables_initializer(),
+                      tf.tables_initializer()])
+            sess.run(emb.refresh_cache_op)
+            cached, uncached = sess.run([cached, uncached])
+            self.assertAllClose(cached, uncached)
+
+
+if __name__ == "__main__":
+    test.main()
@@ -26,11 +26,15 @@ from __future__ import division
 from __future__ import print_function
 
 import os.path
+import sys
 import time
 import tensorflow as tf
 
 from tensorflow.examples.tutorials.mnist import mnist
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tf_record'))
+from tfrecord_dataset import make_batch
+
 
 # Basic model parameters as external flags.
 flags = tf.app.flags
@@ -42,6 +46,8 @@ flags.DEFINE_integer('hidden2', 32, 'Number of units in hidden layer 2.')
 flags.DEFINE_integer('batch_size', 100, 'Batch size.')
 flags.DEFINE_string('train_dir', '/tmp/data',
                     'Directory with the training data.')
+flags.DEFINE_boolean('use_dataset', True,
+                     'Read with tf.data instead of queue runners.')
 
 # Constants used for dealing with the files, matches convert_to_records.
 TRAIN_FILE = 'train.tfrecords'
@@ -79,6 +85,15 @@ def read_and_decode(filename_queue):
   return image, label
 
 
+def decode_batch(features):
+  """Same conversion as read_and_decode, for a batch of parsed examples."""
+  image = tf.decode_raw(features['image_raw'], tf.uint8)
+  image.set_shape([None, mnist.IMAGE_PIXELS])
+  image = tf.cast(image, tf.float32) * (1. / 255) - 0.5
+  label = tf.cast(features['label'], tf.int32)
+  return {'image': image, 'label': label}
+
+
 def inputs(train, batch_size, num_epochs):
   """Reads input data num_epochs times.
   Args:
@@ -92,13 +107,26 @@ def inputs(train, batch_size, num_epochs):
       in the range [-0.5, 0.5].
     * labels is an int32 tensor with shape [batch_size] with the true label,
       a number in the range [0, mnist.NUM_CLASSES).
-    Note that an tf.train.QueueRunner is added to the graph, which
-    must be run using e.g. tf.train.start_queue_runners().
+    With use_dataset=False a tf.train.QueueRunner is added to the graph,
+    which must be run using e.g. tf.train.start_queue_runners().
   """
   if not num_epochs: num_epochs = None
   filename = os.path.join(FLAGS.train_dir,
                           TRAIN_FILE if train else VALIDATION_FILE)
 
+  if FLAGS.use_dataset:
+    with tf.name_scope('input'):
+      # Parse a whole batch at once, decode_raw also works on the batch.
+      features = make_batch(
+          filename, batch_size,
+          features={
+              'image_raw': tf.FixedLenFeature([], tf.string),
+              'label': tf.FixedLenFeature([], tf.int64),
+          },
+          num_epochs=num_epochs,
+          map_fn=decode_batch)
+      return features['image'], features['label']
+
   with tf.name_scope('input'):
     filename_queue = tf.train.string_input_producer(
         [filename], num_epochs=num_epochs)
@@ -153,7 +181,8 @@ def run_training():
     coord = tf.train.Coordinator()
     threads = tf.train.start_queue_runners(sess=sess, coord=coord)
     # waiting for queue to get loaded
-    time.sleep(15)
+    if not FLAGS.use_dataset:
+      time.sleep(15)
     run_metadata = tf.RunMetadata()
 
     try:
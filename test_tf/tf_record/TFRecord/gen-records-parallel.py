@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# coding=gbk
+# ==============================================================================
+#          \file   gen-records-parallel.py
+#   \Description   parallel version of gen-records.py for big libsvm/tlc files
+#                  the input is split into byte ranges (aligned to line ends),
+#                  every range is parsed by a worker process and written to its own
+#                  (optionally ZLIB/GZIP compressed) TFRecord shard,
+#                  an index file with the record count of every shard is written last
+#
+#   python gen-records-parallel.py --input data/input.txt --output data/output \
+#       --num_shards 64 --num_workers 16 --compression ZLIB
+# ==============================================================================
+
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import time
+import multiprocessing
+
+import tensorflow as tf
+
+flags = tf.app.flags
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('input', 'data/input.txt', 'libsvm/tlc input file')
+flags.DEFINE_string('output', 'data/output', 'shards are written to output-00000-of-00010 ...')
+flags.DEFINE_string('label_type', 'int', '')
+flags.DEFINE_integer('num_shards', 0, 'number of byte ranges/output shards, 0 means 4 * num_workers')
+flags.DEFINE_integer('num_workers', 0, 'worker processes, 0 means cpu count')
+flags.DEFINE_string('compression', '', 'ZLIB, GZIP or empty for none')
+
+_float_feature = lambda v: tf.train.Feature(float_list=tf.train.FloatList(value=v))
+_int_feature = lambda v: tf.train.Feature(int64_list=tf.train.Int64List(value=v))
+
+_COMPRESSION = {
+    '': tf.python_io.TFRecordCompressionType.NONE,
+    'ZLIB': tf.python_io.TFRecordCompressionType.ZLIB,
+    'GZIP': tf.python_io.TFRecordCompressionType.GZIP,
+}
+
+
+def line_to_example(line, label_type='int'):
+    """same parsing as gen-records.py, returns None for empty lines"""
+    l = line.split()
+    if not l:
+        return None
+
+    label = int(l[0]) if label_type == 'int' else float(l[0])
+
+    # input can be libsmv or tlc format, for tlc format it contatins one col of num_features here will ignore
+    start = 1
+    if len(l) > 1 and b':' not in l[1]:
+        start += 1
+
+    indexes = []
+    values = []
+    for item in l[start:]:
+        index, value = item.split(b':')
+        indexes.append(int(index))
+        values.append(float(value))
+
+    label_ = _int_feature([label]) if label_type == 'int' else _float_feature([label])
+    return tf.train.Example(features=tf.train.Features(feature={
+        'label': label_,
+        'index': _int_feature(indexes),
+        'value': _float_feature(values)
+    }))
+
+
+def split_byte_ranges(path, num_splits):
+    """
+    [(start, end), ...] covering the whole file, every range starts at the beginning of a line
+    and ends right after a newline (or at the end of file), empty ranges are dropped
+    """
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, num_splits):
+            pos = size * i // num_splits
+            if pos <= bounds[-1]:
+                continue
+            # move to the first line start at or after pos
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i + 1] > bounds[i]]
+
+
+def shard_name(output, shard, num_shards):
+    return '%s-%05d-of-%05d' % (output, shard, num_shards)
+
+
+def convert_range(args):
+    """worker: parse lines in [start, end) of the input and write one shard"""
+    input, start, end, output_path, label_type, compression = args
+    options = tf.python_io.TFRecordOptions(_COMPRESSION[compression])
+    writer = tf.python_io.TFRecordWriter(output_path + '.tmp', options=options)
+    num = 0
+    pos = start
+    with open(input, 'rb') as f:
+        f.seek(start)
+        for line in f:
+            if pos >= end:
+                break
+            pos += len(line)
+            example = line_to_example(line, label_type)
+            if example is not None:
+                writer.write(example.SerializeToString())
+                num += 1
+    writer.close()
+    # only complete shards get their final name
+    os.rename(output_path + '.tmp', output_path)
+    return output_path, num
+
+
+def main(argv):
+    num_workers = FLAGS.num_workers or multiprocessing.cpu_count()
+    num_shards = FLAGS.num_shards or 4 * num_workers
+    compression = FLAGS.compression.upper()
+    assert compression in _COMPRESSION, 'unknown compression: %s' % FLAGS.compression
+
+    ranges = split_byte_ranges(FLAGS.input, num_shards)
+    tasks = [(FLAGS.input, start, end, shard_name(FLAGS.output, i, len(ranges)), FLAGS.label_type, compression)
+             for i, (start, end) in enumerate(ranges)]
+    print('%d byte ranges, %d workers' % (len(tasks), num_workers))
+
+    start_time = time.time()
+    counts = {}
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        for output_path, num in pool.imap_unordered(convert_range, tasks):
+            counts[output_path] = num
+            print('%s: %d records, %d/%d shards done, %.1fs' % (
+                output_path, num, len(counts), len(tasks), time.time() - start_time))
+    finally:
+        pool.close()
+        pool.join()
+
+    # index: one line per shard "path\tnum_records", in shard order
+    index_path = FLAGS.output + '.index'
+    with open(index_path, 'w') as f:
+        for task in tasks:
+            f.write('%s\t%d\n' % (os.path.basename(task[3]), counts[task[3]]))
+    print('%d records in %d shards, index: %s' % (sum(counts.values()), len(tasks), index_path))
+
+
+if __name__ == '__main__':
+    tf.app.run()
@@ -4,9 +4,14 @@ author:luchi
 date:24/4/2017
 desc:training logistic regression
 """
+import os
+import sys
 import tensorflow as tf
 from model import Logistic
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tfrecord_dataset import make_batch
+
 def read_my_file_format(filename_queue):
     reader = tf.TFRecordReader()
     _,serilized_example = reader.read(filename_queue)
@@ -28,8 +33,8 @@ def read_my_file_format(filename_queue):
     return features['data'],features['label']
 
 
-def input_pipeline(filenames, batch_size, num_epochs=100):
-
+def input_pipeline_queue(filenames, batch_size, num_epochs=100):
+    """old queue based pipeline, kept for comparison"""
     filename_queue = tf.train.string_input_producer([filenames],num_epochs=num_epochs)
     data,label=read_my_file_format(filename_queue)
 
@@ -37,6 +42,17 @@ def input_pipeline(filenames, batch_size, num_epochs=100):
                                           capacity=1000+3*batch_size,min_after_dequeue=1000)
     return datas,labels
 
+
+def input_pipeline(filenames, batch_size, num_epochs=100):
+    # tf.data: batch 之后用 parse_example 一次解析整个 batch
+    features = make_batch(filenames, batch_size,
+                          features={
+                              "data":tf.FixedLenFeature([2],tf.float32),
+                              "label":tf.FixedLenFeature([],tf.int64)
+                          },
+                          num_epochs=num_epochs, shuffle_buffer=1000, drop_remainder=True)
+    return features['data'],features['label']
+
 class config():
     data_dim=2
     label_num=2
@@ -0,0 +1,50 @@
+#coding=utf-8
+"""
+tf.data 版的 TFRecord 输入, 替代 string_input_producer + TFRecordReader + shuffle_batch 的队列方式:
+  - 多个文件并行交错读取 (parallel_interleave)
+  - 先 batch 再用 tf.parse_example 一次解析整个 batch, 而不是 parse_single_example 逐条解析
+  - 解析和后处理用 map(num_parallel_calls) 并行, 最后 prefetch
+不需要 Coordinator / start_queue_runners, 数据读完时 sess.run 抛出 tf.errors.OutOfRangeError
+
+用法:
+    features = make_batch(["a.tfrecords"], 32, {"label": tf.FixedLenFeature([], tf.int64)})
+"""
+import tensorflow as tf
+
+
+def make_dataset(file_pattern, batch_size, features, num_epochs=None, shuffle_buffer=0,
+                 compression_type=None, num_parallel_reads=4, num_parallel_calls=4,
+                 map_fn=None, prefetch=2, drop_remainder=False, seed=None):
+    """
+    :param file_pattern: 文件名, glob 或文件名列表
+    :param features: tf.parse_example 的 features 字典
+    :param num_epochs: None 表示无限循环
+    :param shuffle_buffer: > 0 时对样本做 shuffle (对应 shuffle_batch 的 min_after_dequeue), 文件顺序也会打乱
+    :param compression_type: None, "ZLIB" 或 "GZIP"
+    :param map_fn: 对解析后的整个 batch 做的后处理, 输入为 parse_example 返回的字典
+    :param drop_remainder: True 时丢掉最后不足 batch_size 的 batch, 保证 batch 维是静态的(与 shuffle_batch 一致)
+    :return: tf.data.Dataset, 每个元素是一个 batch
+    """
+    shuffle = shuffle_buffer > 0
+    files = tf.data.Dataset.list_files(file_pattern, shuffle=shuffle, seed=seed)
+    # 同时读 cycle_length 个文件, sloppy=True 时哪个文件先有数据就先用哪个
+    dataset = files.apply(tf.contrib.data.parallel_interleave(
+        lambda filename: tf.data.TFRecordDataset(filename, compression_type=compression_type),
+        cycle_length=num_parallel_reads,
+        sloppy=shuffle))
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed)
+    dataset = dataset.repeat(num_epochs)
+    dataset = dataset.batch(batch_size, drop_remainder=drop_remainder)
+
+    def parse(serialized):
+        parsed = tf.parse_example(serialized, features=features)
+        return map_fn(parsed) if map_fn is not None else parsed
+
+    dataset = dataset.map(parse, num_parallel_calls=num_parallel_calls)
+    return dataset.prefetch(prefetch)
+
+
+def make_batch(file_pattern, batch_size, features, **kwargs):
+    """make_dataset 的下一个 batch 的 tensor, 参数与 make_dataset 相同"""
+    return make_dataset(file_pattern, batch_size, features, **kwargs).make_one_shot_iterator().get_next()
@@ -7,6 +7,11 @@ import os
 import numpy as np
 import pickle
 import random
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 padToken, goToken, eosToken, unknownToken = 0, 1, 2, 3
 
@@ -98,6 +103,155 @@ def getAllTrainBatches(data, batch_size):
         batches.append(batch)
     return batches
 
+def createBatchArrays(samples, max_source_length=None, max_target_length=None):
+    '''
+    与createBatch相同的padding方式(source逆序、pad加在首部, target的pad加在尾部),
+    但直接写入预先分配好的int32 numpy数组, 没有逐个样本的python列表拼接
+    :param max_source_length/max_target_length: 为None时取本batch的最大长度
+    :return: Batch, 其中的字段均为numpy数组
+    '''
+    batch = Batch()
+    sources = [sample[0] for sample in samples]
+    targets = [sample[1] for sample in samples]
+    source_lengths = np.array([len(x) for x in sources], dtype=np.int32)
+    target_lengths = np.array([len(x) for x in targets], dtype=np.int32)
+    if max_source_length is None:
+        max_source_length = source_lengths.max()
+    if max_target_length is None:
+        max_target_length = target_lengths.max()
+
+    encoder_inputs = np.full((len(samples), max_source_length), padToken, dtype=np.int32)
+    decoder_targets = np.full((len(samples), max_target_length), padToken, dtype=np.int32)
+    # 按行优先的顺序, mask为True的位置正好依次是每个样本的词
+    source_mask = np.arange(max_source_length)[None, :] >= (max_source_length - source_lengths)[:, None]
+    target_mask = np.arange(max_target_length)[None, :] < target_lengths[:, None]
+    if source_lengths.sum() > 0:
+        encoder_inputs[source_mask] = np.concatenate([x[::-1] for x in sources])
+    if target_lengths.sum() > 0:
+        decoder_targets[target_mask] = np.concatenate(targets)
+
+    batch.encoder_inputs = encoder_inputs
+    batch.encoder_inputs_length = source_lengths
+    batch.decoder_targets = decoder_targets
+    batch.decoder_targets_length = target_lengths
+    return batch
+
+class BucketedBatchIterator(object):
+    '''
+    按(source长度, target长度)分桶的流式batch生成器:
+    - 每个batch里的样本都来自同一个桶, 长度接近, padding比getAllTrainBatches少得多
+    - 每个epoch桶内shuffle, 再把所有batch的顺序shuffle
+    - padding在后台线程里用numpy完成, 训练循环不需要等待整个epoch的batch构造完
+    - 统计padding比例(pad数 / batch总位置数), 用来调整分桶边界
+
+    用法:
+        batches = BucketedBatchIterator(trainingSamples, 64)
+        for e in range(numEpochs):
+            for batch in batches.epoch():
+                ...
+            print(batches.padding_ratio())
+    '''
+    def __init__(self, data, batch_size, source_boundaries=None, target_boundaries=None,
+                 num_buckets=4, prefetch=16, seed=None):
+        '''
+        :param data: loadDataset返回的trainingSamples
+        :param source_boundaries/target_boundaries: 分桶边界(升序), 长度 <= boundaries[i] 的样本落入第i个桶,
+                                                    为None时按长度的分位数自动取num_buckets个桶
+        '''
+        self.data = data
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self.rng = np.random.RandomState(seed)
+        self.source_lengths = np.array([len(sample[0]) for sample in data], dtype=np.int32)
+        self.target_lengths = np.array([len(sample[1]) for sample in data], dtype=np.int32)
+        if source_boundaries is None:
+            source_boundaries = self._quantile_boundaries(self.source_lengths, num_buckets)
+        if target_boundaries is None:
+            target_boundaries = self._quantile_boundaries(self.target_lengths, num_buckets)
+        self.source_boundaries = np.asarray(source_boundaries)
+        self.target_boundaries = np.asarray(target_boundaries)
+        # 每个样本的桶编号: source桶 * target桶数 + target桶
+        source_bucket = np.searchsorted(self.source_boundaries, self.source_lengths)
+        target_bucket = np.searchsorted(self.target_boundaries, self.target_lengths)
+        bucket_ids = source_bucket * (len(self.target_boundaries) + 1) + target_bucket
+        order = np.argsort(bucket_ids, kind='mergesort')
+        splits = np.flatnonzero(np.diff(bucket_ids[order])) + 1
+        self.buckets = np.split(order, splits)
+        self.reset_stats()
+
+    @staticmethod
+    def _quantile_boundaries(lengths, num_buckets):
+        if len(lengths) == 0:
+            return np.array([], dtype=np.int32)
+        quantiles = np.linspace(0, 100, num_buckets + 1)[1:-1]
+        return np.unique(np.percentile(lengths, quantiles).astype(np.int32))
+
+    def reset_stats(self):
+        self.num_tokens = np.zeros(2, dtype=np.int64) # 真实的词数: source, target
+        self.num_slots = np.zeros(2, dtype=np.int64) # padding之后的位置数: source, target
+
+    def padding_ratio(self):
+        '''
+        :return: (source的padding比例, target的padding比例)
+        '''
+        ratio = 1.0 - self.num_tokens / np.maximum(self.num_slots, 1).astype(np.float64)
+        return tuple(ratio)
+
+    def _epoch_batches(self):
+        batch_indices = []
+        for bucket in self.buckets:
+            bucket = bucket[self.rng.permutation(len(bucket))]
+            batch_indices.extend(bucket[i:i + self.batch_size] for i in range(0, len(bucket), self.batch_size))
+        self.rng.shuffle(batch_indices)
+        return batch_indices
+
+    @staticmethod
+    def _put(batch_queue, stop, item):
+        # 消费者提前退出(stop被设置)时不会一直阻塞在满的队列上
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self, batch_queue, stop):
+        try:
+            for indices in self._epoch_batches():
+                batch = createBatchArrays([self.data[i] for i in indices])
+                if not self._put(batch_queue, stop, batch):
+                    return
+            self._put(batch_queue, stop, None) # epoch结束
+        except Exception as e:
+            self._put(batch_queue, stop, e)
+
+    def epoch(self):
+        '''
+        一个epoch的所有batch, 由后台线程生成
+        '''
+        batch_queue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._run, args=(batch_queue, stop))
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                batch = batch_queue.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                self.num_tokens += [batch.encoder_inputs_length.sum(), batch.decoder_targets_length.sum()]
+                self.num_slots += [batch.encoder_inputs.size, batch.decoder_targets.size]
+                yield batch
+        finally:
+            stop.set()
+            thread.join()
+
+    def __len__(self):
+        return sum((len(bucket) + self.batch_size - 1) // self.batch_size for bucket in self.buckets)
+
 def sentence2enco(sentence, word2id):
     '''
     测试的时候将用户输入的句子转化为可以直接feed进模型的数据，现将句子转化成id，然后调用createBatch处理
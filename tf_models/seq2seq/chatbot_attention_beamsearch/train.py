@@ -2,7 +2,7 @@
 # 本教学代码中的predict的确可以run起来
 
 import tensorflow as tf
-from data_helpers import loadDataset, getAllTrainBatches, sentence2enco
+from data_helpers import loadDataset, getAllTrainBatches, sentence2enco, BucketedBatchIterator
 from model import Seq2SeqModel
 from tqdm import tqdm
 import math
@@ -15,6 +15,7 @@ tf.app.flags.DEFINE_integer('embedding_size', 100, '1024, Embedding dimensions o
 tf.app.flags.DEFINE_float('learning_rate', 0.0001, 'Learning rate')
 tf.app.flags.DEFINE_integer('batch_size', 64, 'Batch size')
 tf.app.flags.DEFINE_integer('numEpochs', 10, 'Maximum # of training epochs')
+tf.app.flags.DEFINE_boolean('bucketed', True, 'Bucket samples by length and build batches in a background thread')
 tf.app.flags.DEFINE_integer('steps_per_checkpoint', 100, 'Save model checkpoint every this iteration')
 tf.app.flags.DEFINE_string('model_dir', 'model/', 'Path to save model checkpoints')
 tf.app.flags.DEFINE_string('model_name', 'chatbot.ckpt', 'File name used for model checkpoints')
@@ -37,10 +38,18 @@ with tf.Session() as sess:
         sess.run(tf.global_variables_initializer())
     current_step = 0
     summary_writer = tf.summary.FileWriter(FLAGS.model_dir, graph=sess.graph)
+    if FLAGS.bucketed:
+        batchIterator = BucketedBatchIterator(trainingSamples, FLAGS.batch_size)
     for e in range(FLAGS.numEpochs):
         print("----- Epoch {}/{} -----".format(e + 1, FLAGS.numEpochs))
-        batches = getAllTrainBatches(trainingSamples, FLAGS.batch_size)
-        for nextBatch in tqdm(batches, desc="Training"):
+        if FLAGS.bucketed:
+            batchIterator.reset_stats()
+            batches = batchIterator.epoch()
+            total = len(batchIterator)
+        else:
+            batches = getAllTrainBatches(trainingSamples, FLAGS.batch_size)
+            total = len(batches)
+        for nextBatch in tqdm(batches, desc="Training", total=total):
             loss, summary = model.train(sess, nextBatch)
             current_step += 1
             if current_step % FLAGS.steps_per_checkpoint == 0:
@@ -48,4 +57,6 @@ with tf.Session() as sess:
                 tqdm.write("----- Step %d -- Loss %.2f -- Perplexity %.2f" % (current_step, loss, perplexity))
                 summary_writer.add_summary(summary, current_step)
                 checkpoint_path = os.path.join(FLAGS.model_dir, FLAGS.model_name)
-                model.saver.save(sess, checkpoint_path, global_step=current_step)
\ No newline at end of file
+                model.saver.save(sess, checkpoint_path, global_step=current_step)
+        if FLAGS.bucketed:
+            print("padding ratio: source %.4f, target %.4f" % batchIterator.padding_ratio())
\ No newline at end of file
@@ -13,7 +13,7 @@ neural machine translation by jointly learning to align and translate (2015 Dzmi
 import numpy as np
 #import pymongo
 from tqdm import tqdm
-import os,json
+import os,sys,json
 from keras.layers import *
 from keras.models import Model
 from keras import backend as K
@@ -187,8 +187,11 @@ neural machine translation by jointly learning to align and translate 2015
 此处S_i = g(S_(i-1))
 """
 # y: [batch, max_dec_length, char_embedding]
-y_lstm1 = LSTM(units=char_embedding_size, return_sequences=True)(y_embedding) # 此处decoder阶段竟然直接用lstm进行了计算,没有用到C_i,y_(i-1)
-y_lstm2 = LSTM(units=char_embedding_size, return_sequences=True)(y_lstm1)
+# return_state=True: 解码时逐步调用同一个layer,把上一步的(h, c)作为initial_state传入
+decoder_lstm1 = LSTM(units=char_embedding_size, return_sequences=True, return_state=True)
+decoder_lstm2 = LSTM(units=char_embedding_size, return_sequences=True, return_state=True)
+y_lstm1, _, _ = decoder_lstm1(y_embedding) # 此处decoder阶段竟然直接用lstm进行了计算,没有用到C_i,y_(i-1)
+y_lstm2, _, _ = decoder_lstm2(y_lstm1)
 
 
 class Interact(Layer):
@@ -259,10 +262,13 @@ class Interact(Layer):
  x_mask: [batch, max_enc_length, 1]
 """
 # xy: [batch, max_dec_length, 3*char_embedding], xy: C_i, y_(i-1), C_fixed
-xy = Interact()([y_lstm2, x_bi_lstm2, x_mask])
+interact = Interact()
+xy = interact([y_lstm2, x_bi_lstm2, x_mask])
 # xy: [batch, max_dec_length, 3*char_embedding]
-xy_dense1 = Dense(units=512, activation='relu')(xy)
-xy_dense2 = Dense(units=VOCAB_SIZE_WITH_SPECIAL)(xy_dense1)
+dense1 = Dense(units=512, activation='relu')
+dense2 = Dense(units=VOCAB_SIZE_WITH_SPECIAL)
+xy_dense1 = dense1(xy)
+xy_dense2 = dense2(xy_dense1)
 # x_dense2: [batch, max_dec_length, vocab]
 # x_prior: [batch, 1, vocab_size]
 # xy_average: [batch, max_dec_length, vocab]
@@ -284,8 +290,118 @@ model = Model(inputs=[x_in, y_in], outputs=xy_softmax) # 此处定义input,outpu
 model.add_loss(losses=loss)
 model.compile(optimizer=Adam(1e-3))
 
-def gen_title(input_string, topk=3):
-    """beam search解码,
+# 解码用的两个模型,与训练模型共享所有权重:
+# encoder_model: 每个输入只算一次encoder, 输出 x_bi_lstm2, x_mask, x_prior
+# decoder_step_model: 每步只输入最新的一个字和上一步的LSTM状态, 不再把整个前缀重新算一遍
+encoder_model = Model(inputs=x_in, outputs=[x_bi_lstm2, x_mask, x_prior])
+
+y_step_in = Input(shape=(1,)) # [batch, 1], 上一步输出的字
+enc_value_in = Input(shape=(None, char_embedding_size)) # [batch, max_enc_length, char_embedding]
+enc_mask_in = Input(shape=(None, 1)) # [batch, max_enc_length, 1]
+enc_prior_in = Input(shape=(1, VOCAB_SIZE_WITH_SPECIAL)) # [batch, 1, vocab_size]
+state_ins = [Input(shape=(char_embedding_size,)) for _ in range(4)] # h1, c1, h2, c2
+y_step_lstm1, h1, c1 = decoder_lstm1(embedding(y_step_in), initial_state=state_ins[0:2])
+y_step_lstm2, h2, c2 = decoder_lstm2(y_step_lstm1, initial_state=state_ins[2:4])
+xy_step = dense2(dense1(interact([y_step_lstm2, enc_value_in, enc_mask_in])))
+xy_step = Lambda(lambda x: (x[0]+x[1])/2)([xy_step, enc_prior_in])
+# step_proba: [batch, vocab]
+step_proba = Lambda(lambda x: x[:, 0])(Activation(activation='softmax')(xy_step))
+decoder_step_model = Model(inputs=[y_step_in, enc_value_in, enc_mask_in, enc_prior_in] + state_ins,
+                           outputs=[step_proba, h1, c1, h2, c2])
+
+
+def gen_titles(input_strings, topk=3, max_title_len=50, length_penalty=0.6):
+    """批量beam search解码, 一次解码多个输入, 每个输入保留topk个候选;如果topk=1，那么就是贪心搜索
+
+    - encoder对每个输入只算一次, 每步decoder只处理最新的字, 每步O(1)而不是O(t)
+    - 所有输入的所有候选一起预测, 扩展时对 [batch, topk*vocab] 的分数矩阵做一次argpartition
+    - 候选以<end>结束时记录下来, 最终按 score / length^length_penalty 选择(长度归一化),
+      某个输入的最优候选以<end>结束时, 这个输入就解码完成
+
+    encoder的双向LSTM没有mask, padding会改变反向LSTM的输出, 所以按输入长度分组,
+    同一组内的输入长度相同、不需要padding, 结果与逐个调用gen_title相同
+    """
+    ids = [str2id(s) for s in input_strings]
+    groups = {}
+    for i, x in enumerate(ids):
+        groups.setdefault(len(x), []).append(i)
+    titles = [None] * len(ids)
+    for group in groups.values():
+        xid = np.array([ids[i] for i in group])
+        for i, title in zip(group, _gen_titles_same_length(xid, topk, max_title_len, length_penalty)):
+            titles[i] = title
+    return titles
+
+
+def _gen_titles_same_length(xid, topk, max_title_len, length_penalty):
+    # xid: [batch, enc_length], 所有输入长度相同
+    batch = len(xid)
+    valid_start_char_id = SPECIAL_TOKEN_LEN - 1 # 直接忽略<padding>、<unk>、<start>
+    enc_value, enc_mask, enc_prior = encoder_model.predict(xid)
+    # 每个输入的encoder结果复制topk份: [batch*topk, ...]
+    enc_value, enc_mask, enc_prior = [np.repeat(a, topk, axis=0) for a in (enc_value, enc_mask, enc_prior)]
+    states = [np.zeros((batch * topk, char_embedding_size), dtype='float32') for _ in range(4)]
+
+    active = np.arange(batch) # 还在解码的输入
+    # 第0步所有候选都相同, 只从第0个候选扩展
+    scores = np.full((batch, topk), -np.inf)
+    scores[:, 0] = 0
+    yid = np.full((batch, topk, 1), START, dtype='int32') # [batch, topk, time_step_length]
+    best = [(-np.inf, [START])] * batch # 每个输入已结束的最好候选: (归一化分数, id序列)
+
+    for time_step in range(max_title_len):
+        proba, h1, c1, h2, c2 = decoder_step_model.predict(
+            [yid[:, :, -1].reshape(-1, 1), enc_value, enc_mask, enc_prior] + states)
+        states = [h1, c1, h2, c2]
+        log_proba = np.log(proba[:, valid_start_char_id:] + 1e-6) # [n*topk, vocab']
+        vocab = log_proba.shape[1]
+        n = len(active)
+        cand = (scores.reshape(-1, 1) + log_proba).reshape(n, topk * vocab)
+        # 每个输入从topk*vocab个候选里选出topk个,再按分数降序排列
+        arg_topk = np.argpartition(-cand, topk - 1, axis=1)[:, :topk]
+        cand_scores = np.take_along_axis(cand, arg_topk, axis=1)
+        order = np.argsort(-cand_scores, axis=1)
+        arg_topk = np.take_along_axis(arg_topk, order, axis=1)
+        scores = np.take_along_axis(cand_scores, order, axis=1)
+        beam = arg_topk // vocab # 来自上一步的哪个候选
+        char_id = arg_topk % vocab + valid_start_char_id
+
+        rows = np.arange(n)[:, None]
+        yid = np.concatenate([yid[rows, beam], char_id[:, :, None]], axis=2)
+        flat_beam = (rows * topk + beam).ravel()
+        states = [state[flat_beam] for state in states]
+
+        # 以<end>结束的候选: 记录下来, 并从beam里去掉
+        norm_scores = scores / float(time_step + 1) ** length_penalty
+        for i, j in zip(*np.nonzero(char_id == END)):
+            if norm_scores[i, j] > best[active[i]][0]:
+                best[active[i]] = (norm_scores[i, j], yid[i, j].tolist())
+        done = char_id[:, 0] == END
+        scores[char_id == END] = -np.inf
+        if time_step == max_title_len - 1:
+            break
+        if done.any():
+            # 去掉已经完成的输入, 后面的step不再为它们计算
+            keep = ~done
+            keep_rows = np.repeat(keep, topk)
+            active, scores, yid = active[keep], scores[keep], yid[keep]
+            enc_value, enc_mask, enc_prior = enc_value[keep_rows], enc_mask[keep_rows], enc_prior[keep_rows]
+            states = [state[keep_rows] for state in states]
+            if len(active) == 0:
+                break
+
+    # 到max_title_len都没有<end>的输入, 取当前最好的候选
+    if len(active) and time_step == max_title_len - 1:
+        norm_scores = scores / float(max_title_len) ** length_penalty
+        for i, b in enumerate(active):
+            j = np.argmax(norm_scores[i])
+            if best[b][1] == [START] or norm_scores[i, j] > best[b][0]:
+                best[b] = (norm_scores[i, j], yid[i, j].tolist())
+    return [id2str(ids) for _, ids in best]
+
+
+def gen_title_slow(input_string, topk=3):
+    """原始的beam search解码(每一步都重新预测整个前缀), 保留用于对照,
     每次只保留topk个最优候选结果；如果topk=1，那么就是贪心搜索
     """
     # xid:[topk, max_enc_length], yid:[topk,1]
@@ -362,6 +478,18 @@ def gen_title(input_string, topk=3):
     return id2str(yid[np.argmax(scores)])
 
 
+def gen_title(input_string, topk=3):
+    return gen_titles([input_string], topk)[0]
+
+
+def check_gen_titles(input_strings):
+    """贪心解码(topk=1)时, 批量的gen_titles与逐个的gen_title_slow结果应该相同"""
+    fast = gen_titles(input_strings, topk=1)
+    for s, title in zip(input_strings, fast):
+        slow = gen_title_slow(s, topk=1)
+        print('OK' if title == slow else 'NOT OK', 'gen_titles:', title, 'gen_title_slow:', slow)
+
+
 s1 = u'夏天来临，皮肤在强烈紫外线的照射下，晒伤不可避免，因此，晒后及时修复显得尤为重要，否则可能会造成长期伤害。专家表示，选择晒后护肤品要慎重，芦荟凝胶是最安全，有效的一种选择，晒伤严重者，还请及时就医。'
 s2 = u'8月28日，网络爆料称，华住集团旗下连锁酒店用户数据疑似发生泄露。从卖家发布的内容看，数据包含华住旗下汉庭、禧玥、桔子、宜必思等10余个品牌酒店的住客信息。泄露的信息包括华住官网注册资料、酒店入住登记的身份信息及酒店开房记录，住客姓名、手机号、邮箱、身份证号、登录账号密码等。卖家对这个约5亿条数据打包出售。第三方安全平台威胁猎人对信息出售者提供的三万条数据进行验证，认为数据真实性非常高。当天下午，华住集团发声明称，已在内部迅速开展核查，并第一时间报警。当晚，上海警方消息称，接到华住集团报案，警方已经介入调查。'
 
@@ -378,6 +506,13 @@ class Evaluate(Callback):
             model.save_weights('./best_model.weights')
 
 
+if __name__ == '__main__' and '--check' in sys.argv:
+    # python seq2seq.py --check: 用保存的权重对照批量解码与原始解码, 不训练
+    if os.path.exists('./best_model.weights'):
+        model.load_weights('./best_model.weights')
+    check_gen_titles([s1, s2, s1[:30]])
+    sys.exit(0)
+
 evaluator = Evaluate()
 
 model.fit_generator(data_generator(),
@@ -11,6 +11,11 @@ INIT_LEARNING_RATE = 0.01
 BATCH_SIZE = 64
 VAL_SAMPLE_SIZE = 256
 
+# decoder processes of input.Dataset, 0 for the single loader process
+NUM_LOADERS = 4
+# directory for the uint8 image caches (memmap), None to decode every epoch
+IMAGE_CACHE_DIR = None
+
 # BATCH_NORM = True
 BATCH_NORM = False
 # BN_AFTER_ACTV = True  # conv -> relu -> bn
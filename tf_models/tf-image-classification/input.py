@@ -3,6 +3,8 @@ import random
 import numpy as np
 import time
 import multiprocessing as mp
+import os
+import traceback
 import globals as g_
 
 W = H = 256
@@ -12,6 +14,8 @@ if g_.MODEL.lower() == 'alexnet':
 elif g_.MODEL.lower() == 'vgg16':
     OUT_W = OUT_H = 224
 
+MEAN_BGR = np.array([104., 116., 122.], dtype=np.float32)
+
 class Image:
     def __init__(self, path, label):
         with open(path) as f:
@@ -53,13 +57,74 @@ class Image:
         self.data = self.data[top:bottom, left:right, :]
     
 
+def load_crop(path, size=(OUT_H, OUT_W)):
+    """ same pixels as Image(path).crop_center(size), but kept as uint8 """
+    im = cv2.imread(path)
+    im = cv2.resize(im, (H, W))
+    assert im.shape == (H,W,3), 'BGR!'
+    hn, wn = size
+    top = H / 2 - hn / 2
+    left = W / 2 - wn / 2
+    return im[top:top + hn, left:left + wn, :]
+
+
+def _fill_cache(args):
+    cache_file, shape, start, paths = args
+    cache = np.memmap(cache_file, dtype=np.uint8, mode='r+', shape=shape)
+    for i, path in enumerate(paths):
+        cache[start + i] = load_crop(path, shape[1:3])
+    cache.flush()
+    return len(paths)
+
+
+def _decode_worker(tasks, results, buffers, image_size, paths, cache, cache_rows, subtract_mean):
+    """
+    decoder process: for every task (batch index, slot, image indices) write the
+    images straight into the shared batch buffer `slot`
+    """
+    try:
+        h, w = image_size
+        xs = [np.frombuffer(b, dtype=np.float32).reshape(-1, h, w, 3) for b in buffers]
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            batch_ind, slot, inds = task
+            x = xs[slot]
+            for j, ind in enumerate(inds):
+                if cache is not None:
+                    x[j] = cache[cache_rows[paths[ind]]]
+                else:
+                    x[j] = load_crop(paths[ind], image_size)
+            if subtract_mean:
+                x[:len(inds)] -= MEAN_BGR
+            results.put((batch_ind, slot, len(inds)))
+    except Exception:
+        results.put((None, None, traceback.format_exc()))
+
+
 class Dataset:
-    def __init__(self, imagelist_file, subtract_mean, image_size=(OUT_H, OUT_W), name='dataset'):
+    def __init__(self, imagelist_file, subtract_mean, image_size=(OUT_H, OUT_W), name='dataset',
+                 num_workers=g_.NUM_LOADERS, ordered=True, cache_file=None):
+        """
+        num_workers: decoder processes for batches(), 0 to use the single loader process of _batches_fast
+        ordered: deliver batches in order; False yields whichever batch is decoded first
+        cache_file: if given, decoded and cropped uint8 images are cached there as a memmap,
+                    defaults to <g_.IMAGE_CACHE_DIR>/<name>.cache when IMAGE_CACHE_DIR is set
+        """
         self.image_paths, self.labels = self._read_imagelist(imagelist_file)
         self.shuffled = False
         self.subtract_mean = subtract_mean
         self.name = name
         self.image_size = image_size
+        self.num_workers = num_workers
+        self.ordered = ordered
+        self.cache = None
+        self.cache_rows = None
+        if cache_file is None and g_.IMAGE_CACHE_DIR:
+            cache_file = os.path.join(g_.IMAGE_CACHE_DIR, name + '.cache')
+        if cache_file is not None:
+            self._load_cache(cache_file)
 
         print 'image dataset "' + name + '" inited'
         print '  total size:', len(self.image_paths)
@@ -90,16 +155,115 @@ class Dataset:
         self.shuffled = True
 
     
+    def _load_cache(self, cache_file):
+        """ open the uint8 crop cache, (re)building it if the image list changed """
+        h, w = self.image_size
+        paths = sorted(set(self.image_paths))
+        shape = (len(paths), h, w, 3)
+        list_file = cache_file + '.txt'
+        valid = (os.path.exists(cache_file) and os.path.exists(list_file)
+                 and os.path.getsize(cache_file) == np.prod(shape)
+                 and open(list_file).read().split('\n') == paths)
+        if not valid:
+            print 'building image cache', cache_file
+            st = time.time()
+            np.memmap(cache_file, dtype=np.uint8, mode='w+', shape=shape).flush()
+            chunk = 256
+            tasks = [(cache_file, shape, i, paths[i:i + chunk]) for i in xrange(0, len(paths), chunk)]
+            pool = mp.Pool(max(self.num_workers, 1))
+            try:
+                pool.map(_fill_cache, tasks)
+            finally:
+                pool.close()
+                pool.join()
+            with open(list_file, 'w') as f:
+                f.write('\n'.join(paths))
+            print '  done, time=', time.time() - st
+        self.cache = np.memmap(cache_file, dtype=np.uint8, mode='r', shape=shape)
+        self.cache_rows = dict((path, i) for i, path in enumerate(paths))
+
     def batches(self, batch_size):
-        for x,y in self._batches_fast(self.image_paths, self.labels, batch_size):
+        for x,y in self._batches(self.image_paths, self.labels, batch_size):
             yield x,y
 
 
     def sample_batches(self, batch_size, k):
         z = zip(self.image_paths, self.labels)
         paths, labels = map(list, zip(*random.sample(z, k)))
-        for x,y in self._batches_fast(paths, labels, batch_size):
+        for x,y in self._batches(paths, labels, batch_size):
             yield x,y
+
+    def _batches(self, paths, labels, batch_size):
+        if self.num_workers > 0:
+            return self._batches_pool(paths, labels, batch_size, self.num_workers, self.ordered)
+        return self._batches_fast(paths, labels, batch_size)
+
+    def _batches_pool(self, paths, labels, batch_size, num_workers, ordered=True, num_buffers=None):
+        """
+        num_workers decoder processes write into a ring of num_buffers shared memory batch buffers,
+        no image is pickled through a queue and no batch array is allocated per step.
+        the yielded x is a view of a shared buffer, it is reused once the next batch is requested
+        """
+        n = len(paths)
+        num_batches = (n + batch_size - 1) // batch_size
+        if num_buffers is None:
+            num_buffers = 2 * num_workers
+        num_buffers = max(1, min(num_buffers, num_batches))
+        h, w = self.image_size
+        buffers = [mp.RawArray('f', batch_size * h * w * 3) for _ in xrange(num_buffers)]
+        xs = [np.frombuffer(b, dtype=np.float32).reshape(batch_size, h, w, 3) for b in buffers]
+        labels = np.asarray(labels, dtype=np.float64)
+
+        tasks = mp.Queue()
+        results = mp.Queue()
+        workers = []
+        for _ in xrange(num_workers):
+            p = mp.Process(target=_decode_worker,
+                           args=(tasks, results, buffers, self.image_size, paths,
+                                 self.cache, self.cache_rows, self.subtract_mean))
+            # daemon child is killed when parent exits
+            p.daemon = True
+            p.start()
+            workers.append(p)
+
+        def submit(batch_ind, slot):
+            tasks.put((batch_ind, slot, range(batch_ind * batch_size, min(n, (batch_ind + 1) * batch_size))))
+
+        try:
+            next_submit = 0
+            for slot in xrange(num_buffers):
+                submit(next_submit, slot)
+                next_submit += 1
+
+            done = {} # batch index -> (slot, count), decoded but not yet yielded
+            next_yield = 0
+            for _ in xrange(num_batches):
+                while True:
+                    if ordered and next_yield in done:
+                        batch_ind = next_yield
+                        break
+                    if not ordered and done:
+                        batch_ind = next(iter(done))
+                        break
+                    batch_ind, slot, count = results.get()
+                    if batch_ind is None:
+                        raise RuntimeError('image decoder failed:\n' + count)
+                    done[batch_ind] = (slot, count)
+                slot, count = done.pop(batch_ind)
+                next_yield += 1
+                start = batch_ind * batch_size
+                yield xs[slot][:count], labels[start:start + count]
+                # the consumer is done with this slot, reuse it
+                if next_submit < num_batches:
+                    submit(next_submit, slot)
+                    next_submit += 1
+        finally:
+            for _ in workers:
+                tasks.put(None)
+            for p in workers:
+                p.join(1)
+                if p.is_alive():
+                    p.terminate()
     
 
     def _batches_fast(self, paths, labels, batch_size):
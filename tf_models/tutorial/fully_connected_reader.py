@@ -37,6 +37,9 @@ import tensorflow as tf
 
 from tensorflow.examples.tutorials.mnist import mnist
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'test_tf', 'tf_record'))
+from tfrecord_dataset import make_dataset
+
 # Basic model parameters as external flags.
 FLAGS = None
 
@@ -45,24 +48,15 @@ TRAIN_FILE = 'train.tfrecords'
 VALIDATION_FILE = 'validation.tfrecords'
 
 
-def read_and_decode(filename_queue):
-  reader = tf.TFRecordReader()
-  _, serialized_example = reader.read(filename_queue)
-  features = tf.parse_single_example(
-      serialized_example,
-      # Defaults are not specified since both keys are required.
-      features={
-          'image_raw': tf.FixedLenFeature([], tf.string),
-          'label': tf.FixedLenFeature([], tf.int64),
-      })
-
-  # Convert from a scalar string tensor (whose single string has
-  # length mnist.IMAGE_PIXELS) to a uint8 tensor with shape
-  # [mnist.IMAGE_PIXELS].
+def decode_batch(features):
+  """Converts a batch of parsed examples to images and labels."""
+  # Convert from a string tensor (whose strings have length
+  # mnist.IMAGE_PIXELS) to a uint8 tensor with shape
+  # [batch_size, mnist.IMAGE_PIXELS].
   image = tf.decode_raw(features['image_raw'], tf.uint8)
-  image.set_shape([mnist.IMAGE_PIXELS])
+  image.set_shape([None, mnist.IMAGE_PIXELS])
 
-  # OPTIONAL: Could reshape into a 28x28 image and apply distortions
+  # OPTIONAL: Could reshape into 28x28 images and apply distortions
   # here.  Since we are not applying any distortions in this
   # example, and the next step expects the image to be flattened
   # into a vector, we don't bother.
@@ -70,10 +64,10 @@ def read_and_decode(filename_queue):
   # Convert from [0, 255] -> [-0.5, 0.5] floats.
   image = tf.cast(image, tf.float32) * (1. / 255) - 0.5
 
-  # Convert label from a scalar uint8 tensor to an int32 scalar.
+  # Convert label from a uint8 tensor to an int32 tensor.
   label = tf.cast(features['label'], tf.int32)
 
-  return image, label
+  return {'image': image, 'label': label}
 
 
 def inputs(train, batch_size, num_epochs):
@@ -89,31 +83,30 @@ def inputs(train, batch_size, num_epochs):
       in the range [-0.5, 0.5].
     * labels is an int32 tensor with shape [batch_size] with the true label,
       a number in the range [0, mnist.NUM_CLASSES).
-    Note that an tf.train.QueueRunner is added to the graph, which
-    must be run using e.g. tf.train.start_queue_runners().
+    When all epochs have been read, evaluating the tensors raises
+    tf.errors.OutOfRangeError.
   """
   if not num_epochs: num_epochs = None
   filename = os.path.join(FLAGS.train_dir,
                           TRAIN_FILE if train else VALIDATION_FILE)
 
   with tf.name_scope('input'):
-    filename_queue = tf.train.string_input_producer(
-        [filename], num_epochs=num_epochs)
-
-    # Even when reading in multiple threads, share the filename
-    # queue.
-    image, label = read_and_decode(filename_queue)
-
-    # Shuffle the examples and collect them into batch_size batches.
-    # (Internally uses a RandomShuffleQueue.)
-    # We run this in two threads to avoid being a bottleneck.
-    images, sparse_labels = tf.train.shuffle_batch(
-        [image, label], batch_size=batch_size, num_threads=2,
-        capacity=1000 + 3 * batch_size,
-        # Ensures a minimum amount of shuffling of examples.
-        min_after_dequeue=1000)
-
-    return images, sparse_labels
+    # Reads the file with tf.data, parses whole batches with parse_example
+    # and decodes them in parallel, prefetching the next batches.
+    dataset = make_dataset(
+        filename, batch_size,
+        features={
+            'image_raw': tf.FixedLenFeature([], tf.string),
+            'label': tf.FixedLenFeature([], tf.int64),
+        },
+        num_epochs=num_epochs,
+        # Ensures a minimum amount of shuffling of examples, like the
+        # min_after_dequeue of the former shuffle_batch.
+        shuffle_buffer=1000,
+        map_fn=decode_batch)
+    batch = dataset.make_one_shot_iterator().get_next()
+
+    return batch['image'], batch['label']
 
 
 def run_training():
@@ -147,13 +140,9 @@ def run_training():
     # epoch counter).
     sess.run(init_op)
 
-    # Start input enqueue threads.
-    coord = tf.train.Coordinator()
-    threads = tf.train.start_queue_runners(sess=sess, coord=coord)
-
     step = 0
     try:
-      while not coord.should_stop():
+      while True:
         start_time = time.time()
 
         # Run one step of the model.  The return values are
@@ -174,12 +163,7 @@ def run_training():
     except tf.errors.OutOfRangeError:
       print('Done training for %d epochs, %d steps.' % (FLAGS.num_epochs, step))
     finally:
-      # When done, ask the threads to stop.
-      coord.request_stop()
-
-    # Wait for threads to finish.
-    coord.join(threads)
-    sess.close()
+      sess.close()
 
 
 def main(_):